@@ -1,16 +1,30 @@
 import os
+import sys
 import json
 import requests
 import pandas as pd
 from datetime import datetime, timedelta
 
+# Packed record reader lives next to the data generator
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data_sources'))
+from packed_records import PackedRecordReader
+
 # Mock external API for telemedicine appointment logs
 class TelemedicineExternalAPI:
     def __init__(self, base_url=None):
         # For local development, we'll use the local data files
         self.base_data_dir = '/home/ubuntu/telemedicine_pipeline/data_sources'
+        self._packed_appointments = None
         print(f"Initialized mock external API using local data directory: {self.base_data_dir}")
     
+    def _get_packed_appointments(self):
+        """Load the packed appointment index once, if the data was generated in packed format"""
+        if self._packed_appointments is None:
+            appointments_dir = os.path.join(self.base_data_dir, 'appointment_logs')
+            if PackedRecordReader.exists(appointments_dir, 'appointment'):
+                self._packed_appointments = PackedRecordReader(appointments_dir, 'appointment')
+        return self._packed_appointments
+    
     def get_appointments(self, start_date=None, end_date=None, limit=100):
         """
         Get appointment data from the external API
@@ -50,9 +64,17 @@ class TelemedicineExternalAPI:
     def get_appointment_details(self, appointment_id):
         """
         Get details for a specific appointment
-        In this mock implementation, we'll read from our local JSON files
+        In this mock implementation, we'll read from our local packed segments or JSON files
         """
         try:
+            # Seek straight to the record if the appointments are packed
+            packed_appointments = self._get_packed_appointments()
+            if packed_appointments is not None and appointment_id in packed_appointments:
+                return {
+                    'status': 'success',
+                    'data': packed_appointments.get(appointment_id)
+                }
+            
             # Try to find the appointment JSON file
             appointment_file = os.path.join(
                 self.base_data_dir, 
@@ -1,22 +1,73 @@
-import json
-import os
+import time
+import signal
+import argparse
 import pandas as pd
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
 from kafka import KafkaConsumer
+from kafka.structs import TopicPartition, OffsetAndMetadata
 
-# Configure Kafka consumer
-def create_kafka_consumer(topics):
+from local_broker import LOCAL_BROKER_DIR, LocalBroker, LocalConsumer
+from client_config import KAFKA_CLIENT_CONFIG_FILE, load_kafka_client_config
+from message_codecs import SCHEMA_REGISTRY_FILE, JsonCodec, BinaryCodec, SchemaRegistry, decode_message, \
+    raw_payload
+from stream_metrics import LatencyHistogram, ConsumerMetrics, end_to_end_latency, export_latency_metrics
+from record_validators import APPOINTMENT_VALIDATOR, EVENT_VALIDATOR
+from sessionizer import SESSION_STATE_DIR, DEFAULT_SESSION_TIMEOUT_SECONDS, DEFAULT_MAX_OPEN_SESSIONS, \
+    SessionStore, Sessionizer
+from warehouse_sink import WAREHOUSE_BACKENDS, WAREHOUSE_DB_FILE, DEFAULT_WAREHOUSE_BATCH_SIZE, \
+    DEFAULT_WAREHOUSE_MAX_AGE_SECONDS, DEFAULT_WAREHOUSE_MAX_ATTEMPTS, create_warehouse_sink
+from segment_writer import PROCESSED_DIR, SEGMENT_FORMATS, DEFAULT_SEGMENT_RECORDS, DEFAULT_SEGMENT_BYTES, \
+    DEFAULT_SEGMENT_AGE_SECONDS, DEFAULT_WINDOW_MINUTES, SegmentWriter, resolve_segment_format, recover_checkpoint
+
+# End-to-end latency (produce time header to receipt), segment flush latency, throughput, lag and
+# backpressure, exported to the monitoring metrics store
+END_TO_END_LATENCY_METRIC = "kafka_end_to_end"
+CONSUMER_METRICS_PREFIX = "kafka_consumer"
+DEFAULT_METRICS_INTERVAL_SECONDS = 60
+POLL_TIMEOUT_MS = 1000
+REPORT_INTERVAL_SECONDS = 10  # Throughput and lag progress lines
+
+# Fetching pauses while the segment writer buffers more than max_buffer_bytes (flushes failing or
+# falling behind) and resumes once the buffers are below this fraction of it
+DEFAULT_MAX_BUFFER_BYTES = 256 * 1024 * 1024
+BACKPRESSURE_RESUME_FRACTION = 0.5
+
+TOPICS = ['telemedicine-appointments', 'telemedicine-events']
+
+# Configure Kafka consumer; values stay raw bytes and are decoded per message by their codec header.
+# settings (fetch_min_bytes, fetch_max_wait_ms, max_poll_records, ...) go to KafkaConsumer; compressed
+# batches are decompressed by the client based on the codec the producer recorded in each batch.
+# With local_broker_dir, messages are read from a file-backed LocalBroker instead of a Kafka cluster.
+# With partitions, the consumer is assigned exactly those TopicPartitions instead of subscribing to topics
+def create_kafka_consumer(topics, local_broker_dir=None, enable_auto_commit=True, partitions=None, **settings):
     try:
-        consumer = KafkaConsumer(
-            *topics,
-            bootstrap_servers=['localhost:9092'],
-            auto_offset_reset='earliest',
-            enable_auto_commit=True,
-            group_id='telemedicine-consumer-group',
-            value_deserializer=lambda x: json.loads(x.decode('utf-8')),
-            key_deserializer=lambda x: x.decode('utf-8') if x else None
-        )
-        print(f"Kafka consumer created successfully for topics: {topics}")
+        if local_broker_dir:
+            consumer = LocalConsumer(
+                *topics,
+                broker=LocalBroker(local_broker_dir),
+                auto_offset_reset='earliest',
+                enable_auto_commit=enable_auto_commit,
+                group_id='telemedicine-consumer-group',
+                key_deserializer=lambda x: x.decode('utf-8') if x else None,
+                **settings
+            )
+        else:
+            consumer = KafkaConsumer(
+                *topics,
+                bootstrap_servers=['localhost:9092'],
+                auto_offset_reset='earliest',
+                enable_auto_commit=enable_auto_commit,
+                group_id='telemedicine-consumer-group',
+                key_deserializer=lambda x: x.decode('utf-8') if x else None,
+                **settings
+            )
+        if partitions is not None:
+            consumer.assign(partitions)
+            print(f"{'Local' if local_broker_dir else 'Kafka'} consumer created successfully for partitions: "
+                  f"{', '.join(f'{tp.topic}:{tp.partition}' for tp in partitions)}")
+        else:
+            print(f"{'Local' if local_broker_dir else 'Kafka'} consumer created successfully for topics: {topics}")
         return consumer
     except Exception as e:
         print(f"Error creating Kafka consumer: {e}")
@@ -25,152 +76,475 @@ def create_kafka_consumer(topics):
 # Process and validate appointment data
 def validate_appointment(appointment):
     """Validate appointment data and return errors if any"""
-    errors = []
-    
-    # Check required fields
-    required_fields = ['appointment_id', 'provider_id', 'patient_id', 'appointment_date', 
-                      'scheduled_time', 'appointment_type', 'status']
-    
-    for field in required_fields:
-        if field not in appointment or appointment[field] is None:
-            errors.append(f"Missing required field: {field}")
-    
-    # Validate appointment status
-    valid_statuses = ["Completed", "Cancelled", "No-show", "Rescheduled"]
-    if 'status' in appointment and appointment['status'] not in valid_statuses:
-        errors.append(f"Invalid status: {appointment['status']}")
-    
-    # Validate wait time and duration based on status
-    if appointment.get('status') == "Completed":
-        if 'wait_time_minutes' not in appointment or appointment['wait_time_minutes'] is None:
-            errors.append("Completed appointment missing wait_time_minutes")
-        if 'duration_minutes' not in appointment or appointment['duration_minutes'] is None:
-            errors.append("Completed appointment missing duration_minutes")
-    
-    return errors
+    return APPOINTMENT_VALIDATOR.validate(appointment)
 
 # Process and validate event data
 def validate_event(event):
     """Validate event data and return errors if any"""
-    errors = []
-    
-    # Check required fields
-    required_fields = ['event_type', 'appointment_id', 'timestamp']
-    
-    for field in required_fields:
-        if field not in event or event[field] is None:
-            errors.append(f"Missing required field: {field}")
+    return EVENT_VALIDATOR.validate(event)
+
+# Consumer settings: the client config file, then command-line options
+def build_consumer_config(args):
+    consumer_config = load_kafka_client_config(args.client_config)["consumer"]
+    overrides = {
+        "fetch_min_bytes": args.fetch_min_bytes,
+        "fetch_max_wait_ms": args.fetch_max_wait_ms,
+        "max_poll_records": args.max_poll_records,
+        "max_partition_fetch_bytes": args.max_partition_fetch_bytes
+    }
+    consumer_config.update({name: value for name, value in overrides.items() if value is not None})
+    if args.local_broker:
+        consumer_config["local_broker_dir"] = args.local_broker
+    if args.commit_on_flush:
+        consumer_config["enable_auto_commit"] = False
+    return consumer_config
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Consume and validate telemedicine appointment events")
+    parser.add_argument("--fetch-min-bytes", type=int, default=None,
+                        help="Minimum bytes the broker accumulates before answering a fetch (default: 1)")
+    parser.add_argument("--fetch-max-wait-ms", type=int, default=None,
+                        help="Longest the broker waits for fetch-min-bytes (default: 500)")
+    parser.add_argument("--max-poll-records", type=int, default=None,
+                        help="Records returned per poll (default: 500)")
+    parser.add_argument("--max-partition-fetch-bytes", type=int, default=None,
+                        help="Bytes fetched per partition per request (default: 1048576)")
+    parser.add_argument("--client-config", default=KAFKA_CLIENT_CONFIG_FILE,
+                        help="JSON file with KafkaProducer/KafkaConsumer settings")
+    parser.add_argument("--local-broker", nargs="?", const=LOCAL_BROKER_DIR, default=None, metavar="LOG_DIR",
+                        help=f"Consume from a file-backed local broker instead of Kafka (default dir: {LOCAL_BROKER_DIR})")
+    parser.add_argument("--output-dir", default=PROCESSED_DIR, help="Directory for processed data segments")
+    parser.add_argument("--segment-format", choices=SEGMENT_FORMATS, default="ndjson",
+                        help="Segment file format (parquet requires pyarrow)")
+    parser.add_argument("--segment-records", type=int, default=DEFAULT_SEGMENT_RECORDS,
+                        help="Flush a segment after this many records")
+    parser.add_argument("--segment-bytes", type=int, default=DEFAULT_SEGMENT_BYTES,
+                        help="Flush a segment after this many serialized bytes")
+    parser.add_argument("--segment-age-seconds", type=float, default=DEFAULT_SEGMENT_AGE_SECONDS,
+                        help="Flush a segment once its oldest record has waited this long")
+    parser.add_argument("--window-minutes", type=int, default=DEFAULT_WINDOW_MINUTES,
+                        help="Width of the time windows segments are grouped into")
+    parser.add_argument("--sessionize", action="store_true",
+                        help="Build session records from the events of each appointment")
+    parser.add_argument("--session-timeout-seconds", type=float, default=DEFAULT_SESSION_TIMEOUT_SECONDS,
+                        help="Emit a session once no event for it has arrived for this long")
+    parser.add_argument("--max-open-sessions", type=int, default=DEFAULT_MAX_OPEN_SESSIONS,
+                        help="Open sessions kept in memory; older ones spill to the session state database")
+    parser.add_argument("--session-state-dir", default=SESSION_STATE_DIR,
+                        help="Directory of per-partition SQLite files for spilled and unfinished sessions")
+    parser.add_argument("--warehouse", choices=WAREHOUSE_BACKENDS, default=None,
+                        help="Also upsert valid appointments into this warehouse's fact_appointment table")
+    parser.add_argument("--warehouse-db", default=WAREHOUSE_DB_FILE, help="SQLite warehouse database file")
+    parser.add_argument("--warehouse-batch-size", type=int, default=DEFAULT_WAREHOUSE_BATCH_SIZE,
+                        help="Appointments per warehouse upsert transaction")
+    parser.add_argument("--warehouse-max-age-seconds", type=float, default=DEFAULT_WAREHOUSE_MAX_AGE_SECONDS,
+                        help="Longest an appointment waits before its batch is upserted")
+    parser.add_argument("--warehouse-max-attempts", type=int, default=DEFAULT_WAREHOUSE_MAX_ATTEMPTS,
+                        help="Failed flushes of an unreachable warehouse before pending appointments are dead-lettered")
+    parser.add_argument("--max-buffer-bytes", type=int, default=DEFAULT_MAX_BUFFER_BYTES,
+                        help="Pause fetching while the segment writer buffers this many bytes")
+    parser.add_argument("--metrics-interval-seconds", type=float, default=DEFAULT_METRICS_INTERVAL_SECONDS,
+                        help="How often lag, throughput, flush latency and backpressure metrics are exported")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Consumer processes; partition p of each topic goes to worker p %% N")
+    parser.add_argument("--max-idle-seconds", type=float, default=None,
+                        help="Stop after no messages arrive for this long (default: run until interrupted)")
+    parser.add_argument("--commit-on-flush", action="store_true",
+                        help="Commit offsets only after a flush is fsynced, and resume from the offsets "
+                             "stored beside the segments (instead of auto-commit)")
+    return parser.parse_args(argv)
+
+# Record type and validator per topic
+TOPIC_VALIDATORS = {
+    'telemedicine-appointments': ('appointment', APPOINTMENT_VALIDATOR),
+    'telemedicine-events': ('event', EVENT_VALIDATOR)
+}
+
+# Decode and validate a polled batch, then hand every message to the segment writer in order
+def process_messages(messages, codecs, writer, sessionizer=None, warehouse=None):
+    """
+    messages come from one poll of one topic partition; the batch is validated column-wise.
+    Valid events also go to the sessionizer, and the sessions they close to the segment writer;
+    valid appointments also go to the warehouse sink. Returns the number of rejected messages.
+    """
+    values = []
+    decode_errors = {}
+    for i, message in enumerate(messages):
+        try:
+            values.append(decode_message(message, codecs))
+        except Exception as e:
+            print(f"Could not decode message from topic {message.topic} with key {message.key}: {e}")
+            decode_errors[i] = e
+            values.append(None)
     
-    # Validate event type
-    valid_event_types = [
-        "appointment_scheduled", "patient_login", "provider_login", 
-        "session_started", "session_ended", "technical_issue",
-        "appointment_cancelled", "appointment_rescheduled"
-    ]
+    # Validate everything that decoded, one batch per topic
+    errors = [None] * len(messages)
+    for topic, (data_type, validator) in TOPIC_VALIDATORS.items():
+        positions = [i for i, m in enumerate(messages) if m.topic == topic and i not in decode_errors]
+        if positions:
+            for i, record_errors in zip(positions, validator.validate_batch([values[i] for i in positions])):
+                errors[i] = record_errors
     
-    if 'event_type' in event and event['event_type'] not in valid_event_types:
-        errors.append(f"Invalid event_type: {event['event_type']}")
+    for i, message in enumerate(messages):
+        topic, key, value = message.topic, message.key, values[i]
+        source = (topic, message.partition, message.offset)
+        
+        if i in decode_errors:
+            data_type = TOPIC_VALIDATORS[topic][0] if topic in TOPIC_VALIDATORS else topic
+            error_data = dead_letter_record(message, data_type, 'decode', [f"Undecodable message: {decode_errors[i]}"],
+                                            raw_payload(message))
+            writer.write('error', error_data, source=source)
+        elif topic in TOPIC_VALIDATORS:
+            data_type = TOPIC_VALIDATORS[topic][0]
+            if errors[i]:
+                if data_type == 'appointment':
+                    print(f"Validation errors in appointment {key}: {errors[i]}")
+                else:
+                    print(f"Validation errors in event for appointment {key}: {errors[i]}")
+                error_data = dead_letter_record(message, data_type, 'validation', errors[i], value)
+                writer.write('error', error_data, source=source)
+            else:
+                # The sessionizer sees an event before it is written, so no flush commits an event
+                # its session state lacks; the session it closes is written (then released) first
+                if sessionizer is not None and data_type == 'event':
+                    session = sessionizer.process(value, partition=message.partition, offset=message.offset)
+                    if session is not None:
+                        writer.write('session', session)
+                        sessionizer.release(session)
+                # Save valid appointment or event data
+                writer.write(data_type, value, source=source)
+                if warehouse is not None and data_type == 'appointment':
+                    warehouse.write(value, message)
     
-    # Validate timestamp format
-    if 'timestamp' in event:
-        try:
-            datetime.strptime(event['timestamp'], '%Y-%m-%d %H:%M:%S')
-        except ValueError:
-            errors.append(f"Invalid timestamp format: {event['timestamp']}")
-    
-    return errors
-
-# Save data to disk
-def save_data(data, data_type, data_id):
-    """Save data to appropriate directory based on type"""
-    base_dir = '/home/ubuntu/telemedicine_pipeline/data_ingestion/processed'
-    
-    # Create directories if they don't exist
-    os.makedirs(f"{base_dir}/appointments", exist_ok=True)
-    os.makedirs(f"{base_dir}/events", exist_ok=True)
-    os.makedirs(f"{base_dir}/errors", exist_ok=True)
-    
-    # Format current timestamp
-    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-    
-    if data_type == 'appointment':
-        filename = f"{base_dir}/appointments/appointment_{data_id}_{timestamp}.json"
-    elif data_type == 'event':
-        filename = f"{base_dir}/events/event_{data_id}_{timestamp}.json"
-    elif data_type == 'error':
-        filename = f"{base_dir}/errors/error_{data_id}_{timestamp}.json"
-    else:
-        print(f"Unknown data type: {data_type}")
+    return len(decode_errors) + sum(1 for e in errors if e)
+
+# Dead-letter record for a rejected message, written to the append-only error segments.
+# The source coordinates and the original value let redrive_errors.py replay it after a fix;
+# for undecodable messages that is the raw value and headers (raw_payload), byte for byte
+def dead_letter_record(message, data_type, stage, errors, original_data):
+    return {
+        'data_type': data_type,
+        'data_id': message.key,
+        'stage': stage,  # decode, validation or warehouse (the upsert failed)
+        'errors': errors,
+        'original_data': original_data,
+        'topic': message.topic,
+        'partition': message.partition,
+        'offset': message.offset,
+        'failed_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'redrive_attempts': 0
+    }
+
+# Drop records already on disk from an earlier run (consumed past the last successful commit)
+def skip_checkpointed(consumer, tp, messages, checkpoint):
+    resume_offset = checkpoint.get((tp.topic, tp.partition))
+    if resume_offset is None or messages[0].offset >= resume_offset:
+        return messages
+    remaining = [message for message in messages if message.offset >= resume_offset]
+    if not remaining:
+        consumer.seek(tp, resume_offset)
+    return remaining
+
+# Commit the segment writer's checkpoint for assigned partitions whose durable offset has advanced
+def commit_checkpoint(consumer, writer, committed):
+    offsets = {}
+    for tp in consumer.assignment():
+        offset = writer.checkpoint.get((tp.topic, tp.partition))
+        if offset is not None and offset != committed.get(tp):
+            offsets[tp] = OffsetAndMetadata(offset, None, -1)
+    if not offsets:
         return
-    
-    with open(filename, 'w') as f:
-        json.dump(data, f, indent=2)
-    
-    print(f"Saved {data_type} data to {filename}")
+    try:
+        consumer.commit(offsets)
+        committed.update({tp: value.offset for tp, value in offsets.items()})
+    except Exception as e:
+        # The offsets sidecars still hold the checkpoint; the next flush retries the commit
+        print(f"Error committing offsets: {e}")
+
+# Messages behind the log end, summed over the assigned partitions
+def consumer_lag(consumer):
+    partitions = list(consumer.assignment())
+    if not partitions:
+        return 0
+    end_offsets = consumer.end_offsets(partitions)
+    return sum(max(end_offsets[tp] - consumer.position(tp), 0) for tp in partitions)
+
+def partition_lag(consumer):
+    """{(topic, partition): end offset minus committed offset} for the assigned partitions"""
+    partitions = list(consumer.assignment())
+    if not partitions:
+        return {}
+    end_offsets = consumer.end_offsets(partitions)
+    lag = {}
+    for tp in partitions:
+        committed = consumer.committed(tp)
+        # Nothing committed yet: everything before the position is still uncommitted work
+        lag[(tp.topic, tp.partition)] = max(end_offsets[tp] - (committed if committed is not None else 0), 0)
+    return lag
+
+# Backpressure: stop fetching while the write buffer is over its memory bound
+def apply_backpressure(consumer, writer, max_buffer_bytes, paused_since, label=""):
+    """
+    Once the segment writer buffers max_buffer_bytes or more, flush; if that doesn't bring it back
+    under (flushes failing), pause every assigned partition. Polling continues, so the consumer keeps
+    its group membership. Fetching resumes once the buffers are below BACKPRESSURE_RESUME_FRACTION
+    of the bound. Returns when fetching was paused, or None.
+    """
+    if writer.buffered_bytes >= max_buffer_bytes:
+        writer.flush_all()
+    buffered_bytes = writer.buffered_bytes
+    if buffered_bytes >= max_buffer_bytes:
+        # Re-applied every loop, so partitions assigned by a rebalance are paused too
+        consumer.pause(*consumer.assignment())
+        if paused_since is None:
+            print(f"{label}Write buffer at {buffered_bytes / 1e6:,.1f} MB, pausing fetching until it is flushed")
+            paused_since = time.monotonic()
+    elif paused_since is not None and buffered_bytes < max_buffer_bytes * BACKPRESSURE_RESUME_FRACTION:
+        consumer.resume(*consumer.paused())
+        print(f"{label}Write buffer down to {buffered_bytes / 1e6:,.1f} MB, resuming fetching "
+              f"after {time.monotonic() - paused_since:.1f}s")
+        paused_since = None
+    return paused_since
+
+def consumer_summary(messages, received_bytes, elapsed, lag):
+    return {
+        "messages": messages,
+        "bytes": received_bytes,
+        "elapsed_seconds": elapsed,
+        "messages_per_second": messages / elapsed if elapsed > 0 else 0.0,
+        "bytes_per_second": received_bytes / elapsed if elapsed > 0 else 0.0,
+        "lag": lag
+    }
 
-def main():
-    # Create directories for processed data
-    os.makedirs('/home/ubuntu/telemedicine_pipeline/data_ingestion/processed', exist_ok=True)
+def format_consumer_summary(label, summary):
+    return (f"{label}: {summary['messages']} messages in {summary['elapsed_seconds']:.2f}s, "
+            f"{summary['messages_per_second']:,.0f} msg/s, {summary['bytes_per_second'] / 1e6:,.2f} MB/s, "
+            f"lag {summary['lag']}")
+
+# Consume loop shared by the single consumer and the worker pool
+def consume_messages(consumer, args, checkpoint=None, label="", export_latency=True,
+                     metrics_prefix=CONSUMER_METRICS_PREFIX):
+    """
+    Poll, validate and write segments until interrupted, or until no message arrives for
+    args.max_idle_seconds. Returns a throughput and lag summary plus the end-to-end latency
+    histogram (exported every args.metrics_interval_seconds and reset when export_latency is set).
+    Consumer metrics go to the monitoring metrics store under metrics_prefix at the same interval.
+    """
+    # Codecs producers may declare in the message header
+    codecs = {"json": JsonCodec(), "binary": BinaryCodec(SchemaRegistry(SCHEMA_REGISTRY_FILE))}
     
-    # Create Kafka consumer
-    topics = ['telemedicine-appointments', 'telemedicine-events']
-    consumer = create_kafka_consumer(topics)
+    # Validated messages are buffered and written as segments per data type and time window
+    writer = SegmentWriter(
+        base_dir=args.output_dir,
+        segment_format=resolve_segment_format(args.segment_format),
+        max_records=args.segment_records,
+        max_bytes=args.segment_bytes,
+        max_age_seconds=args.segment_age_seconds,
+        window_minutes=args.window_minutes,
+        durable=args.commit_on_flush,
+        checkpoint=checkpoint
+    )
+    committed = {}
+    sessionizer = None
+    if args.sessionize:
+        sessionizer = Sessionizer(SessionStore(args.session_state_dir, args.max_open_sessions),
+                                  args.session_timeout_seconds)
+        writer.flush_hooks.append((sessionizer.checkpoint, sessionizer.flushed))
+    warehouse = None
+    if args.warehouse:
+        # Rows the warehouse rejects go to the error segments, for redrive_errors.py --target topic
+        def warehouse_dead_letter(appointment, message, errors):
+            writer.write('error', dead_letter_record(message, 'appointment', 'warehouse', errors, appointment))
+        warehouse = create_warehouse_sink(args.warehouse, args.warehouse_db, batch_size=args.warehouse_batch_size,
+                                          max_age_seconds=args.warehouse_max_age_seconds,
+                                          max_attempts=args.warehouse_max_attempts, dead_letter=warehouse_dead_letter)
+        if warehouse is not None and args.commit_on_flush:
+            # Pending rows are upserted (or dead-lettered) before their offsets are checkpointed
+            writer.flush_hooks.append((warehouse.checkpoint, None))
+    if args.commit_on_flush:
+        print(f"{label}Committing offsets after durable flushes; resuming {len(writer.checkpoint)} partition(s) "
+              f"from the offsets stored in {args.output_dir}")
     
-    if not consumer:
-        return
+    # Each export covers the messages received since the previous one
+    latency_histogram = LatencyHistogram()
+    metrics = ConsumerMetrics(metrics_prefix)
+    next_export = time.monotonic() + args.metrics_interval_seconds
     
-    print("Starting to consume messages...")
+    messages_received, bytes_received = 0, 0
+    start_time = time.monotonic()
+    last_message_time = last_loop_time = start_time
+    next_report = start_time + REPORT_INTERVAL_SECONDS
+    paused_since = None
+    
+    print(f"{label}Starting to consume messages...")
     
     try:
-        for message in consumer:
-            topic = message.topic
-            key = message.key
-            value = message.value
-            
-            print(f"Received message from topic {topic} with key {key}")
+        # poll() rather than iteration so aged buffers are flushed while the topics are quiet
+        while True:
+            for tp, messages in consumer.poll(timeout_ms=POLL_TIMEOUT_MS).items():
+                if args.commit_on_flush:
+                    messages = skip_checkpointed(consumer, tp, messages, writer.checkpoint)
+                batch_bytes = 0
+                for message in messages:
+                    latency = end_to_end_latency(message)
+                    if latency is not None:
+                        latency_histogram.record(latency)
+                    batch_bytes += message.serialized_value_size + max(message.serialized_key_size, 0)
+                if messages:
+                    rejected = process_messages(messages, codecs, writer, sessionizer, warehouse)
+                    metrics.record_batch(len(messages), batch_bytes, rejected)
+                    messages_received += len(messages)
+                    bytes_received += batch_bytes
+                    last_message_time = time.monotonic()
             
-            # Process based on topic
-            if topic == 'telemedicine-appointments':
-                # Validate appointment data
-                errors = validate_appointment(value)
-                
-                if errors:
-                    print(f"Validation errors in appointment {key}: {errors}")
-                    error_data = {
-                        'data_type': 'appointment',
-                        'data_id': key,
-                        'errors': errors,
-                        'original_data': value
-                    }
-                    save_data(error_data, 'error', key)
-                else:
-                    # Save valid appointment data
-                    save_data(value, 'appointment', key)
+            if sessionizer is not None:
+                # The state files of the event partitions currently assigned (they move on rebalance)
+                sessionizer.assign(tp.partition for tp in consumer.assignment()
+                                   if tp.topic == 'telemedicine-events')
+                for session in sessionizer.expire():
+                    writer.write('session', session)
+            writer.maybe_flush()
+            if warehouse is not None:
+                warehouse.maybe_flush()
+            if paused_since is not None:
+                metrics.paused_seconds += time.monotonic() - last_loop_time
+                last_message_time = time.monotonic()  # Paused is not idle
+            last_loop_time = time.monotonic()
+            paused_since = apply_backpressure(consumer, writer, args.max_buffer_bytes, paused_since, label)
+            if args.commit_on_flush:
+                commit_checkpoint(consumer, writer, committed)
             
-            elif topic == 'telemedicine-events':
-                # Validate event data
-                errors = validate_event(value)
-                
-                if errors:
-                    print(f"Validation errors in event for appointment {key}: {errors}")
-                    error_data = {
-                        'data_type': 'event',
-                        'data_id': key,
-                        'errors': errors,
-                        'original_data': value
-                    }
-                    save_data(error_data, 'error', key)
-                else:
-                    # Save valid event data
-                    event_type = value.get('event_type', 'unknown')
-                    event_id = f"{key}_{event_type}"
-                    save_data(value, 'event', event_id)
+            now = time.monotonic()
+            if now >= next_export:
+                if export_latency:
+                    export_latency_metrics(END_TO_END_LATENCY_METRIC, latency_histogram)
+                    latency_histogram.reset()
+                export_latency_metrics(f"{metrics_prefix}_segment_flush", writer.flush_latency)
+                writer.flush_latency.reset()
+                metrics.export(partition_lag(consumer), writer.buffered_bytes)
+                next_export = now + args.metrics_interval_seconds
+            if now >= next_report:
+                summary = consumer_summary(messages_received, bytes_received, now - start_time, consumer_lag(consumer))
+                print(format_consumer_summary(f"{label}Progress", summary))
+                next_report = now + REPORT_INTERVAL_SECONDS
+            if args.max_idle_seconds is not None and now - last_message_time >= args.max_idle_seconds:
+                print(f"{label}No messages for {args.max_idle_seconds}s, stopping")
+                break
     
     except KeyboardInterrupt:
-        print("Consumer stopped by user")
+        print(f"{label}Consumer stopped by user")
     finally:
+        if warehouse is not None:
+            warehouse.close()
+        writer.close()
+        if sessionizer is not None:
+            sessionizer.close()  # After the final flush, which releases the last closed sessions
+        if args.commit_on_flush:
+            commit_checkpoint(consumer, writer, committed)
+        summary = consumer_summary(messages_received, bytes_received, time.monotonic() - start_time,
+                                   consumer_lag(consumer))
+        if not args.commit_on_flush:
+            consumer.commit()  # What close() would auto-commit, so the final lag is current
+        export_latency_metrics(f"{metrics_prefix}_segment_flush", writer.flush_latency)
+        metrics.export(partition_lag(consumer), writer.buffered_bytes)
         consumer.close()
-        print("Kafka consumer closed")
+        print(f"{label}Kafka consumer closed")
+        if export_latency:
+            export_latency_metrics(END_TO_END_LATENCY_METRIC, latency_histogram)
+    return summary, latency_histogram
+
+# Partition-parallel worker pool
+def consume_worker(task):
+    """Worker entry point: consume the assigned partitions with its own consumer and return its summary"""
+    label = f"[worker {task['worker_id']}] "
+    partitions = [TopicPartition(topic, partition) for topic, partition in task["partitions"]]
+    consumer = create_kafka_consumer([], partitions=partitions, **task["consumer_config"])
+    if not consumer:
+        return {"worker_id": task["worker_id"], "summary": None, "histogram": None}
+    
+    summary, histogram = consume_messages(consumer, task["args"], task["checkpoint"], label, export_latency=False,
+                                          metrics_prefix=f"{CONSUMER_METRICS_PREFIX}_worker{task['worker_id']}")
+    return {"worker_id": task["worker_id"], "summary": summary, "histogram": histogram}
+
+def consume_partitioned(num_workers, consumer_config, args):
+    """
+    Split the partitions of both topics across num_workers processes: partition p of each
+    topic goes to worker p % num_workers. A key always lands on the same partition, so each
+    worker sees every message for its keys in order. Returns per-worker summaries and the total.
+    """
+    metadata_consumer = create_kafka_consumer([], partitions=[], **consumer_config)
+    if not metadata_consumer:
+        return None
+    partitions = [(topic, partition) for topic in TOPICS
+                  for partition in sorted(metadata_consumer.partitions_for_topic(topic) or [])]
+    metadata_consumer.close(autocommit=False)
+    if not partitions:
+        print(f"No partitions found for topics {', '.join(TOPICS)}; nothing to consume")
+        return None
+    
+    # Durable mode: remove interrupted flushes once, before any worker starts writing
+    checkpoint = recover_checkpoint(args.output_dir) if args.commit_on_flush else {}
+    if args.warehouse == "sqlite" and num_workers > 1:
+        print(f"Note: the {num_workers} workers take turns upserting into the SQLite warehouse; "
+              f"use --warehouse postgres for parallel upserts")
+    
+    tasks = [{
+        "worker_id": worker_id,
+        "partitions": [tp for tp in partitions if tp[1] % num_workers == worker_id],
+        "consumer_config": consumer_config,
+        "checkpoint": checkpoint,
+        "args": args
+    } for worker_id in range(num_workers)]
+    tasks = [task for task in tasks if task["partitions"]]
+    
+    print(f"Consuming {len(partitions)} partitions with {len(tasks)} worker processes...")
+    with ProcessPoolExecutor(max_workers=len(tasks)) as executor:
+        futures = [executor.submit(consume_worker, task) for task in tasks]
+        # Workers handle Ctrl-C themselves (flush, commit, report); the parent waits for their results
+        previous_handler = signal.signal(signal.SIGINT, signal.SIG_IGN)
+        try:
+            results = [future.result() for future in futures]
+        finally:
+            signal.signal(signal.SIGINT, previous_handler)
+    
+    completed = [r for r in results if r["summary"] is not None]
+    summaries = [r["summary"] for r in completed]
+    histogram = LatencyHistogram()
+    for r in completed:
+        histogram.merge(r["histogram"])
+    report = {
+        "workers": {r["worker_id"]: r["summary"] for r in completed},
+        # Workers run concurrently, so elapsed is the slowest worker's
+        "total": consumer_summary(sum(s["messages"] for s in summaries), sum(s["bytes"] for s in summaries),
+                                  max((s["elapsed_seconds"] for s in summaries), default=0.0),
+                                  sum(s["lag"] for s in summaries))
+    }
+    export_latency_metrics(END_TO_END_LATENCY_METRIC, histogram)
+    
+    print("Consumer report:")
+    for worker_id, summary in report["workers"].items():
+        print("  " + format_consumer_summary(f"worker {worker_id}", summary))
+    print("  " + format_consumer_summary("total", report["total"]))
+    if len(completed) < len(tasks):
+        print(f"  {len(tasks) - len(completed)} worker(s) could not create a consumer")
+    return report
+
+def main(argv=None):
+    args = parse_args(argv)
+    consumer_config = build_consumer_config(args)
+    
+    if args.workers > 1:
+        consume_partitioned(args.workers, consumer_config, args)
+        return
+    
+    # Create Kafka consumer
+    consumer = create_kafka_consumer(TOPICS, **consumer_config)
+    
+    if not consumer:
+        return
+    
+    summary, _ = consume_messages(consumer, args)
+    print(format_consumer_summary("Consumer", summary))
 
 if __name__ == "__main__":
     main()
@@ -1,25 +1,76 @@
-import json
+import sys
 import time
 import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 from kafka import KafkaProducer
-from datetime import datetime, timedelta
-import random
+from datetime import datetime
 import pandas as pd
 
-# Configure Kafka producer
-def create_kafka_producer():
+from local_broker import LOCAL_BROKER_DIR, LocalBroker, LocalProducer
+from client_config import KAFKA_CLIENT_CONFIG_FILE, COMPRESSION_TYPES, load_kafka_client_config, compression_setting
+from message_codecs import DEFAULT_CODEC, SCHEMA_REGISTRY_FILE, JsonCodec, get_codec, codec_headers
+from stream_metrics import SendMetrics, aggregate_summaries, format_summary, produced_at_header, export_latency_metrics
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data_sources'))
+from event_stream import build_event_sequences
+
+# Topics
+APPOINTMENT_TOPIC = "telemedicine-appointments"
+EVENTS_TOPIC = "telemedicine-events"
+
+# Throughput mode defaults
+DEFAULT_LINGER_MS = 5  # Wait up to 5 ms to fill a batch before sending it
+DEFAULT_BATCH_SIZE = 64 * 1024  # Bytes per partition batch
+DEFAULT_ACKS = 1
+PROGRESS_INTERVAL_SECONDS = 5
+
+# Monitoring metric name prefix for produce-to-ack latency percentiles
+PRODUCE_LATENCY_METRIC = "kafka_produce_ack"
+
+# Configure Kafka producer; settings (linger_ms, batch_size, acks, compression_type, ...) go to KafkaProducer.
+# With local_broker_dir, messages go to a file-backed LocalBroker instead of a Kafka cluster
+def create_kafka_producer(local_broker_dir=None, **settings):
     try:
-        producer = KafkaProducer(
-            bootstrap_servers=['localhost:9092'],
-            value_serializer=lambda v: json.dumps(v).encode('utf-8'),
-            key_serializer=lambda v: v.encode('utf-8') if v else None
-        )
-        print("Kafka producer created successfully")
+        if local_broker_dir:
+            producer = LocalProducer(
+                LocalBroker(local_broker_dir),
+                key_serializer=lambda v: v.encode('utf-8') if v else None,
+                **settings
+            )
+        else:
+            producer = KafkaProducer(
+                bootstrap_servers=['localhost:9092'],
+                key_serializer=lambda v: v.encode('utf-8') if v else None,
+                **settings
+            )
+        print(f"{'Local' if local_broker_dir else 'Kafka'} producer created successfully "
+              f"({format_producer_settings(settings)})")
         return producer
     except Exception as e:
         print(f"Error creating Kafka producer: {e}")
         return None
 
+def format_producer_settings(settings):
+    """Short description of the batching and compression settings for log lines"""
+    return (f"compression={settings.get('compression_type') or 'none'}, "
+            f"linger_ms={settings.get('linger_ms', 0)}, batch_size={settings.get('batch_size', 16384)}")
+
+# Producer settings: mode defaults, then the client config file, then command-line options
+def build_producer_config(args):
+    producer_config = {}
+    if args.mode in ("throughput", "replay"):
+        producer_config.update(linger_ms=DEFAULT_LINGER_MS, batch_size=DEFAULT_BATCH_SIZE, acks=DEFAULT_ACKS)
+    producer_config.update(load_kafka_client_config(args.client_config)["producer"])
+    
+    overrides = {"linger_ms": args.linger_ms, "batch_size": args.batch_size, "acks": args.acks}
+    producer_config.update({name: value for name, value in overrides.items() if value is not None})
+    if args.compression is not None:
+        producer_config["compression_type"] = compression_setting(args.compression)
+    if args.local_broker:
+        producer_config["local_broker_dir"] = args.local_broker
+    return producer_config
+
 # Load appointment data
 def load_appointment_data():
     try:
@@ -30,174 +81,338 @@ def load_appointment_data():
         print(f"Error loading appointment data: {e}")
         return pd.DataFrame()
 
+# Encode a value with the codec; headers declare the codec and stamp the produce time for the consumer
+def send_message(producer, topic, key, value, codec):
+    """producer.send() for codec-encoded values; returns the send future"""
+    return send_encoded(producer, topic, key, codec.encode(topic, value), codec)
+
+def send_encoded(producer, topic, key, data, codec):
+    """send_message() for a value already encoded with codec"""
+    headers = codec_headers(codec) + [produced_at_header()]
+    return producer.send(topic, key=key, value=data, headers=headers)
+
+# Event construction: events come from the offline event stream's column-wise builder
+# (data_sources/event_stream.py), a chunk of appointments at a time
+EVENT_CHUNK_SIZE = 10000
+
+def column_records(names, columns):
+    """Rows of dicts from parallel lists of values"""
+    return [dict(zip(names, row)) for row in zip(*columns)]
+
+def appointment_records(appointments_df):
+    """df.to_dict("records") with plain Python values, without pandas' per-cell boxing"""
+    return column_records(list(appointments_df.columns),
+                          [appointments_df[name].to_numpy().tolist() for name in appointments_df.columns])
+
+def encoded_event_sequences(appointments_df, codec, rng=None):
+    """build_event_sequences() as (event_type, timestamp, value encoded with codec) tuples"""
+    if codec.name == "json":
+        # The event stream serializes the values already: send those bytes as they are
+        return build_event_sequences(appointments_df, rng, encoded=True)
+    return [[(event["event_type"], event["timestamp"], codec.encode(EVENTS_TOPIC, event)) for event in events]
+            for events in build_event_sequences(appointments_df, rng)]
+
+def iter_appointment_events(appointments_df, codec=None, chunk_size=EVENT_CHUNK_SIZE, rng=None):
+    """
+    Yield (appointment dict, events) for every row, building events chunk_size appointments at a time.
+    Events are (event_type, timestamp, encoded value) tuples, ready for send_encoded()
+    """
+    codec = codec or JsonCodec()
+    for chunk_start in range(0, len(appointments_df), chunk_size):
+        chunk_df = appointments_df.iloc[chunk_start:chunk_start + chunk_size]
+        yield from zip(appointment_records(chunk_df), encoded_event_sequences(chunk_df, codec, rng))
+
 # Simulate real-time appointment events
-def simulate_appointment_events(producer, appointments_df):
+def simulate_appointment_events(producer, appointments_df, sample_size=100, codec=None, metrics=None):
+    codec = codec or JsonCodec()
+    if metrics is None:
+        metrics = SendMetrics()
+    
     # Topics
-    appointment_topic = "telemedicine-appointments"
-    events_topic = "telemedicine-events"
-    
-    # Event types
-    event_types = [
-        "appointment_scheduled", 
-        "patient_login", 
-        "provider_login", 
-        "session_started", 
-        "session_ended", 
-        "technical_issue",
-        "appointment_cancelled",
-        "appointment_rescheduled"
-    ]
+    appointment_topic = APPOINTMENT_TOPIC
+    events_topic = EVENTS_TOPIC
     
     # Get a sample of appointments to simulate
-    sample_appointments = appointments_df.sample(min(100, len(appointments_df)))
+    sample_appointments = appointments_df.sample(min(sample_size, len(appointments_df)))
     
     print(f"Simulating events for {len(sample_appointments)} appointments...")
     
-    for _, appointment in sample_appointments.iterrows():
+    messages_sent = 0
+    start_time = time.perf_counter()
+    
+    for appointment, events in iter_appointment_events(sample_appointments, codec):
         # Send the appointment data
         appointment_id = appointment['appointment_id']
-        producer.send(appointment_topic, key=appointment_id, value=appointment.to_dict())
-        
-        # Simulate a sequence of events for this appointment
-        appointment_date = datetime.strptime(appointment['appointment_date'], '%Y-%m-%d')
-        scheduled_time = appointment['scheduled_time']
-        
-        # Base timestamp for the appointment
-        base_timestamp = datetime.combine(appointment_date.date(), 
-                                         datetime.strptime(scheduled_time, '%H:%M:%S').time())
-        
-        # Generate a sequence of events
-        events = []
-        
-        # Appointment scheduled (happened in the past)
-        events.append({
-            "event_type": "appointment_scheduled",
-            "appointment_id": appointment_id,
-            "patient_id": appointment["patient_id"],
-            "provider_id": appointment["provider_id"],
-            "timestamp": (base_timestamp - timedelta(days=random.randint(1, 7))).strftime("%Y-%m-%d %H:%M:%S"),
-            "details": {
-                "scheduled_time": scheduled_time,
-                "appointment_type": appointment["appointment_type"]
-            }
-        })
-        
-        # If appointment was cancelled or rescheduled, add that event
-        if appointment["status"] == "Cancelled":
-            events.append({
-                "event_type": "appointment_cancelled",
-                "appointment_id": appointment_id,
-                "patient_id": appointment["patient_id"],
-                "provider_id": appointment["provider_id"],
-                "timestamp": (base_timestamp - timedelta(hours=random.randint(1, 24))).strftime("%Y-%m-%d %H:%M:%S"),
-                "details": {
-                    "reason": random.choice(["Patient request", "Provider unavailable", "Emergency", "Other"])
-                }
-            })
-        elif appointment["status"] == "Rescheduled":
-            events.append({
-                "event_type": "appointment_rescheduled",
-                "appointment_id": appointment_id,
-                "patient_id": appointment["patient_id"],
-                "provider_id": appointment["provider_id"],
-                "timestamp": (base_timestamp - timedelta(hours=random.randint(1, 24))).strftime("%Y-%m-%d %H:%M:%S"),
-                "details": {
-                    "original_time": scheduled_time,
-                    "new_time": (datetime.strptime(scheduled_time, '%H:%M:%S') + 
-                                timedelta(days=random.randint(1, 7))).strftime('%H:%M:%S'),
-                    "reason": random.choice(["Patient request", "Provider unavailable", "Emergency", "Other"])
-                }
-            })
-        
-        # For completed appointments, simulate the full flow
-        if appointment["status"] == "Completed":
-            # Patient login
-            patient_login_time = base_timestamp - timedelta(minutes=random.randint(5, 15))
-            events.append({
-                "event_type": "patient_login",
-                "appointment_id": appointment_id,
-                "patient_id": appointment["patient_id"],
-                "timestamp": patient_login_time.strftime("%Y-%m-%d %H:%M:%S"),
-                "details": {
-                    "device_type": appointment["device_type"],
-                    "operating_system": appointment["operating_system"],
-                    "browser": appointment["browser"]
-                }
-            })
-            
-            # Provider login
-            provider_login_time = base_timestamp - timedelta(minutes=random.randint(0, 5))
-            events.append({
-                "event_type": "provider_login",
-                "appointment_id": appointment_id,
-                "provider_id": appointment["provider_id"],
-                "timestamp": provider_login_time.strftime("%Y-%m-%d %H:%M:%S"),
-                "details": {
-                    "device_type": random.choice(["Laptop", "Desktop"]),
-                    "operating_system": random.choice(["Windows", "macOS"]),
-                    "browser": random.choice(["Chrome", "Firefox", "Edge"])
-                }
-            })
-            
-            # Session started
-            session_start_time = base_timestamp + timedelta(minutes=appointment["wait_time_minutes"])
-            events.append({
-                "event_type": "session_started",
-                "appointment_id": appointment_id,
-                "patient_id": appointment["patient_id"],
-                "provider_id": appointment["provider_id"],
-                "timestamp": session_start_time.strftime("%Y-%m-%d %H:%M:%S"),
-                "details": {
-                    "connection_quality": appointment["connection_quality"],
-                    "wait_time_minutes": appointment["wait_time_minutes"]
-                }
-            })
-            
-            # Technical issues (if any)
-            if appointment["had_technical_issues"]:
-                issue_time = session_start_time + timedelta(minutes=random.randint(1, 10))
-                events.append({
-                    "event_type": "technical_issue",
-                    "appointment_id": appointment_id,
-                    "timestamp": issue_time.strftime("%Y-%m-%d %H:%M:%S"),
-                    "details": {
-                        "issue_type": appointment["technical_issue_type"],
-                        "severity": random.choice(["Low", "Medium", "High"]),
-                        "resolved": random.choice([True, False])
-                    }
-                })
-            
-            # Session ended
-            session_end_time = session_start_time + timedelta(minutes=appointment["duration_minutes"])
-            events.append({
-                "event_type": "session_ended",
-                "appointment_id": appointment_id,
-                "patient_id": appointment["patient_id"],
-                "provider_id": appointment["provider_id"],
-                "timestamp": session_end_time.strftime("%Y-%m-%d %H:%M:%S"),
-                "details": {
-                    "duration_minutes": appointment["duration_minutes"],
-                    "ended_normally": not appointment["had_technical_issues"] or random.random() > 0.3
-                }
-            })
-        
-        # Sort events by timestamp
-        events.sort(key=lambda x: x["timestamp"])
+        metrics.track(send_message(producer, appointment_topic, appointment_id, appointment, codec))
+        messages_sent += 1
         
-        # Send events to Kafka
-        for event in events:
-            producer.send(events_topic, key=appointment_id, value=event)
-            print(f"Sent event: {event['event_type']} for appointment {appointment_id}")
+        # Send events to Kafka; delivery callbacks record ack latency and failures
+        for event_type, _, data in events:
+            metrics.track(send_encoded(producer, events_topic, appointment_id, data, codec))
+            messages_sent += 1
+            print(f"Sent event: {event_type} for appointment {appointment_id}")
             time.sleep(0.1)  # Small delay between events
         
         # Flush after each appointment's events
         producer.flush()
         print(f"Completed sending events for appointment {appointment_id}")
         time.sleep(0.5)  # Delay between appointments
+    
+    stats = metrics.summary(messages_sent, time.perf_counter() - start_time)
+    print(format_summary(f"Sent {len(sample_appointments)} appointments", stats))
+    return stats
+
+# Token bucket rate limiter for the throughput mode
+class RateLimiter:
+    """Limit sends to rate messages/sec on average, allowing bursts of up to burst messages"""
+    
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst) if burst else max(1.0, self.rate / 100)  # 10 ms worth by default
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+    
+    def acquire(self, count=1):
+        """Take count tokens, sleeping until the bucket has refilled enough to cover them"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= count
+        if self.tokens < 0:
+            time.sleep(-self.tokens / self.rate)
+
+# Send appointments and their events at production-level load
+def produce_appointment_events(producer, appointments_df, sample_size=None, rate=None, burst=None,
+                               metrics=None, label="", codec=None):
+    """
+    Throughput mode: asynchronous sends with no per-event sleeps or flushes, an optional
+    target rate (messages/sec across both topics) and a single flush at the end.
+    Returns message and byte rates, delivery latency percentiles and error counts.
+    """
+    if sample_size is not None and sample_size < len(appointments_df):
+        appointments_df = appointments_df.sample(sample_size)
+    limiter = RateLimiter(rate, burst) if rate else None
+    if metrics is None:
+        metrics = SendMetrics()
+    codec = codec or JsonCodec()
+    
+    print(f"{label}Producing events for {len(appointments_df)} appointments"
+          f"{f' at up to {rate:,.0f} messages/sec' if rate else ''}...")
+    
+    appointments_sent = 0
+    messages_sent = 0
+    start_time = time.perf_counter()
+    next_report = start_time + PROGRESS_INTERVAL_SECONDS
+    
+    for appointment, events in iter_appointment_events(appointments_df, codec):
+        appointment_id = appointment['appointment_id']
+        
+        if limiter:
+            limiter.acquire(1 + len(events))
+        metrics.track(send_message(producer, APPOINTMENT_TOPIC, appointment_id, appointment, codec))
+        for _, _, data in events:
+            metrics.track(send_encoded(producer, EVENTS_TOPIC, appointment_id, data, codec))
+        
+        appointments_sent += 1
+        messages_sent += 1 + len(events)
+        
+        now = time.perf_counter()
+        if now >= next_report:
+            print(f"{label}Sent {messages_sent} messages ({messages_sent / (now - start_time):,.0f}/sec)")
+            next_report = now + PROGRESS_INTERVAL_SECONDS
+    
+    # Single flush: wait for every outstanding batch to be acknowledged
+    producer.flush()
+    elapsed = time.perf_counter() - start_time
+    
+    stats = {"appointments": appointments_sent, **metrics.summary(messages_sent, elapsed)}
+    print(format_summary(f"{label}Sent {appointments_sent} appointments", stats))
+    return stats
 
-def main():
+# Replay events on the timeline given by their own timestamps, compressed by a speed-up factor
+def replay_appointment_events(producer, appointments_df, speedup=1.0, sample_size=None, codec=None, metrics=None):
+    """
+    Time-warp mode: send each message when its event timestamp comes due, with the gaps
+    between timestamps divided by speedup (60 = one event-time minute per second; 0 = as fast
+    as possible). The appointment record is sent at its appointment_scheduled time.
+    Returns counts, elapsed time and how far sends fell behind schedule.
+    """
+    if sample_size is not None and sample_size < len(appointments_df):
+        appointments_df = appointments_df.sample(sample_size)
+    codec = codec or JsonCodec()
+    if metrics is None:
+        metrics = SendMetrics()
+    
+    # Collect every encoded message with its event time; stable sort keeps per-appointment order on ties
+    messages = []
+    for appointment, events in iter_appointment_events(appointments_df, codec):
+        appointment_id = appointment['appointment_id']
+        scheduled_at = next(timestamp for event_type, timestamp, _ in events if event_type == "appointment_scheduled")
+        messages.append((scheduled_at, APPOINTMENT_TOPIC, appointment_id, codec.encode(APPOINTMENT_TOPIC, appointment)))
+        messages.extend((timestamp, EVENTS_TOPIC, appointment_id, data) for _, timestamp, data in events)
+    messages.sort(key=lambda message: message[0])
+    
+    if not messages:
+        print("No messages to replay")
+        return {"messages": 0, "errors": 0, "elapsed_seconds": 0.0, "event_time_span_seconds": 0.0,
+                "max_lag_seconds": 0.0, "messages_per_second": 0.0}
+    
+    first_event_time = datetime.fromisoformat(messages[0][0])
+    event_time_span = (datetime.fromisoformat(messages[-1][0]) - first_event_time).total_seconds()
+    print(f"Replaying {len(messages)} messages spanning {event_time_span / 3600:,.1f} hours of event time "
+          f"{f'at {speedup:g}x' if speedup else 'as fast as possible'}...")
+    
+    max_lag = 0.0
+    start_time = time.perf_counter()
+    next_report = start_time + PROGRESS_INTERVAL_SECONDS
+    
+    for sent, (timestamp, topic, key, data) in enumerate(messages, start=1):
+        if speedup:
+            due = start_time + (datetime.fromisoformat(timestamp) - first_event_time).total_seconds() / speedup
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                max_lag = max(max_lag, -delay)
+        metrics.track(send_encoded(producer, topic, key, data, codec))
+        
+        now = time.perf_counter()
+        if now >= next_report:
+            print(f"Sent {sent} messages, event time {timestamp}, max lag {max_lag:.3f}s")
+            next_report = now + PROGRESS_INTERVAL_SECONDS
+    
+    producer.flush()
+    elapsed = time.perf_counter() - start_time
+    
+    stats = {
+        **metrics.summary(len(messages), elapsed),
+        "event_time_span_seconds": event_time_span,
+        "max_lag_seconds": max_lag
+    }
+    print(format_summary(f"Replayed {len(messages)} messages (max lag {max_lag:.3f}s)", stats))
+    return stats
+
+# Multi-process producer: appointments sharded by appointment_id hash, one producer per worker
+def produce_worker(task):
+    """Worker entry point: send one shard with its own producer and return its metrics"""
+    label = f"[worker {task['worker_id']}] "
+    producer = create_kafka_producer(**task["producer_config"])
+    if not producer:
+        return {"worker_id": task["worker_id"], "summary": None, "histogram": None}
+    
+    metrics = SendMetrics()
+    summary = produce_appointment_events(
+        producer, task["appointments_df"], rate=task["rate"], burst=task["burst"], metrics=metrics, label=label,
+        codec=get_codec(task["codec"], task["schema_registry"])
+    )
+    producer.close()
+    return {"worker_id": task["worker_id"], "summary": summary, "histogram": metrics.histogram}
+
+def produce_partitioned(appointments_df, num_workers, producer_config, sample_size=None, rate=None, burst=None,
+                        codec_name=DEFAULT_CODEC, schema_registry=SCHEMA_REGISTRY_FILE, metrics=None):
+    """
+    Shard appointments across num_workers processes by a stable hash of appointment_id.
+    Every message for an appointment is sent by the same worker in order, so per-key
+    ordering on both topics is preserved. rate and burst are totals across all workers.
+    Returns per-worker summaries and the aggregate; worker latency histograms, bytes and
+    errors are also merged into metrics if given.
+    """
+    if sample_size is not None and sample_size < len(appointments_df):
+        appointments_df = appointments_df.sample(sample_size)
+    
+    shards = (pd.util.hash_pandas_object(appointments_df["appointment_id"], index=False).to_numpy()
+              % num_workers)
+    tasks = [{
+        "worker_id": worker_id,
+        "appointments_df": appointments_df[shards == worker_id],
+        "producer_config": producer_config,
+        "rate": rate / num_workers if rate else None,
+        "burst": burst / num_workers if burst else None,
+        "codec": codec_name,
+        "schema_registry": schema_registry
+    } for worker_id in range(num_workers)]
+    
+    print(f"Producing {len(appointments_df)} appointments with {num_workers} worker processes...")
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        results = list(executor.map(produce_worker, tasks))
+    
+    completed = [r for r in results if r["summary"] is not None]
+    report = {
+        "workers": {r["worker_id"]: r["summary"] for r in completed},
+        "total": aggregate_summaries([r["summary"] for r in completed], [r["histogram"] for r in completed])
+    }
+    if metrics is not None:
+        for r in completed:
+            metrics.histogram.merge(r["histogram"])
+            metrics.bytes_sent += r["summary"]["bytes"]
+            metrics.errors += r["summary"]["errors"]
+    
+    print("Producer report:")
+    for worker_id, summary in report["workers"].items():
+        print("  " + format_summary(f"worker {worker_id}", summary))
+    print("  " + format_summary("total", report["total"]))
+    if len(completed) < num_workers:
+        print(f"  {num_workers - len(completed)} worker(s) could not create a producer")
+    return report
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Produce telemedicine appointment events to Kafka")
+    parser.add_argument("--mode", choices=["simulate", "throughput", "replay"], default="simulate",
+                        help="simulate: paced demo with sleeps; throughput: batched asynchronous sends; "
+                             "replay: sends scheduled by event timestamps")
+    parser.add_argument("--sample-size", type=int, default=None,
+                        help="Appointments to send (default: 100 in simulate mode, all otherwise)")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="Target messages/sec in throughput mode (default: unlimited)")
+    parser.add_argument("--burst", type=int, default=None, help="Rate limiter burst size in messages")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Producer processes in throughput mode, sharded by appointment_id (default: 1)")
+    parser.add_argument("--speedup", type=lambda v: 0.0 if v == "max" else float(v), default=3600.0,
+                        help="Replay speed-up over event time, e.g. 1, 60, 3600, or max (default: 3600)")
+    parser.add_argument("--linger-ms", type=int, default=None,
+                        help=f"Producer linger.ms (throughput default: {DEFAULT_LINGER_MS})")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help=f"Producer batch.size in bytes (throughput default: {DEFAULT_BATCH_SIZE})")
+    parser.add_argument("--codec", choices=["json", "binary"], default=DEFAULT_CODEC,
+                        help="Payload codec, declared to consumers in a message header (default: json)")
+    parser.add_argument("--schema-registry", default=SCHEMA_REGISTRY_FILE,
+                        help="Schema registry file for the binary codec")
+    parser.add_argument("--acks", type=lambda v: v if v == "all" else int(v), default=None,
+                        help=f"Producer acks: 0, 1 or all (default: {DEFAULT_ACKS})")
+    parser.add_argument("--compression", choices=COMPRESSION_TYPES, default=None,
+                        help="Producer compression.type (default: none, or the client config file's setting)")
+    parser.add_argument("--client-config", default=KAFKA_CLIENT_CONFIG_FILE,
+                        help="JSON file with KafkaProducer/KafkaConsumer settings")
+    parser.add_argument("--local-broker", nargs="?", const=LOCAL_BROKER_DIR, default=None, metavar="LOG_DIR",
+                        help=f"Produce to a file-backed local broker instead of Kafka (default dir: {LOCAL_BROKER_DIR})")
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.workers > 1 and args.mode != "throughput":
+        parser.error(f"--workers only applies to throughput mode, not {args.mode} mode")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    
+    # Producer settings; throughput and replay modes batch by default
+    producer_config = build_producer_config(args)
+    
+    # Produce-to-ack latency from every mode is exported to the monitoring metrics store at the end
+    metrics = SendMetrics()
+    
+    # Multi-process throughput mode: every worker creates its own producer
+    if args.mode == "throughput" and args.workers > 1:
+        appointments_df = load_appointment_data()
+        if not appointments_df.empty:
+            produce_partitioned(appointments_df, args.workers, producer_config,
+                                sample_size=args.sample_size, rate=args.rate, burst=args.burst,
+                                codec_name=args.codec, schema_registry=args.schema_registry, metrics=metrics)
+            export_latency_metrics(PRODUCE_LATENCY_METRIC, metrics.histogram)
+        return
+    
     # Create Kafka producer
-    producer = create_kafka_producer()
+    producer = create_kafka_producer(**producer_config)
     if not producer:
         return
     
@@ -206,12 +421,25 @@ def main():
     if appointments_df.empty:
         return
     
-    # Simulate appointment events
-    simulate_appointment_events(producer, appointments_df)
+    codec = get_codec(args.codec, args.schema_registry)
+    if args.mode == "throughput":
+        produce_appointment_events(
+            producer, appointments_df, sample_size=args.sample_size, rate=args.rate, burst=args.burst,
+            metrics=metrics, codec=codec
+        )
+    elif args.mode == "replay":
+        replay_appointment_events(producer, appointments_df, speedup=args.speedup, sample_size=args.sample_size,
+                                  codec=codec, metrics=metrics)
+    else:
+        # Simulate appointment events
+        simulate_appointment_events(producer, appointments_df, sample_size=args.sample_size or 100, codec=codec,
+                                    metrics=metrics)
     
     # Close the producer
     producer.close()
     print("Kafka producer closed")
+    
+    export_latency_metrics(PRODUCE_LATENCY_METRIC, metrics.histogram)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,271 @@
+import json
+import os
+import glob
+import time
+import uuid
+import argparse
+from kafka import KafkaProducer, KafkaConsumer, TopicPartition
+from kafka import codec as kafka_codec
+
+from client_config import KAFKA_CLIENT_CONFIG_FILE, COMPRESSION_TYPES, load_kafka_client_config, compression_setting
+from message_codecs import SCHEMA_REGISTRY_FILE, get_codec, codec_headers
+from stream_metrics import SendMetrics, format_summary
+
+# Compression and batching benchmark
+#
+# Replays the event stream written by data_sources/event_stream.py and reports, for every
+# compression type x batch size (x payload codec):
+#
+#   offline     - producer batches rebuilt per partition file (keys + values up to batch_size
+#                 bytes), compressed with the same codec functions kafka-python uses: compression
+#                 ratio and compress / decompress MB/s. Runs without a broker.
+#   end-to-end  - with --bootstrap-servers, the messages are produced to a fresh topic with those
+#                 producer settings, then consumed back with the consumer settings: produce,
+#                 consume and end-to-end messages/sec, plus the broker-side compression rate
+#                 reported by the producer.
+#
+# Compression types whose Python library isn't installed (python-snappy, lz4, zstandard) are
+# reported as unavailable and skipped.
+
+EVENT_STREAM_DIR = "/home/ubuntu/telemedicine_pipeline/data_sources/event_stream"
+DEFAULT_BATCH_SIZES = [16384, 65536, 262144]
+DEFAULT_MAX_MESSAGES = 200000
+BENCHMARK_TOPIC_PREFIX = "benchmark-compression"
+
+COMPRESSORS = {
+    "none": (lambda: True, lambda data: data, lambda data: data),
+    "gzip": (kafka_codec.has_gzip, kafka_codec.gzip_encode, kafka_codec.gzip_decode),
+    "snappy": (kafka_codec.has_snappy, kafka_codec.snappy_encode, kafka_codec.snappy_decode),
+    "lz4": (kafka_codec.has_lz4, kafka_codec.lz4_encode, kafka_codec.lz4_decode),
+    "zstd": (kafka_codec.has_zstd, kafka_codec.zstd_encode, kafka_codec.zstd_decode)
+}
+
+# Load the materialized event stream
+def load_event_stream(stream_dir=EVENT_STREAM_DIR, max_messages=DEFAULT_MAX_MESSAGES):
+    """
+    Read messages per topic partition file as (topic, file) -> [(appointment_id, value dict)].
+    max_messages is spread evenly over the files, keeping each file's time order.
+    """
+    files = sorted(glob.glob(os.path.join(stream_dir, "*", "partition-*.ndjson")))
+    if not files:
+        print(f"No event stream found in {stream_dir}; run data_sources/event_stream.py first")
+        return {}
+    per_file = -(-max_messages // len(files)) if max_messages else None
+
+    partitions = {}
+    for path in files:
+        topic = os.path.basename(os.path.dirname(path))
+        messages = []
+        with open(path) as f:
+            for line in f:
+                if per_file is not None and len(messages) >= per_file:
+                    break
+                value = json.loads(line)
+                messages.append((value["appointment_id"], value))
+        partitions[(topic, os.path.basename(path))] = messages
+
+    total = sum(len(messages) for messages in partitions.values())
+    print(f"Loaded {total} messages from {len(files)} partition files in {stream_dir}")
+    return partitions
+
+# Encode message values with a payload codec
+def encode_partitions(partitions, codec):
+    """(topic, file) -> [(key bytes, value bytes)]"""
+    return {
+        (topic, name): [(key.encode("utf-8"), codec.encode(topic, value)) for key, value in messages]
+        for (topic, name), messages in partitions.items()
+    }
+
+# Group each partition's records into producer-sized batches
+def build_batches(encoded_partitions, batch_size):
+    """Concatenate consecutive keys + values per partition until a batch reaches batch_size bytes"""
+    batches = []
+    for messages in encoded_partitions.values():
+        batch, size = [], 0
+        for key, value in messages:
+            record_size = len(key) + len(value)
+            if batch and size + record_size > batch_size:
+                batches.append(b"".join(batch))
+                batch, size = [], 0
+            batch.extend((key, value))
+            size += record_size
+        if batch:
+            batches.append(b"".join(batch))
+    return batches
+
+# Compression ratio and speed on the rebuilt batches
+def benchmark_offline(batches, compression):
+    _, encode, decode = COMPRESSORS[compression]
+    raw_bytes = sum(len(batch) for batch in batches)
+
+    start_time = time.perf_counter()
+    compressed = [encode(batch) for batch in batches]
+    compress_seconds = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    for data in compressed:
+        decode(data)
+    decompress_seconds = time.perf_counter() - start_time
+
+    compressed_bytes = sum(len(data) for data in compressed)
+    if compression == "none":
+        compress_seconds = decompress_seconds = 0.0  # Nothing to time for the uncompressed baseline
+    return {
+        "batches": len(batches),
+        "raw_bytes": raw_bytes,
+        "compressed_bytes": compressed_bytes,
+        "compression_ratio": raw_bytes / compressed_bytes if compressed_bytes else 0.0,
+        "compress_mb_per_second": raw_bytes / compress_seconds / 1e6 if compress_seconds > 0 else None,
+        "decompress_mb_per_second": raw_bytes / decompress_seconds / 1e6 if decompress_seconds > 0 else None
+    }
+
+# Produce the messages to a fresh topic, then consume them back
+def benchmark_end_to_end(bootstrap_servers, encoded_partitions, codec, producer_settings, consumer_settings,
+                         timeout_seconds=60):
+    """Returns produce / consume / end-to-end rates, or None if the broker can't be reached"""
+    topic = f"{BENCHMARK_TOPIC_PREFIX}-{uuid.uuid4().hex[:8]}"
+    messages = [message for partition in encoded_partitions.values() for message in partition]
+    headers = codec_headers(codec)
+
+    try:
+        producer = KafkaProducer(bootstrap_servers=bootstrap_servers, **producer_settings)
+    except Exception as e:
+        print(f"Skipping end-to-end benchmark, could not create Kafka producer: {e}")
+        return None
+
+    metrics = SendMetrics()
+    start_time = time.perf_counter()
+    for key, value in messages:
+        metrics.track(producer.send(topic, key=key, value=value, headers=headers))
+    producer.flush()
+    produce_seconds = time.perf_counter() - start_time
+    produce_summary = metrics.summary(len(messages), produce_seconds)
+    compression_rate = producer.metrics().get("producer-metrics", {}).get("compression-rate-avg")
+    producer.close()
+    print("  " + format_summary("produce", produce_summary))
+
+    consumer = KafkaConsumer(bootstrap_servers=bootstrap_servers, group_id=None, enable_auto_commit=False,
+                             **consumer_settings)
+    consumer.assign([TopicPartition(topic, partition) for partition in consumer.partitions_for_topic(topic) or []])
+    consumer.seek_to_beginning()
+
+    received, received_bytes = 0, 0
+    start_time = time.perf_counter()
+    deadline = start_time + timeout_seconds
+    while received < len(messages) and time.perf_counter() < deadline:
+        for records in consumer.poll(timeout_ms=1000).values():
+            received += len(records)
+            received_bytes += sum(len(record.value) + len(record.key or b"") for record in records)
+    consume_seconds = time.perf_counter() - start_time
+    consumer.close()
+    if received < len(messages):
+        print(f"  Consumed only {received} of {len(messages)} messages within {timeout_seconds}s")
+
+    total_seconds = produce_seconds + consume_seconds
+    return {
+        "topic": topic,
+        "produced": len(messages),
+        "consumed": received,
+        "produce_messages_per_second": produce_summary["messages_per_second"],
+        "produce_latency_p99_ms": produce_summary["latency_p99_ms"],
+        "produce_errors": produce_summary["errors"],
+        "broker_compression_rate": compression_rate,
+        "consume_messages_per_second": received / consume_seconds if consume_seconds > 0 else 0.0,
+        "consume_mb_per_second": received_bytes / consume_seconds / 1e6 if consume_seconds > 0 else 0.0,
+        "end_to_end_messages_per_second": received / total_seconds if total_seconds > 0 else 0.0
+    }
+
+# Run every compression x batch size x codec combination
+def run_benchmark(stream_dir=EVENT_STREAM_DIR, compressions=COMPRESSION_TYPES, batch_sizes=DEFAULT_BATCH_SIZES,
+                  codecs=("json",), max_messages=DEFAULT_MAX_MESSAGES, bootstrap_servers=None, linger_ms=5,
+                  client_config=KAFKA_CLIENT_CONFIG_FILE, schema_registry=SCHEMA_REGISTRY_FILE):
+    partitions = load_event_stream(stream_dir, max_messages)
+    if not partitions:
+        return []
+
+    available = [c for c in compressions if COMPRESSORS[c][0]()]
+    for compression in compressions:
+        if compression not in available:
+            print(f"Compression {compression} unavailable: its Python library is not installed")
+
+    config = load_kafka_client_config(client_config)
+    results = []
+    for codec_name in codecs:
+        codec = get_codec(codec_name, schema_registry)
+        encoded = encode_partitions(partitions, codec)
+
+        for batch_size in batch_sizes:
+            batches = build_batches(encoded, batch_size)
+            for compression in available:
+                result = {"codec": codec_name, "compression": compression, "batch_size": batch_size,
+                          **benchmark_offline(batches, compression)}
+                print(f"{codec_name} / {compression} / batch {batch_size}: ratio {result['compression_ratio']:.2f}x, "
+                      f"compress {format_rate(result['compress_mb_per_second'], ' MB/s')}, "
+                      f"decompress {format_rate(result['decompress_mb_per_second'], ' MB/s')}")
+
+                if bootstrap_servers:
+                    producer_settings = {**config["producer"], "linger_ms": linger_ms, "batch_size": batch_size,
+                                         "compression_type": compression_setting(compression)}
+                    end_to_end = benchmark_end_to_end(bootstrap_servers, encoded, codec, producer_settings,
+                                                      config["consumer"])
+                    if end_to_end is None:
+                        bootstrap_servers = None  # Broker unreachable; finish the offline runs only
+                    else:
+                        result["end_to_end"] = end_to_end
+                        print(f"  end-to-end {end_to_end['end_to_end_messages_per_second']:,.0f} msg/s "
+                              f"(produce {end_to_end['produce_messages_per_second']:,.0f}, "
+                              f"consume {end_to_end['consume_messages_per_second']:,.0f})")
+                results.append(result)
+
+    print_report(results)
+    return results
+
+def format_rate(value, unit=""):
+    return "-" if value is None else f"{value:,.1f}{unit}"
+
+def print_report(results):
+    print("\nCompression benchmark:")
+    print(f"  {'codec':<7} {'compression':<12} {'batch':>8} {'ratio':>7} {'comp MB/s':>10} {'decomp MB/s':>12} "
+          f"{'e2e msg/s':>10}")
+    for r in results:
+        end_to_end = r.get("end_to_end")
+        print(f"  {r['codec']:<7} {r['compression']:<12} {r['batch_size']:>8} {r['compression_ratio']:>6.2f}x "
+              f"{format_rate(r['compress_mb_per_second']):>10} {format_rate(r['decompress_mb_per_second']):>12} "
+              f"{format_rate(end_to_end['end_to_end_messages_per_second'] if end_to_end else None):>10}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Kafka compression and batching on the event stream")
+    parser.add_argument("--event-stream-dir", default=EVENT_STREAM_DIR,
+                        help="Output directory of data_sources/event_stream.py")
+    parser.add_argument("--compression", nargs="+", choices=COMPRESSION_TYPES, default=COMPRESSION_TYPES,
+                        help="Compression types to compare (default: all)")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=DEFAULT_BATCH_SIZES,
+                        help="Producer batch.size values in bytes")
+    parser.add_argument("--codec", nargs="+", choices=["json", "binary"], default=["json"],
+                        help="Payload codecs to compare (default: json)")
+    parser.add_argument("--max-messages", type=int, default=DEFAULT_MAX_MESSAGES,
+                        help="Messages to read from the event stream (0 for all)")
+    parser.add_argument("--bootstrap-servers", default=None,
+                        help="Kafka brokers for the end-to-end runs, e.g. localhost:9092 (default: offline only)")
+    parser.add_argument("--linger-ms", type=int, default=5, help="Producer linger.ms for the end-to-end runs")
+    parser.add_argument("--client-config", default=KAFKA_CLIENT_CONFIG_FILE,
+                        help="Client config file with base producer/consumer settings")
+    parser.add_argument("--schema-registry", default=SCHEMA_REGISTRY_FILE,
+                        help="Schema registry file for the binary codec")
+    parser.add_argument("--output", default=None, help="Write the results as JSON to this file")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run_benchmark(
+        args.event_stream_dir, args.compression, args.batch_sizes, args.codec, args.max_messages or None,
+        args.bootstrap_servers, args.linger_ms, args.client_config, args.schema_registry
+    )
+    if args.output and results:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved benchmark results to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import pandas as pd
+
+from appointment_producer import APPOINTMENT_TOPIC, EVENTS_TOPIC, DEFAULT_LINGER_MS, DEFAULT_BATCH_SIZE, \
+    produce_appointment_events
+from record_validators import APPOINTMENT_VALIDATOR, EVENT_VALIDATOR
+from local_broker import LocalBroker, LocalProducer, LocalConsumer
+from message_codecs import SCHEMA_REGISTRY_FILE, JsonCodec, BinaryCodec, SchemaRegistry, get_codec, decode_message
+from stream_metrics import LATENCY_PERCENTILES, SendMetrics, LatencyHistogram, end_to_end_latency, format_latency
+
+# Streaming benchmark suite on the local broker
+#
+# Runs the real producer and consumer code paths against LocalBroker (no network, no Kafka):
+#
+#   produce     - throughput-mode producer (batched asynchronous sends) into an empty broker
+#   consume     - a consumer group member draining everything produced: poll, decode, validate
+#   end-to-end  - producer and consumer running concurrently; end-to-end latency comes from the
+#                 produced_at_us header, throughput from first send to last message consumed
+#
+# for every combination of broker backend (memory or file-backed segments) and payload codec.
+
+APPOINTMENTS_FILE = "/home/ubuntu/telemedicine_pipeline/data_sources/appointment_logs/appointment_logs.csv"
+BENCHMARK_GROUP = "benchmark-consumer-group"
+BACKENDS = ["memory", "file"]
+
+def make_broker(backend, log_dir):
+    """A fresh broker; file-backed brokers get their own empty directory under log_dir"""
+    if backend == "memory":
+        return LocalBroker()
+    path = tempfile.mkdtemp(prefix="broker-", dir=log_dir)
+    return LocalBroker(path)
+
+def make_producer(broker, producer_settings):
+    return LocalProducer(broker, key_serializer=lambda v: v.encode('utf-8') if v else None, **producer_settings)
+
+def make_consumer(broker, consumer_settings, consumer_timeout_ms=float("inf")):
+    return LocalConsumer(APPOINTMENT_TOPIC, EVENTS_TOPIC, broker=broker, group_id=BENCHMARK_GROUP,
+                         auto_offset_reset="earliest", key_deserializer=lambda x: x.decode('utf-8') if x else None,
+                         consumer_timeout_ms=consumer_timeout_ms, **consumer_settings)
+
+# Consumer work per message: decode by codec header, validate, and measure end-to-end latency
+def process_records(records, codecs, histogram):
+    """Returns (messages, bytes, validation errors) for a list of ConsumerRecords"""
+    received_bytes = 0
+    values = []
+    for record in records:
+        received_bytes += record.serialized_value_size + max(record.serialized_key_size, 0)
+        values.append(decode_message(record, codecs))
+        latency = end_to_end_latency(record)
+        if latency is not None:
+            histogram.record(latency)
+    # Records of one poll come from a single topic partition, validated as one batch
+    validator = APPOINTMENT_VALIDATOR if records and records[0].topic == APPOINTMENT_TOPIC else EVENT_VALIDATOR
+    errors = sum(bool(e) for e in validator.validate_batch(values))
+    return len(records), received_bytes, errors
+
+def consume_all(consumer, codecs, expected, histogram, timeout_seconds=60):
+    """
+    Poll until expected() messages are consumed (expected() returns None while the total is
+    still unknown) or timeout_seconds pass without new messages; returns counts and elapsed seconds.
+    """
+    messages, received_bytes, errors = 0, 0, 0
+    start_time = time.perf_counter()
+    deadline = start_time + timeout_seconds
+    while (expected() is None or messages < expected()) and time.perf_counter() < deadline:
+        for records in consumer.poll(timeout_ms=100).values():
+            counts = process_records(records, codecs, histogram)
+            messages += counts[0]
+            received_bytes += counts[1]
+            errors += counts[2]
+            deadline = time.perf_counter() + timeout_seconds
+    elapsed = time.perf_counter() - start_time
+    consumer.commit()
+    return {"messages": messages, "bytes": received_bytes, "validation_errors": errors, "elapsed_seconds": elapsed}
+
+def rates(stats):
+    elapsed = stats["elapsed_seconds"]
+    return {**stats,
+            "messages_per_second": stats["messages"] / elapsed if elapsed > 0 else 0.0,
+            "mb_per_second": stats["bytes"] / elapsed / 1e6 if elapsed > 0 else 0.0}
+
+# Scenarios
+def benchmark_produce_consume(appointments_df, backend, codec, codecs, producer_settings, consumer_settings, log_dir):
+    """Produce everything, then consume everything, on one broker"""
+    broker = make_broker(backend, log_dir)
+    producer = make_producer(broker, producer_settings)
+    produce = produce_appointment_events(producer, appointments_df, metrics=SendMetrics(), codec=codec,
+                                         label=f"[{backend}/{codec.name}] ")
+    producer.close()
+
+    histogram = LatencyHistogram()
+    consumer = make_consumer(broker, consumer_settings)
+    consume = rates(consume_all(consumer, codecs, lambda: produce["messages"], histogram))
+    consumer.close()
+    broker.close()
+    print(f"[{backend}/{codec.name}] Consumed {consume['messages']} messages in {consume['elapsed_seconds']:.2f}s, "
+          f"{consume['messages_per_second']:,.0f} msg/s, {consume['mb_per_second']:,.2f} MB/s")
+    return produce, consume
+
+def benchmark_end_to_end(appointments_df, backend, codec, codecs, producer_settings, consumer_settings, log_dir):
+    """Consumer thread draining while the producer sends"""
+    broker = make_broker(backend, log_dir)
+    histogram = LatencyHistogram()
+    produced = {}  # Total once the producer has finished; the consumer drains until it has them all
+    result = {}
+    consumer = make_consumer(broker, consumer_settings)
+    consumer.assignment()  # Join the group before the first send
+
+    thread = threading.Thread(
+        target=lambda: result.update(consume_all(consumer, codecs, lambda: produced.get("messages"), histogram))
+    )
+    start_time = time.perf_counter()
+    thread.start()
+    producer = make_producer(broker, producer_settings)
+    produce = produce_appointment_events(producer, appointments_df, metrics=SendMetrics(), codec=codec,
+                                         label=f"[{backend}/{codec.name} end-to-end] ")
+    producer.close()
+    produced["messages"] = produce["messages"]
+    thread.join()
+    elapsed = time.perf_counter() - start_time
+    consumer.close()
+    broker.close()
+
+    stats = {
+        "messages": result["messages"],
+        "elapsed_seconds": elapsed,
+        "messages_per_second": result["messages"] / elapsed if elapsed > 0 else 0.0,
+        "validation_errors": result["validation_errors"],
+        **{f"latency_p{p}_ms": histogram.percentile(p) for p in LATENCY_PERCENTILES},
+        "latency_max_ms": histogram.max()
+    }
+    print(f"[{backend}/{codec.name}] End-to-end: {stats['messages']} messages in {elapsed:.2f}s, "
+          f"{stats['messages_per_second']:,.0f} msg/s, latency {format_latency(histogram)}")
+    return stats
+
+def run_suite(appointments_df, backends=BACKENDS, codec_names=("json",), producer_settings=None,
+              consumer_settings=None, log_dir=None, schema_registry=SCHEMA_REGISTRY_FILE):
+    producer_settings = producer_settings or {"linger_ms": DEFAULT_LINGER_MS, "batch_size": DEFAULT_BATCH_SIZE}
+    consumer_settings = consumer_settings or {}
+    codecs = {"json": JsonCodec(), "binary": BinaryCodec(SchemaRegistry(schema_registry))}
+    results = []
+    for backend in backends:
+        for codec_name in codec_names:
+            codec = get_codec(codec_name, schema_registry)
+            produce, consume = benchmark_produce_consume(appointments_df, backend, codec, codecs,
+                                                         producer_settings, consumer_settings, log_dir)
+            end_to_end = benchmark_end_to_end(appointments_df, backend, codec, codecs,
+                                              producer_settings, consumer_settings, log_dir)
+            results.append({"backend": backend, "codec": codec_name, "produce": produce, "consume": consume,
+                            "end_to_end": end_to_end})
+    print_report(results)
+    return results
+
+def print_report(results):
+    print("\nStreaming benchmark (local broker):")
+    print(f"  {'backend':<8} {'codec':<7} {'produce msg/s':>14} {'consume msg/s':>14} {'e2e msg/s':>10} "
+          f"{'e2e p50 ms':>11} {'e2e p99 ms':>11}")
+    for r in results:
+        end_to_end = r["end_to_end"]
+        print(f"  {r['backend']:<8} {r['codec']:<7} {r['produce']['messages_per_second']:>14,.0f} "
+              f"{r['consume']['messages_per_second']:>14,.0f} {end_to_end['messages_per_second']:>10,.0f} "
+              f"{end_to_end['latency_p50_ms'] or 0:>11.1f} {end_to_end['latency_p99_ms'] or 0:>11.1f}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the producer and consumer on the local broker")
+    parser.add_argument("--appointments-file", default=APPOINTMENTS_FILE)
+    parser.add_argument("--sample-size", type=int, default=None, help="Appointments to send (default: all)")
+    parser.add_argument("--backend", nargs="+", choices=BACKENDS, default=BACKENDS,
+                        help="Broker backends to compare (default: memory and file)")
+    parser.add_argument("--codec", nargs="+", choices=["json", "binary"], default=["json"],
+                        help="Payload codecs to compare (default: json)")
+    parser.add_argument("--linger-ms", type=int, default=DEFAULT_LINGER_MS)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--max-poll-records", type=int, default=500)
+    parser.add_argument("--log-dir", default=None,
+                        help="Directory for file-backed broker logs (default: a temporary directory, removed after)")
+    parser.add_argument("--schema-registry", default=SCHEMA_REGISTRY_FILE,
+                        help="Schema registry file for the binary codec")
+    parser.add_argument("--output", default=None, help="Write the results as JSON to this file")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    appointments_df = pd.read_csv(args.appointments_file)
+    if args.sample_size is not None and args.sample_size < len(appointments_df):
+        appointments_df = appointments_df.sample(args.sample_size, random_state=42)
+    print(f"Loaded {len(appointments_df)} appointments from {args.appointments_file}")
+
+    log_dir = args.log_dir or tempfile.mkdtemp(prefix="local-broker-benchmark-")
+    os.makedirs(log_dir, exist_ok=True)
+    try:
+        results = run_suite(
+            appointments_df, args.backend, args.codec,
+            {"linger_ms": args.linger_ms, "batch_size": args.batch_size},
+            {"max_poll_records": args.max_poll_records}, log_dir, args.schema_registry
+        )
+    finally:
+        if not args.log_dir:
+            shutil.rmtree(log_dir, ignore_errors=True)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved benchmark results to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+from appointment_producer import appointment_records
+from event_stream import build_event_sequences
+from record_validators import APPOINTMENT_VALIDATOR, EVENT_VALIDATOR
+
+# Validator microbenchmark
+#
+# Validates the appointments and events generated from the appointment logs (with a share of
+# records made invalid) three ways and reports records/sec:
+#
+#   original  - the per-message validators the consumer used before compiled schemas
+#   compiled  - RecordValidator.validate, one record at a time
+#   batch     - RecordValidator.validate_batch over micro-batches of --batch-size records
+#
+# All three must return identical error lists; the benchmark stops if they differ.
+
+APPOINTMENTS_FILE = "/home/ubuntu/telemedicine_pipeline/data_sources/appointment_logs/appointment_logs.csv"
+DEFAULT_BATCH_SIZE = 500  # The consumer's default max_poll_records
+
+# Original validators, kept as the baseline
+def original_validate_appointment(appointment):
+    errors = []
+    required_fields = ['appointment_id', 'provider_id', 'patient_id', 'appointment_date',
+                       'scheduled_time', 'appointment_type', 'status']
+    for field in required_fields:
+        if field not in appointment or appointment[field] is None:
+            errors.append(f"Missing required field: {field}")
+    valid_statuses = ["Completed", "Cancelled", "No-show", "Rescheduled"]
+    if 'status' in appointment and appointment['status'] not in valid_statuses:
+        errors.append(f"Invalid status: {appointment['status']}")
+    if appointment.get('status') == "Completed":
+        if 'wait_time_minutes' not in appointment or appointment['wait_time_minutes'] is None:
+            errors.append("Completed appointment missing wait_time_minutes")
+        if 'duration_minutes' not in appointment or appointment['duration_minutes'] is None:
+            errors.append("Completed appointment missing duration_minutes")
+    return errors
+
+def original_validate_event(event):
+    errors = []
+    required_fields = ['event_type', 'appointment_id', 'timestamp']
+    for field in required_fields:
+        if field not in event or event[field] is None:
+            errors.append(f"Missing required field: {field}")
+    valid_event_types = [
+        "appointment_scheduled", "patient_login", "provider_login",
+        "session_started", "session_ended", "technical_issue",
+        "appointment_cancelled", "appointment_rescheduled"
+    ]
+    if 'event_type' in event and event['event_type'] not in valid_event_types:
+        errors.append(f"Invalid event_type: {event['event_type']}")
+    if 'timestamp' in event:
+        try:
+            datetime.strptime(event['timestamp'], '%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            errors.append(f"Invalid timestamp format: {event['timestamp']}")
+    return errors
+
+# Benchmark records
+def corrupt_records(records, fraction, corruptions, rng):
+    """Copy records and apply a random corruption to about fraction of them"""
+    records = [dict(record) for record in records]
+    for i in np.flatnonzero(rng.random(len(records)) < fraction):
+        corruptions[rng.integers(len(corruptions))](records[i])
+    return records
+
+APPOINTMENT_CORRUPTIONS = [
+    lambda r: r.pop("provider_id", None),
+    lambda r: r.update(status="Unknown"),
+    lambda r: r.update(status="Completed", wait_time_minutes=None),
+    lambda r: r.update(appointment_type=None)
+]
+
+EVENT_CORRUPTIONS = [
+    lambda r: r.pop("timestamp", None),
+    lambda r: r.update(event_type="session_paused"),
+    lambda r: r.update(timestamp=r["timestamp"].replace(" ", "T")),
+    lambda r: r.update(timestamp="2024-02-30 10:00:00"),
+    lambda r: r.update(timestamp="2024-2-3 9:05:00")  # Valid for strptime, not zero-padded
+]
+
+def build_benchmark_records(appointments_df, invalid_fraction, seed=42):
+    rng = np.random.default_rng(seed)
+    appointments = appointment_records(appointments_df)
+    events = [event for sequence in build_event_sequences(appointments_df, rng) for event in sequence]
+    return (corrupt_records(appointments, invalid_fraction, APPOINTMENT_CORRUPTIONS, rng),
+            corrupt_records(events, invalid_fraction, EVENT_CORRUPTIONS, rng))
+
+# Timing
+def best_time(function, repeat):
+    """(result, fastest elapsed seconds) over repeat runs"""
+    best = float("inf")
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start_time)
+    return result, best
+
+def benchmark_validator(name, records, original, validator, batch_size, repeat):
+    variants = {
+        "original": lambda: [original(record) for record in records],
+        "compiled": lambda: [validator.validate(record) for record in records],
+        "batch": lambda: [errors for start in range(0, len(records), batch_size)
+                          for errors in validator.validate_batch(records[start:start + batch_size])]
+    }
+    results = {}
+    outputs = {}
+    for variant, function in variants.items():
+        outputs[variant], elapsed = best_time(function, repeat)
+        results[variant] = {"elapsed_seconds": elapsed,
+                            "records_per_second": len(records) / elapsed if elapsed > 0 else 0.0}
+    for variant in ("compiled", "batch"):
+        if outputs[variant] != outputs["original"]:
+            mismatch = next(i for i, (a, b) in enumerate(zip(outputs["original"], outputs[variant])) if a != b)
+            raise AssertionError(f"{name} {variant} validator differs on record {mismatch}: "
+                                 f"{outputs['original'][mismatch]} != {outputs[variant][mismatch]}")
+    return {"records": len(records), "invalid": sum(bool(e) for e in outputs["original"]), **results}
+
+def print_report(results, batch_size):
+    print(f"\nValidator benchmark (batch size {batch_size}):")
+    print(f"  {'records':<13} {'count':>8} {'invalid':>8} {'original rec/s':>15} {'compiled rec/s':>15} "
+          f"{'batch rec/s':>12} {'speed-up':>9}")
+    for name, r in results.items():
+        speedup = r["batch"]["records_per_second"] / r["original"]["records_per_second"]
+        print(f"  {name:<13} {r['records']:>8} {r['invalid']:>8} {r['original']['records_per_second']:>15,.0f} "
+              f"{r['compiled']['records_per_second']:>15,.0f} {r['batch']['records_per_second']:>12,.0f} "
+              f"{speedup:>8.1f}x")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the appointment and event validators")
+    parser.add_argument("--appointments-file", default=APPOINTMENTS_FILE)
+    parser.add_argument("--sample-size", type=int, default=None, help="Appointments to generate records from")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Records per validate_batch call")
+    parser.add_argument("--invalid-fraction", type=float, default=0.05, help="Share of records made invalid")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per validator; the fastest is reported")
+    parser.add_argument("--output", default=None, help="Write the results as JSON to this file")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    appointments_df = pd.read_csv(args.appointments_file)
+    if args.sample_size is not None and args.sample_size < len(appointments_df):
+        appointments_df = appointments_df.sample(args.sample_size, random_state=42)
+    appointments, events = build_benchmark_records(appointments_df, args.invalid_fraction)
+    print(f"Validating {len(appointments)} appointments and {len(events)} events")
+
+    results = {
+        "appointments": benchmark_validator("appointments", appointments, original_validate_appointment,
+                                            APPOINTMENT_VALIDATOR, args.batch_size, args.repeat),
+        "events": benchmark_validator("events", events, original_validate_event,
+                                      EVENT_VALIDATOR, args.batch_size, args.repeat)
+    }
+    print_report(results, args.batch_size)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved benchmark results to {args.output}")
+
+if __name__ == "__main__":
+    main()
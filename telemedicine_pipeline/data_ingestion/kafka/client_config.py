@@ -0,0 +1,42 @@
+import json
+import os
+
+# Kafka client settings shared by the producer, consumer and benchmarks
+#
+# The config file has a "producer" and a "consumer" section whose keys are passed straight to
+# KafkaProducer / KafkaConsumer, for example:
+#
+#   {
+#     "producer": {"compression_type": "lz4", "linger_ms": 20, "batch_size": 131072},
+#     "consumer": {"fetch_min_bytes": 65536, "fetch_max_wait_ms": 100, "max_poll_records": 2000}
+#   }
+#
+# Anything not set falls back to the script's mode defaults and then to kafka-python's own
+# defaults; command-line options override the file.
+
+KAFKA_CLIENT_CONFIG_FILE = '/home/ubuntu/telemedicine_pipeline/data_ingestion/kafka/client_config.json'
+
+DEFAULT_KAFKA_CLIENT_CONFIG = {
+    "producer": {},
+    "consumer": {}
+}
+
+COMPRESSION_TYPES = ["none", "gzip", "snappy", "lz4", "zstd"]
+
+def load_kafka_client_config(path=KAFKA_CLIENT_CONFIG_FILE):
+    """Load client settings from file, falling back to the defaults section by section"""
+    config = {section: dict(settings) for section, settings in DEFAULT_KAFKA_CLIENT_CONFIG.items()}
+    try:
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                file_config = json.load(f)
+            for section in config:
+                config[section].update(file_config.get(section, {}))
+            print(f"Loaded Kafka client configuration from {path}")
+    except Exception as e:
+        print(f"Error loading Kafka client configuration: {e}")
+    return config
+
+def compression_setting(name):
+    """Command-line compression name to the compression_type value ("none" -> None)"""
+    return None if name in (None, "none") else name
@@ -0,0 +1,20 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Test data comes from the data generator (cross-directory import, like the rest of the pipeline)
+DATA_SOURCES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data_sources')
+if DATA_SOURCES_DIR not in sys.path:
+    sys.path.append(DATA_SOURCES_DIR)
+
+from generate_data import generate_provider_data, generate_patient_data, generate_appointment_logs_vectorized
+
+@pytest.fixture(scope="session")
+def appointments_df():
+    """200 generated appointments, the same every run"""
+    providers_df = generate_provider_data(20)
+    patients_df = generate_patient_data(100)
+    return generate_appointment_logs_vectorized(providers_df, patients_df, num_appointments=200,
+                                                rng=np.random.default_rng(11))
@@ -0,0 +1,723 @@
+import os
+import json
+import time
+import fcntl
+import struct
+import threading
+import itertools
+from collections import namedtuple
+from kafka import TopicPartition
+from kafka.partitioner.default import murmur2
+
+# Local broker: a single-box stand-in for Kafka
+#
+# LocalBroker keeps topics as partitioned append-only logs, either in memory or on disk, plus
+# consumer groups and committed offsets. LocalProducer and LocalConsumer cover the parts of the
+# KafkaProducer / KafkaConsumer API the pipeline uses, so the producer, consumer and benchmarks
+# run unchanged without a network or a real cluster.
+#
+# File-backed layout (log_dir):
+#
+#   <log_dir>/<topic>/topic.json                                   {"partitions": N}
+#   <log_dir>/<topic>/partition-00000/00000000000000000000.log     segments named by base offset
+#   <log_dir>/<topic>/partition-00000/append.lock
+#   <log_dir>/consumer_offsets.json                                committed offsets per group
+#   <log_dir>/consumer_groups.json                                 group members and generations
+#
+# Records are length-prefixed: total length, timestamp, key, value and headers. Offsets are
+# implicit (record order), appends take a file lock, and readers pick up records appended by
+# other processes, so several producer and consumer processes can share one log directory.
+# Group membership and committed offsets are shared through files as well, so subscribed
+# consumers in different processes split a group's partitions between them.
+
+LOCAL_BROKER_DIR = "/home/ubuntu/telemedicine_pipeline/data_ingestion/kafka/local_broker"
+LOCAL_DEFAULT_PARTITIONS = 8
+LOCAL_SEGMENT_BYTES = 64 * 1024 * 1024
+POLL_WAIT_SECONDS = 0.05  # Longest a waiting poll sleeps before checking the log again
+LOCAL_SESSION_TIMEOUT_SECONDS = 30  # A group member that hasn't polled for this long is dropped
+LOCAL_HEARTBEAT_INTERVAL_SECONDS = 3
+
+RECORD_HEADER = struct.Struct(">Iq")  # Record length (excluding this field), timestamp ms
+LENGTH = struct.Struct(">i")
+HEADER_COUNT = struct.Struct(">H")
+
+RecordMetadata = namedtuple("RecordMetadata", [
+    "topic", "partition", "topic_partition", "offset", "timestamp",
+    "serialized_key_size", "serialized_value_size", "serialized_header_size"
+])
+ConsumerRecord = namedtuple("ConsumerRecord", [
+    "topic", "partition", "offset", "timestamp", "timestamp_type", "key", "value", "headers",
+    "serialized_key_size", "serialized_value_size", "serialized_header_size"
+])
+
+# On-disk record encoding
+def encode_record(timestamp, key, value, headers):
+    parts = [LENGTH.pack(-1 if key is None else len(key)), key or b"",
+             LENGTH.pack(-1 if value is None else len(value)), value or b"", HEADER_COUNT.pack(len(headers))]
+    for name, header_value in headers:
+        name = name.encode("utf-8")
+        parts += [HEADER_COUNT.pack(len(name)), name, LENGTH.pack(len(header_value)), header_value]
+    body = b"".join(parts)
+    return RECORD_HEADER.pack(len(body) + 8, timestamp) + body
+
+def decode_record(data, position):
+    """Decode the record at position; returns (timestamp, key, value, headers)"""
+    _, timestamp = RECORD_HEADER.unpack_from(data, position)
+    position += RECORD_HEADER.size
+    fields = []
+    for _ in range(2):
+        length = LENGTH.unpack_from(data, position)[0]
+        position += LENGTH.size
+        fields.append(None if length < 0 else bytes(data[position:position + length]))
+        position += max(length, 0)
+    count = HEADER_COUNT.unpack_from(data, position)[0]
+    position += HEADER_COUNT.size
+    headers = []
+    for _ in range(count):
+        name_length = HEADER_COUNT.unpack_from(data, position)[0]
+        position += HEADER_COUNT.size
+        name = bytes(data[position:position + name_length]).decode("utf-8")
+        position += name_length
+        value_length = LENGTH.unpack_from(data, position)[0]
+        position += LENGTH.size
+        headers.append((name, bytes(data[position:position + value_length])))
+        position += value_length
+    return timestamp, fields[0], fields[1], headers
+
+class MemoryPartitionLog:
+    """Append-only log of one topic partition held in memory"""
+
+    def __init__(self):
+        self.records = []  # (timestamp, key, value, headers)
+
+    def append(self, records):
+        """Append records; returns the offset of the first"""
+        base_offset = len(self.records)
+        self.records.extend(records)
+        return base_offset
+
+    def read(self, offset, max_records):
+        return self.records[offset:offset + max_records]
+
+    def end_offset(self):
+        return len(self.records)
+
+class FilePartitionLog:
+    """Append-only log of one topic partition in segment files, shared between processes"""
+
+    def __init__(self, path, segment_bytes=LOCAL_SEGMENT_BYTES):
+        self.path = path
+        self.segment_bytes = segment_bytes
+        self.segments = []  # [base offset, file name, bytes indexed]
+        self.positions = []  # (segment index, position, record bytes) per offset
+        self._active = 0  # Segments before the active one are complete once indexed
+        self._readers = {}
+        os.makedirs(path, exist_ok=True)
+        self._refresh()
+
+    def _refresh(self):
+        """Index records appended since the last scan, including new segments from other processes"""
+        names = sorted(name for name in os.listdir(self.path) if name.endswith(".log"))
+        for name in names[len(self.segments):]:
+            self.segments.append([int(name[:-4]), name, 0])
+        for index in range(self._active, len(self.segments)):
+            segment = self.segments[index]
+            with open(os.path.join(self.path, segment[1]), "rb") as f:
+                f.seek(segment[2])
+                data = f.read()
+            position = 0
+            # Only complete records; a concurrent append may be partly written
+            while position + RECORD_HEADER.size <= len(data):
+                size = 4 + RECORD_HEADER.unpack_from(data, position)[0]
+                if position + size > len(data):
+                    break
+                self.positions.append((index, segment[2] + position, size))
+                position += size
+            segment[2] += position
+        self._active = max(len(self.segments) - 1, 0)
+
+    def append(self, records):
+        """Append records under the partition lock; returns the offset of the first"""
+        encoded = [encode_record(*record) for record in records]
+        data = b"".join(encoded)
+        with open(os.path.join(self.path, "append.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self._refresh()
+            base_offset = len(self.positions)
+            if not self.segments or (self.segments[-1][2] and self.segments[-1][2] + len(data) > self.segment_bytes):
+                self.segments.append([base_offset, f"{base_offset:020d}.log", 0])
+                self._active = len(self.segments) - 1
+            with open(os.path.join(self.path, self.segments[-1][1]), "ab") as f:
+                f.write(data)
+            # Index the new records directly instead of re-reading them
+            index, segment = len(self.segments) - 1, self.segments[-1]
+            for record in encoded:
+                self.positions.append((index, segment[2], len(record)))
+                segment[2] += len(record)
+        return base_offset
+
+    def _reader(self, index):
+        if index not in self._readers:
+            self._readers[index] = open(os.path.join(self.path, self.segments[index][1]), "rb")
+        return self._readers[index]
+
+    def read(self, offset, max_records):
+        if offset + max_records > len(self.positions):
+            self._refresh()
+        records = []
+        # One read per segment covering every requested record in it
+        for index, group in itertools.groupby(self.positions[offset:offset + max_records], key=lambda p: p[0]):
+            group = list(group)
+            start = group[0][1]
+            reader = self._reader(index)
+            reader.seek(start)
+            data = reader.read(group[-1][1] + group[-1][2] - start)
+            records.extend(decode_record(data, position - start) for _, position, _ in group)
+        return records
+
+    def end_offset(self):
+        self._refresh()
+        return len(self.positions)
+
+    def close(self):
+        for reader in self._readers.values():
+            reader.close()
+        self._readers = {}
+
+class LocalBroker:
+    """Topics, partition logs, consumer groups and committed offsets; in memory if log_dir is None"""
+
+    def __init__(self, log_dir=None, num_partitions=LOCAL_DEFAULT_PARTITIONS, segment_bytes=LOCAL_SEGMENT_BYTES):
+        self.log_dir = log_dir
+        self.num_partitions = num_partitions
+        self.segment_bytes = segment_bytes
+        self.logs = {}  # topic -> list of partition logs
+        self.groups = {}  # group id -> {"members": {member id: {"topics", "heartbeat"}}, "generation": n}
+        self._groups_version = None  # Identity of the groups file self.groups was loaded from
+        self.offsets = {}  # group id -> {(topic, partition): offset} (in-memory mode)
+        self.lock = threading.RLock()
+        self.appended = threading.Condition(self.lock)
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+
+    # Topics
+    def create_topic(self, topic, num_partitions=None):
+        """Create topic if it doesn't exist yet; returns its partition logs"""
+        with self.lock:
+            if topic in self.logs:
+                return self.logs[topic]
+            num_partitions = num_partitions or self.num_partitions
+            if self.log_dir is None:
+                self.logs[topic] = [MemoryPartitionLog() for _ in range(num_partitions)]
+                return self.logs[topic]
+
+            topic_dir = os.path.join(self.log_dir, topic)
+            os.makedirs(topic_dir, exist_ok=True)
+            meta_file = os.path.join(topic_dir, "topic.json")
+            if not os.path.exists(meta_file):
+                # Linked into place complete; the first process to create the topic fixes its partition count
+                temp_file = f"{meta_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(temp_file, "w") as f:
+                    json.dump({"partitions": num_partitions}, f)
+                try:
+                    os.link(temp_file, meta_file)
+                except FileExistsError:
+                    pass
+                os.remove(temp_file)
+            with open(meta_file) as f:
+                num_partitions = json.load(f)["partitions"]
+            self.logs[topic] = [FilePartitionLog(os.path.join(topic_dir, f"partition-{p:05d}"), self.segment_bytes)
+                                for p in range(num_partitions)]
+            return self.logs[topic]
+
+    def topics(self):
+        with self.lock:
+            if self.log_dir:
+                for name in os.listdir(self.log_dir):
+                    if os.path.exists(os.path.join(self.log_dir, name, "topic.json")):
+                        self.create_topic(name)
+            return set(self.logs)
+
+    def partitions_for_topic(self, topic):
+        return set(range(len(self.create_topic(topic))))
+
+    # Log access
+    def append(self, topic, partition, records):
+        with self.lock:
+            base_offset = self.create_topic(topic)[partition].append(records)
+            self.appended.notify_all()
+        return base_offset
+
+    def read(self, topic, partition, offset, max_records):
+        with self.lock:
+            return self.create_topic(topic)[partition].read(offset, max_records)
+
+    def end_offset(self, topic, partition):
+        with self.lock:
+            return self.create_topic(topic)[partition].end_offset()
+
+    def wait_for_append(self, timeout):
+        """Sleep until another thread appends or timeout seconds pass (appends by other processes are polled)"""
+        with self.appended:
+            self.appended.wait(min(timeout, POLL_WAIT_SECONDS) if self.log_dir else timeout)
+
+    # Consumer groups. File-backed brokers keep membership in <log_dir>/consumer_groups.json,
+    # updated under the offsets lock, so consumers in different processes split the partitions.
+    # Members heartbeat while they poll; one silent for LOCAL_SESSION_TIMEOUT_SECONDS (crashed)
+    # is dropped by the next heartbeat of another member, which starts a new generation.
+    def _groups_file(self):
+        return os.path.join(self.log_dir, "consumer_groups.json")
+
+    def _load_groups(self):
+        """Groups from the groups file, re-read only when another process replaced it"""
+        try:
+            stat = os.stat(self._groups_file())
+        except FileNotFoundError:
+            return {}
+        version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if version != self._groups_version:
+            with open(self._groups_file()) as f:
+                self.groups = json.load(f)
+            self._groups_version = version
+        return self.groups
+
+    def _update_groups(self, update):
+        """Apply update(groups) under the group lock; the file is rewritten if it returns True"""
+        with self.lock:
+            if self.log_dir is None:
+                update(self.groups)
+                return
+            with open(os.path.join(self.log_dir, "consumer_offsets.lock"), "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                self._groups_version = None
+                groups = self._load_groups()
+                if update(groups):
+                    temp_file = self._groups_file() + ".tmp"
+                    with open(temp_file, "w") as f:
+                        json.dump(groups, f, indent=2)
+                    os.replace(temp_file, self._groups_file())
+                    self._groups_version = None
+
+    def join_group(self, group_id, member_id, topics):
+        """Add or update a member; every membership change starts a new generation"""
+        generation = []
+        def join(groups):
+            group = groups.setdefault(group_id, {"members": {}, "generation": 0})
+            group["members"][member_id] = {"topics": sorted(topics), "heartbeat": time.time()}
+            group["generation"] += 1
+            generation.append(group["generation"])
+            return True
+        self._update_groups(join)
+        return generation[0]
+
+    def leave_group(self, group_id, member_id):
+        def leave(groups):
+            group = groups.get(group_id)
+            if group and group["members"].pop(member_id, None) is not None:
+                group["generation"] += 1
+                return True
+            return False
+        self._update_groups(leave)
+
+    def heartbeat(self, group_id, member_id, topics):
+        """Mark a member alive (rejoining if it was dropped) and drop members whose session timed out"""
+        def beat(groups):
+            now = time.time()
+            group = groups.setdefault(group_id, {"members": {}, "generation": 0})
+            members = group["members"]
+            expired = [m for m, member in members.items()
+                       if m != member_id and now - member["heartbeat"] > LOCAL_SESSION_TIMEOUT_SECONDS]
+            for m in expired:
+                del members[m]
+            changed = bool(expired) or member_id not in members
+            members[member_id] = {"topics": sorted(topics), "heartbeat": now}
+            if changed:
+                group["generation"] += 1
+            return True
+        self._update_groups(beat)
+
+    def group_assignment(self, group_id, member_id):
+        """(generation, partitions) for a member: each topic's partitions split into ranges over members"""
+        with self.lock:
+            group = self._load_groups()[group_id] if self.log_dir else self.groups[group_id]
+            members = group["members"]
+            assigned = []
+            for topic in sorted({t for member in members.values() for t in member["topics"]}):
+                subscribed = sorted(m for m, member in members.items() if topic in member["topics"])
+                if member_id not in subscribed:
+                    continue
+                partitions = sorted(self.partitions_for_topic(topic))
+                share, extra = divmod(len(partitions), len(subscribed))
+                index = subscribed.index(member_id)
+                start = index * share + min(index, extra)
+                assigned += [TopicPartition(topic, p)
+                             for p in partitions[start:start + share + (1 if index < extra else 0)]]
+            return group["generation"], assigned
+
+    def generation(self, group_id):
+        with self.lock:
+            groups = self._load_groups() if self.log_dir else self.groups
+            return groups[group_id]["generation"] if group_id in groups else None
+
+    # Committed offsets
+    def _offsets_file(self):
+        return os.path.join(self.log_dir, "consumer_offsets.json")
+
+    def _load_offsets(self):
+        if not os.path.exists(self._offsets_file()):
+            return {}
+        with open(self._offsets_file()) as f:
+            return json.load(f)
+
+    def commit(self, group_id, offsets):
+        """Store {TopicPartition: offset} for a group"""
+        with self.lock:
+            if self.log_dir is None:
+                group = self.offsets.setdefault(group_id, {})
+                group.update({(tp.topic, tp.partition): offset for tp, offset in offsets.items()})
+                return
+            with open(os.path.join(self.log_dir, "consumer_offsets.lock"), "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                committed = self._load_offsets()
+                group = committed.setdefault(group_id, {})
+                group.update({f"{tp.topic}:{tp.partition}": offset for tp, offset in offsets.items()})
+                temp_file = self._offsets_file() + ".tmp"
+                with open(temp_file, "w") as f:
+                    json.dump(committed, f, indent=2)
+                os.replace(temp_file, self._offsets_file())
+
+    def committed(self, group_id, tp):
+        with self.lock:
+            if self.log_dir is None:
+                return self.offsets.get(group_id, {}).get((tp.topic, tp.partition))
+            return self._load_offsets().get(group_id, {}).get(f"{tp.topic}:{tp.partition}")
+
+    def close(self):
+        with self.lock:
+            for logs in self.logs.values():
+                for log in logs:
+                    if isinstance(log, FilePartitionLog):
+                        log.close()
+
+class LocalFuture:
+    """Send future with kafka-python's callback interface; callbacks added after completion run at once"""
+
+    def __init__(self):
+        self.is_done = False
+        self.value = None
+        self.exception = None
+        self._callbacks = []
+        self._errbacks = []
+
+    def success(self, value):
+        self.value, self.is_done = value, True
+        for callback, args in self._callbacks:
+            callback(*args, value)
+        return self
+
+    def failure(self, exception):
+        self.exception, self.is_done = exception, True
+        for errback, args in self._errbacks:
+            errback(*args, exception)
+        return self
+
+    def add_callback(self, callback, *args):
+        if self.is_done and self.exception is None:
+            callback(*args, self.value)
+        elif not self.is_done:
+            self._callbacks.append((callback, args))
+        return self
+
+    def add_errback(self, errback, *args):
+        if self.is_done and self.exception is not None:
+            errback(*args, self.exception)
+        elif not self.is_done:
+            self._errbacks.append((errback, args))
+        return self
+
+    def get(self, timeout=None):
+        if not self.is_done:
+            raise RuntimeError("Record not sent yet; call flush() first")
+        if self.exception is not None:
+            raise self.exception
+        return self.value
+
+class LocalProducer:
+    """
+    KafkaProducer stand-in. Records are batched per partition and appended when a batch
+    reaches batch_size bytes, when linger_ms has passed (checked on send) or on flush();
+    futures complete when their batch is appended. Other KafkaProducer settings are accepted
+    and ignored.
+    """
+
+    def __init__(self, broker, key_serializer=None, value_serializer=None, linger_ms=0, batch_size=16384, **config):
+        self.broker = broker
+        self.key_serializer = key_serializer
+        self.value_serializer = value_serializer
+        self.linger_ms = linger_ms
+        self.batch_size = batch_size
+        self.config = config
+        self._batches = {}  # (topic, partition) -> [records, futures, bytes, created]
+        self._oldest_batch = None  # Creation time of the oldest open batch
+        self._partition_cache = {}  # (topic, key) -> partition; messages for a key come in runs
+        self._round_robin = itertools.count()
+        self._lock = threading.Lock()
+
+    def partitions_for(self, topic):
+        return self.broker.partitions_for_topic(topic)
+
+    def send(self, topic, value=None, key=None, headers=None, partition=None, timestamp_ms=None):
+        key_bytes = self.key_serializer(key) if self.key_serializer else key
+        value_bytes = self.value_serializer(value) if self.value_serializer else value
+        headers = list(headers or [])
+        if partition is None:
+            partition = self._partition(topic, key_bytes)
+        timestamp = int(time.time() * 1000) if timestamp_ms is None else timestamp_ms
+        future = LocalFuture()
+        sizes = (len(key_bytes) if key_bytes is not None else -1,
+                 len(value_bytes) if value_bytes is not None else -1,
+                 sum(len(name) + len(v) for name, v in headers))
+
+        now = time.monotonic()
+        with self._lock:
+            batch = self._batches.get((topic, partition))
+            if batch is None:
+                batch = self._batches[(topic, partition)] = [[], [], 0, now]
+                if self._oldest_batch is None:
+                    self._oldest_batch = now
+            batch[0].append((timestamp, key_bytes, value_bytes, headers))
+            batch[1].append((future, timestamp, sizes))
+            batch[2] += max(sizes[0], 0) + max(sizes[1], 0) + sizes[2]
+            ready = [(topic, partition)] if batch[2] >= self.batch_size else []
+            if (now - self._oldest_batch) * 1000 >= self.linger_ms:
+                ready = [tp for tp, b in self._batches.items()
+                         if b[2] >= self.batch_size or (now - b[3]) * 1000 >= self.linger_ms]
+            batches = [(tp, self._batches.pop(tp)) for tp in ready]
+            if batches:
+                self._oldest_batch = min((b[3] for b in self._batches.values()), default=None)
+        for tp, batch in batches:
+            self._append(tp, batch)
+        return future
+
+    def _partition(self, topic, key_bytes):
+        """Kafka's default partitioner: murmur2 of the key, round-robin without one"""
+        if key_bytes is None:
+            return next(self._round_robin) % len(self.broker.partitions_for_topic(topic))
+        partition = self._partition_cache.get((topic, key_bytes))
+        if partition is None:
+            if len(self._partition_cache) >= 100000:
+                self._partition_cache.clear()
+            partition = (murmur2(key_bytes) & 0x7fffffff) % len(self.broker.partitions_for_topic(topic))
+            self._partition_cache[(topic, key_bytes)] = partition
+        return partition
+
+    def _append(self, tp, batch):
+        records, futures = batch[0], batch[1]
+        try:
+            base_offset = self.broker.append(tp[0], tp[1], records)
+        except Exception as e:
+            for future, _, _ in futures:
+                future.failure(e)
+            return
+        for i, (future, timestamp, sizes) in enumerate(futures):
+            future.success(RecordMetadata(tp[0], tp[1], TopicPartition(*tp), base_offset + i, timestamp, *sizes))
+
+    def flush(self, timeout=None):
+        with self._lock:
+            batches, self._batches = list(self._batches.items()), {}
+            self._oldest_batch = None
+        for tp, batch in batches:
+            self._append(tp, batch)
+
+    def metrics(self):
+        return {}
+
+    def close(self, timeout=None):
+        self.flush()
+
+class LocalConsumer:
+    """
+    KafkaConsumer stand-in: subscribe with a group (partitions split across the group's
+    consumers, in any process sharing the broker's log_dir; committed offsets restored on
+    assignment) or assign() partitions directly. Iteration blocks for new records until consumer_timeout_ms.
+    """
+
+    def __init__(self, *topics, broker, group_id=None, auto_offset_reset="latest", enable_auto_commit=True,
+                 auto_commit_interval_ms=5000, key_deserializer=None, value_deserializer=None,
+                 max_poll_records=500, consumer_timeout_ms=float("inf"), **config):
+        self.broker = broker
+        self.group_id = group_id
+        self.auto_offset_reset = auto_offset_reset
+        self.enable_auto_commit = enable_auto_commit and group_id is not None
+        self.auto_commit_interval = auto_commit_interval_ms / 1000
+        self.key_deserializer = key_deserializer
+        self.value_deserializer = value_deserializer
+        self.max_poll_records = max_poll_records
+        self.consumer_timeout = consumer_timeout_ms / 1000
+        self.config = config
+        self.member_id = f"consumer-{os.getpid()}-{id(self)}"  # Unique across processes sharing a log_dir
+        self._subscription = []
+        self._generation = None
+        self._next_heartbeat = 0
+        self._assignment = []
+        self._positions = {}
+        self._paused = set()
+        self._next_auto_commit = time.monotonic() + self.auto_commit_interval
+        self._iterator_buffer = []
+        if topics:
+            self.subscribe(topics)
+
+    # Assignment
+    def subscribe(self, topics):
+        self._subscription = list(topics)
+        for topic in topics:
+            self.broker.create_topic(topic)
+        if self.group_id is not None:
+            self.broker.join_group(self.group_id, self.member_id, self._subscription)
+        else:
+            self._set_assignment([TopicPartition(t, p) for t in topics for p in self.broker.partitions_for_topic(t)])
+
+    def assign(self, partitions):
+        if self.group_id is not None and self._subscription:
+            # Manual assignment replaces the subscription: stop holding a share of the group's partitions
+            self.broker.leave_group(self.group_id, self.member_id)
+        self._subscription = []
+        self._set_assignment(list(partitions))
+
+    def _set_assignment(self, partitions):
+        self._assignment = partitions
+        self._positions = {tp: self._positions[tp] for tp in partitions if tp in self._positions}
+
+    def _maybe_rebalance(self):
+        if self.group_id is None or not self._subscription:
+            return
+        if time.monotonic() >= self._next_heartbeat:
+            self.broker.heartbeat(self.group_id, self.member_id, self._subscription)
+            self._next_heartbeat = time.monotonic() + LOCAL_HEARTBEAT_INTERVAL_SECONDS
+        if self._generation != self.broker.generation(self.group_id):
+            if self.enable_auto_commit:
+                self.commit()
+            self._generation, assignment = self.broker.group_assignment(self.group_id, self.member_id)
+            self._positions = {}
+            self._set_assignment(assignment)
+
+    def assignment(self):
+        self._maybe_rebalance()
+        return set(self._assignment)
+
+    def subscription(self):
+        return set(self._subscription)
+
+    # Positions
+    def position(self, tp):
+        if tp not in self._positions:
+            committed = self.committed(tp) if self.group_id is not None else None
+            if committed is not None:
+                self._positions[tp] = committed
+            elif self.auto_offset_reset == "earliest":
+                self._positions[tp] = 0
+            else:
+                self._positions[tp] = self.broker.end_offset(tp.topic, tp.partition)
+        return self._positions[tp]
+
+    def seek(self, tp, offset):
+        self._positions[tp] = offset
+
+    def seek_to_beginning(self, *partitions):
+        for tp in partitions or self.assignment():
+            self._positions[tp] = 0
+
+    def seek_to_end(self, *partitions):
+        for tp in partitions or self.assignment():
+            self._positions[tp] = self.broker.end_offset(tp.topic, tp.partition)
+
+    def beginning_offsets(self, partitions):
+        return {tp: 0 for tp in partitions}
+
+    def end_offsets(self, partitions):
+        return {tp: self.broker.end_offset(tp.topic, tp.partition) for tp in partitions}
+
+    def committed(self, tp, metadata=False):
+        return self.broker.committed(self.group_id, tp) if self.group_id is not None else None
+
+    def commit(self, offsets=None):
+        """Commit offsets ({TopicPartition: offset or OffsetAndMetadata}), default the current positions"""
+        if self.group_id is None:
+            return
+        if offsets is None:
+            offsets = dict(self._positions)
+        offsets = {tp: getattr(offset, "offset", offset) for tp, offset in offsets.items()}
+        if offsets:
+            self.broker.commit(self.group_id, offsets)
+
+    def pause(self, *partitions):
+        self._paused.update(partitions)
+
+    def resume(self, *partitions):
+        self._paused.difference_update(partitions)
+
+    def paused(self):
+        return set(self._paused)
+
+    # Fetching
+    def partitions_for_topic(self, topic):
+        return self.broker.partitions_for_topic(topic)
+
+    def topics(self):
+        return self.broker.topics()
+
+    def _fetch(self, max_records):
+        fetched = {}
+        for tp in self.assignment():
+            if tp in self._paused or max_records <= 0:
+                continue
+            offset = self.position(tp)
+            records = self.broker.read(tp.topic, tp.partition, offset, max_records)
+            if not records:
+                continue
+            fetched[tp] = [
+                ConsumerRecord(
+                    tp.topic, tp.partition, offset + i, timestamp, 0,
+                    self.key_deserializer(key) if self.key_deserializer and key is not None else key,
+                    self.value_deserializer(value) if self.value_deserializer and value is not None else value,
+                    headers, len(key) if key is not None else -1, len(value) if value is not None else -1,
+                    sum(len(name) + len(v) for name, v in headers)
+                )
+                for i, (timestamp, key, value, headers) in enumerate(records)
+            ]
+            self._positions[tp] = offset + len(records)
+            max_records -= len(records)
+        return fetched
+
+    def poll(self, timeout_ms=0, max_records=None, update_offsets=True):
+        """Return {TopicPartition: [ConsumerRecord]}, waiting up to timeout_ms for records"""
+        deadline = time.monotonic() + timeout_ms / 1000
+        while True:
+            fetched = self._fetch(max_records or self.max_poll_records)
+            if self.enable_auto_commit and time.monotonic() >= self._next_auto_commit:
+                self.commit()
+                self._next_auto_commit = time.monotonic() + self.auto_commit_interval
+            remaining = deadline - time.monotonic()
+            if fetched or remaining <= 0:
+                return fetched
+            self.broker.wait_for_append(remaining)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        deadline = time.monotonic() + self.consumer_timeout
+        while not self._iterator_buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise StopIteration
+            for records in self.poll(timeout_ms=min(remaining, 1.0) * 1000).values():
+                self._iterator_buffer.extend(records)
+            self._iterator_buffer.reverse()
+        return self._iterator_buffer.pop()
+
+    def close(self, autocommit=True):
+        if autocommit and self.enable_auto_commit:
+            self.commit()
+        if self.group_id is not None and self._subscription:
+            self.broker.leave_group(self.group_id, self.member_id)
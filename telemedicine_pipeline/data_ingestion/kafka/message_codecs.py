@@ -0,0 +1,484 @@
+import sys
+import json
+import os
+import struct
+import fcntl
+import base64
+from datetime import datetime, date, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data_sources'))
+from generate_data import APPOINTMENT_TYPES, APPOINTMENT_STATUSES, DEVICE_TYPES, OPERATING_SYSTEMS, BROWSERS, \
+    CONNECTION_QUALITIES, TECHNICAL_ISSUE_TYPES
+from event_stream import EVENT_REASONS, ISSUE_SEVERITIES
+
+# Message codecs for Kafka payloads
+#
+# The producer encodes every value itself and declares the codec in a message header; the
+# consumer reads the header and picks the matching decoder (no header means JSON, so old
+# producers keep working). Two codecs are available:
+#
+#   json    UTF-8 JSON, same bytes as the original value_serializer
+#   binary  compact schema-based records: framed as MAGIC_BYTE + 4-byte schema id + body,
+#           where the schema comes from the schema registry stand-in below. A value the
+#           schema can't represent (unknown field, unexpected type) falls back to JSON within
+#           the same codec, which decoders recognise by the missing magic byte.
+#
+# Enum symbols are the generator's own domains (data_sources/generate_data.py, event_stream.py),
+# so every generated value encodes as one byte.
+#
+# Binary record body: a presence bitmap and a null bitmap (one bit per schema field), then
+# each present, non-null field in schema order. UUIDs are 16 raw bytes, enums one byte,
+# dates/times/timestamps integers, strings and integers varint-prefixed/encoded.
+
+CODEC_HEADER = "codec"
+DEFAULT_CODEC = "json"
+MAGIC_BYTE = 0
+ENUM_ESCAPE = 255  # Enum value outside the schema's symbols, stored as a string
+SCHEMA_REGISTRY_FILE = "/home/ubuntu/telemedicine_pipeline/data_ingestion/kafka/schema_registry.json"
+
+EPOCH = datetime(1970, 1, 1)
+EPOCH_DATE = date(1970, 1, 1)
+
+def enum_field(name, symbols):
+    return {"name": name, "type": "enum", "symbols": symbols}
+
+APPOINTMENT_SCHEMA = {
+    "name": "appointment",
+    "fields": [
+        {"name": "appointment_id", "type": "uuid"},
+        {"name": "provider_id", "type": "string"},
+        {"name": "patient_id", "type": "string"},
+        {"name": "appointment_date", "type": "date"},
+        {"name": "scheduled_time", "type": "time"},
+        enum_field("appointment_type", APPOINTMENT_TYPES),
+        enum_field("status", APPOINTMENT_STATUSES),
+        {"name": "wait_time_minutes", "type": "float"},
+        {"name": "duration_minutes", "type": "float"},
+        enum_field("device_type", DEVICE_TYPES),
+        enum_field("operating_system", OPERATING_SYSTEMS),
+        enum_field("browser", BROWSERS),
+        enum_field("connection_quality", CONNECTION_QUALITIES),
+        {"name": "had_technical_issues", "type": "boolean"},
+        enum_field("technical_issue_type", TECHNICAL_ISSUE_TYPES),
+        {"name": "timestamp", "type": "timestamp"}
+    ]
+}
+
+# Event details depend on event_type; the details field selects its layout by that discriminator
+EVENT_SCHEMA = {
+    "name": "event",
+    "fields": [
+        enum_field("event_type", ["appointment_scheduled", "patient_login", "provider_login", "session_started",
+                                  "session_ended", "technical_issue", "appointment_cancelled",
+                                  "appointment_rescheduled"]),
+        {"name": "appointment_id", "type": "uuid"},
+        {"name": "patient_id", "type": "string"},
+        {"name": "provider_id", "type": "string"},
+        {"name": "timestamp", "type": "timestamp"},
+        {"name": "details", "type": "variant", "discriminator": "event_type", "variants": {
+            "appointment_scheduled": [
+                {"name": "scheduled_time", "type": "time"},
+                enum_field("appointment_type", APPOINTMENT_TYPES)
+            ],
+            "appointment_cancelled": [enum_field("reason", EVENT_REASONS)],
+            "appointment_rescheduled": [
+                {"name": "original_time", "type": "time"},
+                {"name": "new_time", "type": "time"},
+                enum_field("reason", EVENT_REASONS)
+            ],
+            "patient_login": [enum_field("device_type", DEVICE_TYPES),
+                              enum_field("operating_system", OPERATING_SYSTEMS),
+                              enum_field("browser", BROWSERS)],
+            "provider_login": [enum_field("device_type", DEVICE_TYPES),
+                               enum_field("operating_system", OPERATING_SYSTEMS),
+                               enum_field("browser", BROWSERS)],
+            "session_started": [enum_field("connection_quality", CONNECTION_QUALITIES),
+                                {"name": "wait_time_minutes", "type": "float"}],
+            "technical_issue": [enum_field("issue_type", TECHNICAL_ISSUE_TYPES),
+                                enum_field("severity", ISSUE_SEVERITIES),
+                                {"name": "resolved", "type": "boolean"}],
+            "session_ended": [{"name": "duration_minutes", "type": "float"},
+                              {"name": "ended_normally", "type": "boolean"}]
+        }}
+    ]
+}
+
+TOPIC_SCHEMAS = {
+    "telemedicine-appointments": APPOINTMENT_SCHEMA,
+    "telemedicine-events": EVENT_SCHEMA
+}
+
+# File-backed stand-in for a schema registry
+class SchemaRegistry:
+    """
+    Subjects (one per topic value, "<topic>-value") hold versioned schemas; every schema gets
+    a global id that is embedded in binary messages, so consumers can decode any version.
+    """
+
+    def __init__(self, path=SCHEMA_REGISTRY_FILE):
+        self.path = path
+        self._schemas_by_id = {}
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {"next_id": 1, "subjects": {}}
+        with open(self.path) as f:
+            return json.load(f)
+
+    def _index(self, registry):
+        for versions in registry["subjects"].values():
+            for entry in versions:
+                self._schemas_by_id[entry["id"]] = entry["schema"]
+
+    def register(self, subject, schema):
+        """Return the id of schema under subject, adding it as a new version if it changed"""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # Producers in several processes may register at once: serialize read-modify-write
+        with open(self.path + ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            registry = self._load()
+            versions = registry["subjects"].setdefault(subject, [])
+            for entry in versions:
+                if entry["schema"] == schema:
+                    self._index(registry)
+                    return entry["id"]
+
+            schema_id = registry["next_id"]
+            versions.append({"version": len(versions) + 1, "id": schema_id, "schema": schema})
+            registry["next_id"] = schema_id + 1
+
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "w") as f:
+                json.dump(registry, f, indent=2)
+            os.replace(temp_path, self.path)
+            self._index(registry)
+            return schema_id
+
+    def get(self, schema_id):
+        """Schema for an id; re-reads the file for ids registered after this process started"""
+        if schema_id not in self._schemas_by_id:
+            self._index(self._load())
+        return self._schemas_by_id[schema_id]
+
+    def latest(self, subject):
+        """(id, schema) of the newest version of subject, or None"""
+        versions = self._load()["subjects"].get(subject)
+        if not versions:
+            return None
+        return versions[-1]["id"], versions[-1]["schema"]
+
+# Primitive encoders/decoders
+def write_varint(out, value):
+    value = (value << 1) ^ (value >> 63)  # zigzag
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def read_varint(data, position):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            break
+        shift += 7
+    return (result >> 1) ^ -(result & 1), position
+
+def write_string(out, value):
+    if not isinstance(value, str):
+        raise TypeError(f"Expected str, got {type(value).__name__}")
+    encoded = value.encode("utf-8")
+    write_varint(out, len(encoded))
+    out += encoded
+
+def read_string(data, position):
+    length, position = read_varint(data, position)
+    return bytes(data[position:position + length]).decode("utf-8"), position + length
+
+def plain(value):
+    """numpy scalars (from DataFrame rows) as Python values"""
+    return value.item() if hasattr(value, "dtype") and hasattr(value, "item") else value
+
+def is_null(value, field_type):
+    # NaN stands for a missing value in pandas rows; floats keep NaN as a value
+    return value is None or (field_type != "float" and isinstance(value, float) and value != value)
+
+def compile_fields(fields):
+    """Compile a list of schema fields into (encode(record, out), decode(data, position)) functions"""
+    names = [field["name"] for field in fields]
+    encoders = [compile_encoder(field) for field in fields]
+    decoders = [compile_decoder(field) for field in fields]
+    types = [field["type"] for field in fields]
+    bitmap_size = (len(fields) + 7) // 8
+
+    def encode(record, out, parent=None):
+        present = bytearray(bitmap_size)
+        nulls = bytearray(bitmap_size)
+        header_at = len(out)
+        out += present + nulls
+        found = 0
+        for i, name in enumerate(names):
+            if name not in record:
+                continue
+            found += 1
+            present[i >> 3] |= 1 << (i & 7)
+            value = plain(record[name])
+            if is_null(value, types[i]):
+                nulls[i >> 3] |= 1 << (i & 7)
+            else:
+                encoders[i](value, out, record)
+        if found != len(record):
+            raise ValueError(f"Fields not in schema: {sorted(set(record) - set(names))}")
+        out[header_at:header_at + 2 * bitmap_size] = present + nulls
+
+    def decode(data, position):
+        present = data[position:position + bitmap_size]
+        nulls = data[position + bitmap_size:position + 2 * bitmap_size]
+        position += 2 * bitmap_size
+        record = {}
+        for i, name in enumerate(names):
+            if not present[i >> 3] & (1 << (i & 7)):
+                continue
+            if nulls[i >> 3] & (1 << (i & 7)):
+                record[name] = None
+            else:
+                record[name], position = decoders[i](data, position, record)
+        return record, position
+
+    return encode, decode
+
+def compile_encoder(field):
+    field_type = field["type"]
+
+    if field_type == "string":
+        return lambda value, out, record: write_string(out, value)
+
+    if field_type == "enum":
+        index = {symbol: i for i, symbol in enumerate(field["symbols"])}
+        def encode_enum(value, out, record):
+            if value in index:
+                out.append(index[value])
+            else:
+                out.append(ENUM_ESCAPE)
+                write_string(out, value)
+        return encode_enum
+
+    if field_type == "uuid":
+        def encode_uuid(value, out, record):
+            # Canonical lowercase 8-4-4-4-12 form only, so decoding reproduces the same string
+            if len(value) != 36 or value[8] != "-" or value[13] != "-" or value[18] != "-" \
+                    or value[23] != "-" or value.lower() != value:
+                raise ValueError(f"Non-canonical UUID: {value}")
+            out += bytes.fromhex(value[0:8] + value[9:13] + value[14:18] + value[19:23] + value[24:36])
+        return encode_uuid
+
+    if field_type == "float":
+        def encode_float(value, out, record):
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                raise TypeError(f"Expected number, got {type(value).__name__}")
+            out += struct.pack("<d", value)
+        return encode_float
+
+    if field_type == "int":
+        def encode_int(value, out, record):
+            if not isinstance(value, int) or isinstance(value, bool):
+                raise TypeError(f"Expected int, got {type(value).__name__}")
+            write_varint(out, value)
+        return encode_int
+
+    if field_type == "boolean":
+        def encode_boolean(value, out, record):
+            if value is not True and value is not False:
+                raise TypeError(f"Expected bool, got {type(value).__name__}")
+            out.append(value)
+        return encode_boolean
+
+    if field_type == "timestamp":
+        def encode_timestamp(value, out, record):
+            # Only the exact 'YYYY-MM-DD HH:MM:SS' form round-trips
+            if len(value) != 19 or value[10] != " ":
+                raise ValueError(f"Unsupported timestamp format: {value}")
+            write_varint(out, (datetime.fromisoformat(value) - EPOCH) // timedelta(seconds=1))
+        return encode_timestamp
+
+    if field_type == "date":
+        def encode_date(value, out, record):
+            if len(value) != 10:
+                raise ValueError(f"Unsupported date format: {value}")
+            write_varint(out, (date.fromisoformat(value) - EPOCH_DATE).days)
+        return encode_date
+
+    if field_type == "time":
+        def encode_time(value, out, record):
+            if len(value) != 8 or value[2] != ":" or value[5] != ":":
+                raise ValueError(f"Unsupported time format: {value}")
+            write_varint(out, int(value[0:2]) * 3600 + int(value[3:5]) * 60 + int(value[6:8]))
+        return encode_time
+
+    if field_type == "variant":
+        discriminator = field["discriminator"]
+        variants = {key: compile_fields(fields)[0] for key, fields in field["variants"].items()}
+        def encode_variant(value, out, record):
+            if not isinstance(value, dict):
+                raise TypeError(f"Expected dict, got {type(value).__name__}")
+            variants[record[discriminator]](value, out)
+        return encode_variant
+
+    raise ValueError(f"Unknown field type: {field_type}")
+
+def compile_decoder(field):
+    field_type = field["type"]
+
+    if field_type == "string":
+        return lambda data, position, record: read_string(data, position)
+
+    if field_type == "enum":
+        symbols = field["symbols"]
+        def decode_enum(data, position, record):
+            index = data[position]
+            if index == ENUM_ESCAPE:
+                return read_string(data, position + 1)
+            return symbols[index], position + 1
+        return decode_enum
+
+    if field_type == "uuid":
+        def decode_uuid(data, position, record):
+            h = data[position:position + 16].hex()
+            return f"{h[0:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:32]}", position + 16
+        return decode_uuid
+
+    if field_type == "float":
+        return lambda data, position, record: (struct.unpack_from("<d", data, position)[0], position + 8)
+
+    if field_type == "int":
+        return lambda data, position, record: read_varint(data, position)
+
+    if field_type == "boolean":
+        return lambda data, position, record: (data[position] == 1, position + 1)
+
+    if field_type == "timestamp":
+        def decode_timestamp(data, position, record):
+            seconds, position = read_varint(data, position)
+            return (EPOCH + timedelta(seconds=seconds)).isoformat(sep=" "), position
+        return decode_timestamp
+
+    if field_type == "date":
+        def decode_date(data, position, record):
+            days, position = read_varint(data, position)
+            return (EPOCH_DATE + timedelta(days=days)).isoformat(), position
+        return decode_date
+
+    if field_type == "time":
+        def decode_time(data, position, record):
+            seconds, position = read_varint(data, position)
+            return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}", position
+        return decode_time
+
+    if field_type == "variant":
+        discriminator = field["discriminator"]
+        variants = {key: compile_fields(fields)[1] for key, fields in field["variants"].items()}
+        return lambda data, position, record: variants[record[discriminator]](data, position)
+
+    raise ValueError(f"Unknown field type: {field_type}")
+
+# Codecs
+class JsonCodec:
+    """UTF-8 JSON, byte-for-byte what the original value_serializer produced"""
+    name = "json"
+
+    def encode(self, topic, value):
+        return json.dumps(value).encode("utf-8")
+
+    def decode(self, topic, data):
+        return json.loads(data.decode("utf-8"))
+
+class BinaryCodec:
+    """Schema-based binary records for topics in TOPIC_SCHEMAS; JSON for anything else"""
+    name = "binary"
+
+    def __init__(self, registry=None, schemas=None):
+        self.registry = registry or SchemaRegistry()
+        self.schemas = TOPIC_SCHEMAS if schemas is None else schemas
+        self._writers = {}  # topic -> (framing prefix, encode)
+        self._readers = {}  # schema id -> decode
+        self._json = JsonCodec()
+
+    def _writer(self, topic):
+        if topic not in self._writers:
+            schema = self.schemas.get(topic)
+            if schema is None:
+                self._writers[topic] = None
+            else:
+                schema_id = self.registry.register(f"{topic}-value", schema)
+                prefix = bytes([MAGIC_BYTE]) + struct.pack(">I", schema_id)
+                self._writers[topic] = (prefix, compile_fields(schema["fields"])[0])
+        return self._writers[topic]
+
+    def encode(self, topic, value):
+        writer = self._writer(topic)
+        if writer is not None and isinstance(value, dict):
+            prefix, encode = writer
+            out = bytearray(prefix)
+            try:
+                encode(value, out)
+                return bytes(out)
+            except (TypeError, ValueError, KeyError, AttributeError, OverflowError, struct.error):
+                pass
+        return self._json.encode(topic, value)
+
+    def decode(self, topic, data):
+        if not data or data[0] != MAGIC_BYTE:
+            return self._json.decode(topic, data)
+        schema_id = struct.unpack_from(">I", data, 1)[0]
+        if schema_id not in self._readers:
+            self._readers[schema_id] = compile_fields(self.registry.get(schema_id)["fields"])[1]
+        return self._readers[schema_id](memoryview(data), 5)[0]
+
+def get_codec(name=DEFAULT_CODEC, registry_path=SCHEMA_REGISTRY_FILE):
+    if name == "json":
+        return JsonCodec()
+    if name == "binary":
+        return BinaryCodec(SchemaRegistry(registry_path))
+    raise ValueError(f"Unknown codec: {name} (choose from json, binary)")
+
+def codec_headers(codec):
+    """Message headers declaring the codec a value was encoded with"""
+    return [(CODEC_HEADER, codec.name.encode("utf-8"))]
+
+def header_value(headers, name):
+    for key, value in headers or []:
+        if key == name:
+            return value
+    return None
+
+def decode_message(message, codecs):
+    """Decode a consumed message's value with the codec named in its header (JSON if absent)"""
+    codec_name = header_value(message.headers, CODEC_HEADER)
+    codec_name = codec_name.decode("utf-8") if codec_name else "json"
+    if codec_name not in codecs:
+        raise ValueError(f"Unsupported codec in message header: {codec_name}")
+    return codecs[codec_name].decode(message.topic, message.value)
+
+# Raw payloads of undecodable messages, kept in dead-letter records so they can be re-driven
+def raw_payload(message):
+    """Value and headers of a consumed message as base64 strings (JSON-safe, byte-exact)"""
+    encode = lambda data: base64.b64encode(data or b"").decode("ascii")
+    return {"encoding": "base64", "value": encode(message.value),
+            "headers": [[key, encode(value)] for key, value in message.headers or []]}
+
+def decode_raw_payload(topic, payload, codecs):
+    """Decode a raw_payload() the way the consumer would have decoded the original message"""
+    message = RawMessage(topic, base64.b64decode(payload["value"]),
+                         [(key, base64.b64decode(value)) for key, value in payload.get("headers") or []])
+    return decode_message(message, codecs)
+
+class RawMessage:
+    """Just the message attributes decode_message reads"""
+
+    def __init__(self, topic, value, headers):
+        self.topic = topic
+        self.value = value
+        self.headers = headers
@@ -0,0 +1,172 @@
+import re
+import pandas as pd
+from datetime import datetime
+
+# Declarative validation schemas for consumed records
+#
+# A schema names the record (for error messages) and lists, in the order errors are reported:
+#   required       - fields that must be present and not None
+#   allowed        - {field: allowed values}, checked whenever the field is present
+#   required_when  - [(field, value, [fields])]: when field equals value, fields are required too
+#   formats        - {field: strptime format}, checked when the field is present and not None
+#
+# RecordValidator compiles a schema once (frozensets, tuples, error prefixes) and validates either
+# one record or a whole micro-batch column-wise: every check runs over one column of the batch,
+# and timestamps are parsed with a single vectorized pd.to_datetime call. pandas alone accepts more
+# than strptime ("now", "today", datetime objects), so only strings in the canonical zero-padded
+# form (FORMAT_PATTERNS) that pandas parses are accepted directly; strptime confirms the rest,
+# exactly as datetime.strptime would. Both paths return the same errors for any record.
+
+APPOINTMENT_SCHEMA = {
+    "name": "appointment",
+    "required": ["appointment_id", "provider_id", "patient_id", "appointment_date",
+                 "scheduled_time", "appointment_type", "status"],
+    "allowed": {"status": ["Completed", "Cancelled", "No-show", "Rescheduled"]},
+    "required_when": [("status", "Completed", ["wait_time_minutes", "duration_minutes"])],
+    "formats": {}
+}
+
+EVENT_SCHEMA = {
+    "name": "event",
+    "required": ["event_type", "appointment_id", "timestamp"],
+    "allowed": {"event_type": ["appointment_scheduled", "patient_login", "provider_login",
+                               "session_started", "session_ended", "technical_issue",
+                               "appointment_cancelled", "appointment_rescheduled"]},
+    "required_when": [],
+    "formats": {"timestamp": "%Y-%m-%d %H:%M:%S"}
+}
+
+# Canonical, zero-padded form of each strptime directive, for the batch path's strict pre-check
+FORMAT_PATTERNS = {"%Y": r"\d{4}", "%m": r"\d{2}", "%d": r"\d{2}", "%H": r"\d{2}", "%M": r"\d{2}", "%S": r"\d{2}"}
+
+def format_pattern(date_format):
+    """Regex for the canonical form of date_format, or None if it uses other directives"""
+    parts = []
+    for part in re.split(r"(%.)", date_format):
+        if part.startswith("%"):
+            if part not in FORMAT_PATTERNS:
+                return None
+            parts.append(FORMAT_PATTERNS[part])
+        else:
+            parts.append(re.escape(part))
+    return "".join(parts)
+
+def all_canonical(values, batch_pattern):
+    """True if every value is a canonical string; one regex call over the batch joined by newlines"""
+    try:
+        joined = "\n".join(values)
+    except TypeError:
+        return False
+    # Canonical values hold no newlines, so a match also needs exactly one line per value
+    return joined.count("\n") == len(values) - 1 and batch_pattern.fullmatch(joined) is not None
+
+def is_allowed(value, values):
+    try:
+        return value in values
+    except TypeError:  # Unhashable (a list or dict) is never an allowed value
+        return False
+
+def matches_format(value, date_format):
+    try:
+        datetime.strptime(value, date_format)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+class RecordValidator:
+    """Validator compiled from a declarative schema; returns a list of error strings per record"""
+
+    def __init__(self, schema):
+        self.required = tuple(schema.get("required", []))
+        self.allowed = tuple((field, frozenset(values), f"Invalid {field}: ")
+                             for field, values in schema.get("allowed", {}).items())
+        self.required_when = tuple((field, value, tuple(fields))
+                                   for field, value, fields in schema.get("required_when", []))
+        self.formats = []
+        for field, date_format in schema.get("formats", {}).items():
+            pattern = format_pattern(date_format)
+            patterns = None if pattern is None else (re.compile(pattern), re.compile(f"(?:{pattern}\n)*{pattern}"))
+            self.formats.append((field, date_format, patterns, f"Invalid {field} format: "))
+        self.formats = tuple(self.formats)
+        self.record_name = schema.get("name", "record")
+
+    def validate(self, record):
+        """Errors for a single record"""
+        if not isinstance(record, dict):
+            return [f"Invalid {self.record_name}: expected an object, got {type(record).__name__}"]
+        errors = []
+        for field in self.required:
+            if record.get(field) is None:
+                errors.append(f"Missing required field: {field}")
+        for field, values, prefix in self.allowed:
+            if field in record and not is_allowed(record[field], values):
+                errors.append(f"{prefix}{record[field]}")
+        for field, value, fields in self.required_when:
+            if record.get(field) == value:
+                for required in fields:
+                    if record.get(required) is None:
+                        errors.append(f"{value} {self.record_name} missing {required}")
+        for field, date_format, _, prefix in self.formats:
+            if record.get(field) is not None and not matches_format(record[field], date_format):
+                errors.append(f"{prefix}{record[field]}")
+        return errors
+
+    def validate_batch(self, records):
+        """Errors for every record of a micro-batch (a list of dicts), checked one column at a time"""
+        if not all(isinstance(record, dict) for record in records):
+            # Anything but an object (a JSON array or string) only gets the record-level error
+            objects = [i for i, record in enumerate(records) if isinstance(record, dict)]
+            errors = [None if isinstance(record, dict) else self.validate(record) for record in records]
+            for i, record_errors in zip(objects, self.validate_batch([records[i] for i in objects])):
+                errors[i] = record_errors
+            return errors
+
+        errors = [[] for _ in records]
+        def report(positions, message):
+            for i in positions:
+                errors[i].append(message(i))
+
+        # Each check first tests the whole column at C speed and only looks for positions if it fails
+        for field in self.required:
+            column = [record.get(field) for record in records]
+            if None in column:
+                message = f"Missing required field: {field}"
+                report([i for i, v in enumerate(column) if v is None], lambda i: message)
+        for field, values, prefix in self.allowed:
+            column = [record.get(field, values) for record in records]  # The schema's set marks "absent"
+            try:
+                all_allowed = values.issuperset(column)
+            except TypeError:  # An unhashable value; found record by record below
+                all_allowed = False
+            if not all_allowed:
+                report([i for i, v in enumerate(column) if v is not values and not is_allowed(v, values)],
+                       lambda i: f"{prefix}{column[i]}")
+        for field, value, fields in self.required_when:
+            matching = [i for i, record in enumerate(records) if record.get(field) == value]
+            # Record by record within the matches, so errors keep the order of the fields
+            for i in matching:
+                for required in fields:
+                    if records[i].get(required) is None:
+                        errors[i].append(f"{value} {self.record_name} missing {required}")
+        for field, date_format, patterns, prefix in self.formats:
+            column = [record.get(field) for record in records]
+            present = [i for i, v in enumerate(column) if v is not None]
+            if not present:
+                continue
+            # Only canonical strings go to pandas; everything else is left to strptime below
+            if patterns is None:
+                canonical = []
+            elif all_canonical([column[i] for i in present], patterns[1]):
+                canonical = present
+            else:
+                canonical = [i for i in present if isinstance(column[i], str) and patterns[0].fullmatch(column[i])]
+            parsed = pd.to_datetime(pd.Series([column[i] for i in canonical], dtype=object),
+                                    format=date_format, errors="coerce")
+            accepted = {i for i, is_na in zip(canonical, parsed.isna().tolist()) if not is_na}
+            rejected = [i for i in present if i not in accepted]
+            report([i for i in rejected if not matches_format(column[i], date_format)],
+                   lambda i: f"{prefix}{column[i]}")
+        return errors
+
+APPOINTMENT_VALIDATOR = RecordValidator(APPOINTMENT_SCHEMA)
+EVENT_VALIDATOR = RecordValidator(EVENT_SCHEMA)
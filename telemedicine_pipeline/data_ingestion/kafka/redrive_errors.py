@@ -0,0 +1,202 @@
+import os
+import json
+import argparse
+from datetime import datetime
+
+from appointment_consumer import TOPIC_VALIDATORS
+from appointment_producer import create_kafka_producer, send_message
+from local_broker import LOCAL_BROKER_DIR
+from message_codecs import SCHEMA_REGISTRY_FILE, JsonCodec, BinaryCodec, SchemaRegistry, decode_raw_payload
+from segment_writer import PROCESSED_DIR, SEGMENT_FORMATS, DEFAULT_SEGMENT_RECORDS, SegmentWriter, \
+    list_segments, read_segment, write_atomic
+
+# Re-drive dead-lettered records
+#
+# The consumer writes every rejected message to the append-only error segments
+# (processed/errors/) with its validation errors, original value and source topic/partition/offset.
+# After a fix (to the validators or to the data), this tool replays them at batch speed:
+#
+#   1. reads the error segments not re-driven yet, one at a time (memory stays bounded)
+#   2. re-decodes the raw payload of messages that failed to decode (kept base64, with headers),
+#      then re-validates the original values with the consumer's batch validators, per data type
+#   3. writes the records that now pass to the appointment/event segments, or with --target topic
+#      sends them back to their topic so the whole consumer path (sessions, warehouse) sees them
+#   4. writes the records that still fail to new error segments (redrive_attempts + 1), or once
+#      they have failed max_attempts re-drives, to the quarantine segments (processed/quarantine/),
+#      which are never re-driven automatically
+#   5. lists the segment in the re-drive manifest, so the next run skips it
+#
+# Records dead-lettered by the warehouse sink (stage "warehouse") passed validation and are already
+# in the appointment segments: only --target topic replays them. Other runs leave them where they
+# are and list their segment as warehouse_pending in the manifest, for the next --target topic run.
+# Error segments are never moved or rewritten (they may belong to the consumer's durable flush
+# groups). A crash between steps 3 and 5 replays that one segment again on the next run.
+
+REDRIVE_MANIFEST_FILE = "redrive_manifest.json"
+DEFAULT_REDRIVE_BATCH_SIZE = 10000
+DEFAULT_MAX_REDRIVE_ATTEMPTS = 5
+DATA_TYPE_TOPICS = {data_type: topic for topic, (data_type, _) in TOPIC_VALIDATORS.items()}
+DATA_TYPE_VALIDATORS = {data_type: validator for data_type, validator in TOPIC_VALIDATORS.values()}
+
+def load_manifest(base_dir):
+    """
+    Error segments (relative to base_dir) already re-driven, and those of them whose warehouse
+    failures still wait for a --target topic run
+    """
+    path = os.path.join(base_dir, REDRIVE_MANIFEST_FILE)
+    if not os.path.exists(path):
+        return set(), set()
+    with open(path) as f:
+        manifest = json.load(f)
+    return set(manifest["redriven"]), set(manifest.get("warehouse_pending", []))
+
+def save_manifest(base_dir, redriven, warehouse_pending):
+    write_atomic(os.path.join(base_dir, REDRIVE_MANIFEST_FILE),
+                 json.dumps({"redriven": sorted(redriven), "warehouse_pending": sorted(warehouse_pending)},
+                            indent=2), fsync=True)
+
+def replay_value(error_record, codecs):
+    """The original value to re-validate, or None if it still can't be decoded"""
+    value = error_record.get("original_data")
+    if error_record.get("stage") == "decode":
+        try:
+            if isinstance(value, dict) and value.get("encoding") == "base64":
+                value = decode_raw_payload(error_record.get("topic"), value, codecs)
+            elif isinstance(value, str):
+                # Written before raw payloads were kept: the value as lossy UTF-8 text
+                value = json.loads(value)
+        except Exception:
+            return None
+    return value if isinstance(value, dict) else None
+
+def redrive_records(error_records, batch_size, codecs):
+    """Split error records into (data_type, value, error record) that now pass and error records that still fail"""
+    passed, failed = [], []
+    by_data_type = {}
+    for error_record in error_records:
+        data_type, value = error_record.get("data_type"), replay_value(error_record, codecs)
+        if data_type not in DATA_TYPE_VALIDATORS or value is None:
+            failed.append((error_record, error_record.get("errors") or []))
+        else:
+            by_data_type.setdefault(data_type, []).append((error_record, value))
+
+    for data_type, entries in by_data_type.items():
+        validator = DATA_TYPE_VALIDATORS[data_type]
+        for start in range(0, len(entries), batch_size):
+            batch = entries[start:start + batch_size]
+            for (error_record, value), errors in zip(batch, validator.validate_batch([v for _, v in batch])):
+                if errors:
+                    failed.append((dict(error_record, original_data=value, stage="validation"), errors))
+                else:
+                    passed.append((data_type, value, error_record))
+    return passed, failed
+
+def redrive_segment(path, writer, target, producer, batch_size, codecs, max_attempts, dry_run=False,
+                    warehouse_only=False):
+    """Re-drive the records of one error segment (only its warehouse failures with warehouse_only); returns its counts"""
+    error_records = read_segment(path, nested_fields=("errors", "original_data"))
+    if warehouse_only:
+        error_records = [r for r in error_records if r.get("stage") == "warehouse"]
+    counts = {"records": len(error_records), "passed": 0, "failed": 0, "quarantined": 0, "warehouse_pending": 0}
+    if target != "topic":
+        # Left in the segment for a --target topic run
+        counts["warehouse_pending"] = sum(r.get("stage") == "warehouse" for r in error_records)
+        error_records = [r for r in error_records if r.get("stage") != "warehouse"]
+    passed, failed = redrive_records(error_records, batch_size, codecs)
+    counts["passed"] = len(passed)
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    for error_record, errors in failed:
+        attempts = (error_record.get("redrive_attempts") or 0) + 1
+        data_type = "quarantine" if attempts >= max_attempts else "error"
+        counts["quarantined" if data_type == "quarantine" else "failed"] += 1
+        if not dry_run:
+            writer.write(data_type, dict(error_record, errors=errors, failed_at=now, redrive_attempts=attempts))
+    if dry_run:
+        return counts
+
+    codec = JsonCodec()
+    for data_type, value, error_record in passed:
+        if target == "topic":
+            send_message(producer, error_record.get("topic") or DATA_TYPE_TOPICS[data_type],
+                         error_record.get("data_id"), value, codec)
+        else:
+            writer.write(data_type, value)
+    writer.flush_all()
+    if producer is not None:
+        producer.flush()
+    return counts
+
+def redrive_errors(base_dir, target="segments", producer=None, batch_size=DEFAULT_REDRIVE_BATCH_SIZE,
+                   segment_format="ndjson", dry_run=False, schema_registry=SCHEMA_REGISTRY_FILE,
+                   max_attempts=DEFAULT_MAX_REDRIVE_ATTEMPTS):
+    redriven, warehouse_pending = load_manifest(base_dir)
+    # (path, warehouse_only): new segments, then for --target topic the warehouse failures earlier runs left
+    segments = [(path, False) for path in list_segments(base_dir, "error")
+                if os.path.relpath(path, base_dir) not in redriven]
+    if target == "topic":
+        segments = [(os.path.join(base_dir, name), True) for name in sorted(warehouse_pending)] + segments
+    print(f"Re-driving {len(segments)} error segment(s)")
+    summary = {"segments": 0, "records": 0, "passed": 0, "failed": 0, "quarantined": 0, "warehouse_pending": 0}
+
+    codecs = {"json": JsonCodec(), "binary": BinaryCodec(SchemaRegistry(schema_registry))}
+    writer = SegmentWriter(base_dir, segment_format, max_records=max(batch_size, DEFAULT_SEGMENT_RECORDS))
+    for path, warehouse_only in segments:
+        counts = redrive_segment(path, writer, target, producer, batch_size, codecs, max_attempts, dry_run,
+                                 warehouse_only)
+        if writer.buffered_records:
+            print(f"Could not write the re-driven records of {path}; stopping")
+            break
+        summary["segments"] += 1
+        for name, count in counts.items():
+            summary[name] += count
+        if not dry_run:
+            # Only once everything replayed from the segment is on disk (or acknowledged by the broker)
+            name = os.path.relpath(path, base_dir)
+            redriven.add(name)
+            if counts["warehouse_pending"]:
+                warehouse_pending.add(name)
+            else:
+                warehouse_pending.discard(name)
+            save_manifest(base_dir, redriven, warehouse_pending)
+    if not dry_run and not writer.buffered_records:
+        writer.close()
+    return summary
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Re-validate dead-lettered records and replay those that now pass")
+    parser.add_argument("--output-dir", default=PROCESSED_DIR, help="Consumer output directory holding errors/")
+    parser.add_argument("--target", choices=["segments", "topic"], default="segments",
+                        help="segments: write passing records to the appointment/event segments; "
+                             "topic: send them back to their Kafka topic")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_REDRIVE_BATCH_SIZE,
+                        help="Records per validate_batch call")
+    parser.add_argument("--segment-format", choices=SEGMENT_FORMATS, default="ndjson", help="Format of the new segments")
+    parser.add_argument("--local-broker", nargs="?", const=LOCAL_BROKER_DIR, default=None, metavar="LOG_DIR",
+                        help=f"With --target topic, send to a file-backed local broker (default dir: {LOCAL_BROKER_DIR})")
+    parser.add_argument("--schema-registry", default=SCHEMA_REGISTRY_FILE,
+                        help="Schema registry file for re-decoding binary messages that failed to decode")
+    parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_REDRIVE_ATTEMPTS,
+                        help="Re-drives a record may fail before it is quarantined instead of dead-lettered again")
+    parser.add_argument("--dry-run", action="store_true", help="Only report how many records would pass")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    producer = None
+    if args.target == "topic" and not args.dry_run:
+        producer = create_kafka_producer(args.local_broker, linger_ms=10, batch_size=64 * 1024)
+        if not producer:
+            return
+
+    summary = redrive_errors(args.output_dir, args.target, producer, args.batch_size, args.segment_format, args.dry_run,
+                             args.schema_registry, args.max_attempts)
+    print(f"{summary['passed']} of {summary['records']} dead-lettered records now pass"
+          f"{' (dry run)' if args.dry_run else ''}; {summary['failed']} still fail, "
+          f"{summary['quarantined']} quarantined after {args.max_attempts} attempts")
+    if summary["warehouse_pending"]:
+        print(f"{summary['warehouse_pending']} warehouse failures left for a re-drive with --target topic")
+    if producer is not None:
+        producer.close()
+
+if __name__ == "__main__":
+    main()
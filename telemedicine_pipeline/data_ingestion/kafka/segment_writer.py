@@ -0,0 +1,406 @@
+import os
+import json
+import time
+import importlib.util
+import pandas as pd
+from datetime import datetime
+
+from stream_metrics import LatencyHistogram
+
+# Micro-batched segment sink for consumed messages
+#
+# Instead of one pretty-printed JSON file per message, records are buffered per data type and
+# time window and written as one segment file per flush:
+#
+#   {base_dir}/{appointments|events|errors|sessions}/{window}/{data_type}-{window}-{flush time}-{pid}-{seq}.ndjson
+#
+# A buffer is flushed when it reaches max_records or max_bytes (the segment size), or when its
+# oldest record is max_age_seconds old, so quiet topics still land on disk promptly. Windows are
+# window_minutes wide and taken from the receive time. Segments are written to a hidden temporary
+# file in the target directory and renamed into place, so readers never see a partial segment.
+# Names include the process id, so several consumer processes can share base_dir.
+#
+# The columnar format writes parquet (requires pyarrow); nested values such as event details are
+# stored as JSON strings so every segment has a flat, stable schema.
+#
+# Durable mode (for committing consumer offsets only once records are on disk): any flush trigger
+# flushes every buffer together as one flush group, segments are fsynced, and each segment gets an
+# offsets sidecar ({segment}.offsets.json) with
+#   flush (group id), segments (every segment of the group, relative to base_dir),
+#   offsets (first and next offset per topic partition for the records in this segment),
+#   checkpoint (next offset per topic partition below which every consumed record is on disk)
+# Sidecars are written before the segments are renamed into place, so a group is complete when
+# all its segments and sidecars exist. On start-up recover_checkpoint() removes the leftovers of an
+# interrupted flush (the newest, incomplete groups) and returns the checkpoint to resume from;
+# older groups are never removed, even with a segment missing.
+#
+# A flush that fails (disk full, unreachable mount) leaves its records buffered and is retried after
+# FLUSH_RETRY_SECONDS; the consumer pauses fetching while the buffers are over its memory bound.
+
+PROCESSED_DIR = '/home/ubuntu/telemedicine_pipeline/data_ingestion/processed'
+SEGMENT_FORMATS = ["ndjson", "parquet"]
+SEGMENT_EXTENSIONS = {"ndjson": "ndjson", "parquet": "parquet"}
+DATA_TYPE_DIRS = {"appointment": "appointments", "event": "events", "error": "errors", "session": "sessions",
+                  "quarantine": "quarantine"}  # Dead letters re-driven too often (redrive_errors.py)
+
+DEFAULT_SEGMENT_RECORDS = 10000  # Records per segment
+DEFAULT_SEGMENT_BYTES = 16 * 1024 * 1024  # Serialized bytes per segment
+DEFAULT_SEGMENT_AGE_SECONDS = 30  # Longest a record waits in the buffer
+DEFAULT_WINDOW_MINUTES = 60
+OFFSETS_SIDECAR_SUFFIX = ".offsets.json"
+FLUSH_RETRY_SECONDS = 1
+
+def parquet_available():
+    return importlib.util.find_spec("pyarrow") is not None
+
+def resolve_segment_format(name):
+    """The requested segment format, or ndjson if parquet was requested without pyarrow installed"""
+    if name == "parquet" and not parquet_available():
+        print("pyarrow is not installed, writing ndjson segments instead of parquet")
+        return "ndjson"
+    return name
+
+def window_start(timestamp, window_minutes):
+    """Window label for a datetime, e.g. 20240115T1400 for 60-minute windows"""
+    minute = (timestamp.hour * 60 + timestamp.minute) // window_minutes * window_minutes
+    return timestamp.replace(hour=minute // 60, minute=minute % 60, second=0, microsecond=0).strftime('%Y%m%dT%H%M')
+
+def offsets_sidecar_name(segment_name):
+    return segment_name + OFFSETS_SIDECAR_SUFFIX
+
+def offsets_to_list(offsets):
+    return [{"topic": topic, "partition": partition, "offset": offset}
+            for (topic, partition), offset in sorted(offsets.items())]
+
+def offsets_from_list(entries):
+    return {(e["topic"], e["partition"]): e["offset"] for e in entries}
+
+def fsync_path(path):
+    """fsync a file or directory by path (a directory after renames inside it)"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+# Write a file under a temporary name and rename it into place, optionally fsyncing the data first
+def write_atomic(path, data, fsync=False):
+    temp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+    with open(temp_path, "w") as f:
+        f.write(data)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+def remove_quietly(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+# Resume point for durable mode
+def recover_checkpoint(base_dir=PROCESSED_DIR):
+    """
+    Checkpoint ({(topic, partition): next offset}) from the offsets sidecars of complete flush
+    groups under base_dir. Temporary files are removed, and so are the segments of an interrupted
+    flush: an incomplete group whose checkpoint goes past every complete group's for some partition
+    (its records are past the checkpoint and will be consumed again). An older group with a segment
+    missing (removed by retention, say) was superseded by later flushes and is left as it is.
+    """
+    groups = {}  # flush id -> (segments listed, sidecar paths, checkpoint)
+    for data_type_dir in DATA_TYPE_DIRS.values():
+        for directory, _, files in os.walk(os.path.join(base_dir, data_type_dir)):
+            for name in files:
+                path = os.path.join(directory, name)
+                if name.startswith(".") and name.endswith(".tmp"):
+                    remove_quietly(path)
+                elif name.endswith(OFFSETS_SIDECAR_SUFFIX):
+                    with open(path) as f:
+                        sidecar = json.load(f)
+                    group = groups.setdefault(sidecar["flush"], (sidecar["segments"], [], sidecar["checkpoint"]))
+                    group[1].append(path)
+
+    checkpoint = {}
+    incomplete = {}
+    for flush, (segments, sidecars, group_checkpoint) in groups.items():
+        segment_paths = [os.path.join(base_dir, segment) for segment in segments]
+        if len(sidecars) == len(segments) and all(os.path.exists(path) for path in segment_paths):
+            for tp, offset in offsets_from_list(group_checkpoint).items():
+                checkpoint[tp] = max(checkpoint.get(tp, 0), offset)
+        else:
+            incomplete[flush] = (segment_paths, sidecars, offsets_from_list(group_checkpoint))
+
+    for flush, (segment_paths, sidecars, group_checkpoint) in sorted(incomplete.items()):
+        if any(offset > checkpoint.get(tp, 0) for tp, offset in group_checkpoint.items()):
+            print(f"Removing interrupted flush {flush}: {len(segment_paths)} segment(s) will be consumed again")
+            for path in segment_paths + sidecars:
+                remove_quietly(path)
+        else:
+            print(f"Keeping flush {flush} with missing segments: a later flush covers its offsets")
+    return checkpoint
+
+def flatten_record(record):
+    return {k: json.dumps(v) if isinstance(v, (dict, list)) else v for k, v in record.items()}
+
+# Reading segments back
+def list_segments(base_dir, data_type):
+    """Complete segment files of a data type under base_dir (no temporary files or sidecars), oldest window first"""
+    paths = []
+    for directory, _, files in os.walk(os.path.join(base_dir, DATA_TYPE_DIRS[data_type])):
+        paths.extend(os.path.join(directory, name) for name in files
+                     if not name.startswith(".") and name.endswith(tuple(SEGMENT_EXTENSIONS.values())))
+    return sorted(paths)
+
+def read_segment(path, nested_fields=()):
+    """Records of one segment; nested_fields are decoded from the JSON strings parquet stores them as"""
+    if path.endswith(".parquet"):
+        records = pd.read_parquet(path).to_dict("records")
+        for record in records:
+            for field in nested_fields:
+                if isinstance(record.get(field), str) and record[field][:1] in ("{", "["):
+                    record[field] = json.loads(record[field])
+        return records
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+class SegmentBuffer:
+    """Records waiting for one (data type, window) segment"""
+
+    def __init__(self, data_type, window):
+        self.data_type = data_type
+        self.window = window
+        self.records = []
+        self.lines = []
+        self.bytes = 0
+        self.created_at = time.monotonic()
+        self.first_offsets = {}  # (topic, partition) -> first offset buffered
+        self.next_offsets = {}  # (topic, partition) -> last offset buffered + 1
+
+    def append(self, record, source=None):
+        line = json.dumps(record, default=str) + "\n"
+        self.records.append(record)
+        self.lines.append(line)
+        self.bytes += len(line)
+        if source is not None:
+            topic, partition, offset = source
+            self.first_offsets.setdefault((topic, partition), offset)
+            self.next_offsets[(topic, partition)] = offset + 1
+
+    def __len__(self):
+        return len(self.records)
+
+class SegmentWriter:
+    """Buffer records and flush them as atomically written NDJSON or parquet segments"""
+
+    def __init__(self, base_dir=PROCESSED_DIR, segment_format="ndjson", max_records=DEFAULT_SEGMENT_RECORDS,
+                 max_bytes=DEFAULT_SEGMENT_BYTES, max_age_seconds=DEFAULT_SEGMENT_AGE_SECONDS,
+                 window_minutes=DEFAULT_WINDOW_MINUTES, durable=False, checkpoint=None):
+        if segment_format not in SEGMENT_FORMATS:
+            raise ValueError(f"Unknown segment format: {segment_format}")
+        if segment_format == "parquet" and not parquet_available():
+            raise ValueError("parquet segments require pyarrow")
+        self.base_dir = base_dir
+        self.segment_format = segment_format
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.window_minutes = window_minutes
+        self.durable = durable
+
+        self.buffers = {}  # (data_type, window) -> SegmentBuffer
+        self.created_dirs = set()
+        self.sequence = 0
+        self.segments_written = 0
+        self.records_written = 0
+        self.flush_latency = LatencyHistogram()  # Seconds per flush, for the consumer's metrics
+        self.flush_errors = 0
+        self.retry_at = 0
+        # (before, after) callables run around every flush, e.g. to keep the sessionizer's state in
+        # step with the checkpoint; after (or None) gets the data types still buffered. An OSError
+        # from before fails the flush. Records a hook writes join the flush in progress
+        self.flush_hooks = []
+        self.flushing = False
+
+        # Durable mode resumes from what earlier runs got safely on disk. Processes sharing base_dir
+        # recover once up front and pass the checkpoint in, so none removes another's flush in progress
+        if checkpoint is None:
+            checkpoint = recover_checkpoint(base_dir) if durable else {}
+        self.checkpoint = dict(checkpoint)
+
+    def write(self, data_type, record, received_at=None, source=None):
+        """
+        Buffer one record; flushes its buffer when full and any buffer that has aged out.
+        source is the (topic, partition, offset) the record was consumed from, for the checkpoint.
+        """
+        if data_type not in DATA_TYPE_DIRS:
+            print(f"Unknown data type: {data_type}")
+            return
+        window = window_start(received_at or datetime.now(), self.window_minutes)
+        buffer = self.buffers.get((data_type, window))
+        if buffer is None:
+            buffer = self.buffers[(data_type, window)] = SegmentBuffer(data_type, window)
+        buffer.append(record, source)
+
+        if len(buffer) >= self.max_records or buffer.bytes >= self.max_bytes:
+            self._flush([buffer])
+        self.maybe_flush()
+
+    def maybe_flush(self):
+        """Flush buffers whose oldest record has waited max_age_seconds; call regularly while idle"""
+        now = time.monotonic()
+        aged = [buffer for buffer in self.buffers.values() if now - buffer.created_at >= self.max_age_seconds]
+        if aged:
+            self._flush(aged)
+
+    def flush_all(self):
+        if self.buffers:
+            self._flush(list(self.buffers.values()))
+
+    def _flush(self, buffers):
+        if self.flushing or time.monotonic() < self.retry_at:
+            return
+        start_time = time.monotonic()
+        self.flushing = True
+        try:
+            for before, _ in self.flush_hooks:
+                before()
+            # A checkpoint needs every consumed record on disk, so durable mode always flushes everything
+            if self.durable:
+                self._flush_group(list(self.buffers.values()))
+            else:
+                for buffer in buffers:
+                    self._flush_buffer(buffer)
+        except OSError as e:
+            self.flush_errors += 1
+            self.retry_at = time.monotonic() + FLUSH_RETRY_SECONDS
+            print(f"Error flushing segments, keeping {self.buffered_records} records buffered: {e}")
+            return
+        finally:
+            self.flushing = False
+        pending_types = {buffer.data_type for buffer in self.buffers.values()}
+        for _, after in self.flush_hooks:
+            if after is not None:
+                after(pending_types)
+        self.flush_latency.record(time.monotonic() - start_time)
+
+    @property
+    def buffered_records(self):
+        return sum(len(buffer) for buffer in self.buffers.values())
+
+    @property
+    def buffered_bytes(self):
+        return sum(buffer.bytes for buffer in self.buffers.values())
+
+    def _segment_dir(self, buffer):
+        path = os.path.join(self.base_dir, DATA_TYPE_DIRS[buffer.data_type], buffer.window)
+        if path not in self.created_dirs:
+            os.makedirs(path, exist_ok=True)
+            self.created_dirs.add(path)
+        return path
+
+    def _segment_name(self, buffer):
+        name = (f"{buffer.data_type}-{buffer.window}-{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+                f"-{os.getpid()}-{self.sequence:05d}.{SEGMENT_EXTENSIONS[self.segment_format]}")
+        self.sequence += 1
+        return name
+
+    def _write_segment(self, buffer, temp_path, fsync=False):
+        if self.segment_format == "parquet":
+            pd.DataFrame([flatten_record(r) for r in buffer.records]).to_parquet(temp_path, index=False)
+            if fsync:
+                fsync_path(temp_path)
+        else:
+            with open(temp_path, "w") as f:
+                f.writelines(buffer.lines)
+                if fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+
+    def _flush_buffer(self, buffer):
+        if not buffer.records:
+            del self.buffers[(buffer.data_type, buffer.window)]
+            return None
+
+        directory = self._segment_dir(buffer)
+        name = self._segment_name(buffer)
+        path = os.path.join(directory, name)
+        temp_path = os.path.join(directory, f".{name}.tmp")
+
+        # Write beside the final name and rename: the segment appears complete or not at all
+        try:
+            self._write_segment(buffer, temp_path)
+            os.replace(temp_path, path)
+        except OSError:
+            remove_quietly(temp_path)
+            raise
+        del self.buffers[(buffer.data_type, buffer.window)]
+
+        self.segments_written += 1
+        self.records_written += len(buffer)
+        print(f"Saved {len(buffer)} {buffer.data_type} records to {path}")
+        return path
+
+    def _flush_group(self, buffers):
+        """Durable flush: fsynced segments plus offsets sidecars, then advance the checkpoint"""
+        for buffer in buffers:
+            if not buffer.records:
+                del self.buffers[(buffer.data_type, buffer.window)]
+        buffers = [buffer for buffer in buffers if buffer.records]
+        if not buffers:
+            return []
+
+        checkpoint = dict(self.checkpoint)
+        for buffer in buffers:
+            for tp, offset in buffer.next_offsets.items():
+                checkpoint[tp] = max(checkpoint.get(tp, 0), offset)
+
+        names = [self._segment_name(buffer) for buffer in buffers]
+        directories = [self._segment_dir(buffer) for buffer in buffers]
+        segments = [os.path.relpath(os.path.join(d, n), self.base_dir) for d, n in zip(directories, names)]
+        flush = f"{datetime.now().strftime('%Y%m%d%H%M%S%f')}-{os.getpid()}-{self.sequence}"
+
+        paths = [os.path.join(d, n) for d, n in zip(directories, names)]
+        try:
+            # 1. Segment data, fsynced under temporary names
+            for buffer, directory, name in zip(buffers, directories, names):
+                self._write_segment(buffer, os.path.join(directory, f".{name}.tmp"), fsync=True)
+
+            # 2. Offsets sidecars, each listing the whole group
+            for buffer, directory, name in zip(buffers, directories, names):
+                sidecar = {
+                    "flush": flush,
+                    "segments": segments,
+                    "offsets": [{"topic": topic, "partition": partition, "first_offset": first,
+                                 "next_offset": buffer.next_offsets[(topic, partition)]}
+                                for (topic, partition), first in sorted(buffer.first_offsets.items())],
+                    "checkpoint": offsets_to_list(checkpoint)
+                }
+                write_atomic(os.path.join(directory, offsets_sidecar_name(name)), json.dumps(sidecar), fsync=True)
+
+            # 3. Segments into place; the group is complete once every rename is durable
+            for directory, name, path in zip(directories, names, paths):
+                os.replace(os.path.join(directory, f".{name}.tmp"), path)
+            for directory in set(directories):
+                fsync_path(directory)
+        except OSError:
+            # Nothing of a failed group may stay behind; its buffers are flushed again later
+            for directory, name, path in zip(directories, names, paths):
+                for leftover in (os.path.join(directory, f".{name}.tmp"),
+                                 os.path.join(directory, offsets_sidecar_name(name)), path):
+                    remove_quietly(leftover)
+            raise
+
+        for buffer, path in zip(buffers, paths):
+            del self.buffers[(buffer.data_type, buffer.window)]
+            self.segments_written += 1
+            self.records_written += len(buffer)
+            print(f"Saved {len(buffer)} {buffer.data_type} records to {path}")
+        self.checkpoint = checkpoint
+        return paths
+
+    def close(self):
+        self.retry_at = 0
+        self.flush_all()
+        print(f"Segment writer wrote {self.records_written} records in {self.segments_written} segment(s) "
+              f"to {self.base_dir}")
@@ -0,0 +1,386 @@
+import os
+import json
+import time
+import sqlite3
+import itertools
+from collections import OrderedDict
+from datetime import datetime
+
+# Stateful sessionization of telemedicine events by appointment_id
+#
+# Every valid event updates the open session state of its appointment. A session record (one
+# row of real-time session facts) is emitted when the session closes:
+#
+#   session_ended          - the normal end of a completed appointment
+#   appointment_cancelled  - cancelled appointments never get a session
+#   timeout                - no event for the appointment for timeout_seconds (no-shows,
+#                            rescheduled appointments, sessions whose end never arrived)
+#
+# The timeout runs on processing time (seconds since the last event was received, wall clock so
+# spilled sessions survive restarts), because event times within one appointment span days
+# (scheduled up to a week before the session).
+#
+# Open sessions live in a SessionStore: an in-memory dict ordered by last update, bounded at
+# max_sessions. Beyond that the least recently updated sessions spill to sqlite, and they are
+# loaded back when their next event arrives. Because both tiers are ordered by last update, TTL
+# eviction only looks at the oldest sessions.
+#
+# Each event partition has its own sqlite state file in the state directory, so worker processes
+# (one per partition set) never expire or emit each other's sessions; a consumer opens the files
+# of the partitions assigned to it and hands them back on rebalance. The files are kept in step
+# with the segment writer's flushes, which carry the committed offsets:
+#
+#   before every flush   - sessions changed in memory are snapshotted to their state file, so a
+#                          crash never loses events whose offsets the flush commits
+#   after every flush    - closed sessions whose records went out with the previous flush are
+#                          deleted
+#
+# Every state remembers the offset of its last event, and replayed events (after a crash, from
+# the committed offset) are skipped. A crash can still emit a session again: at-least-once.
+
+SESSION_STATE_DIR = '/home/ubuntu/telemedicine_pipeline/data_ingestion/kafka/session_state'
+DEFAULT_SESSION_TIMEOUT_SECONDS = 3600
+DEFAULT_MAX_OPEN_SESSIONS = 100000
+SPILL_FRACTION = 0.1  # Share of max_sessions spilled at once when memory is full
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Event timestamps kept per session, by event type
+SESSION_TIMESTAMPS = {
+    "appointment_scheduled": "scheduled_event_at",
+    "appointment_cancelled": "cancelled_at",
+    "appointment_rescheduled": "rescheduled_at",
+    "patient_login": "patient_login_at",
+    "provider_login": "provider_login_at",
+    "session_started": "session_started_at",
+    "session_ended": "session_ended_at"
+}
+CLOSING_EVENTS = ["session_ended", "appointment_cancelled"]
+
+class SessionStore:
+    """
+    Open session states by appointment_id: bounded in memory, spilling the oldest to sqlite.
+    Each event partition has its own state file, so consumers of different partitions never
+    touch each other's sessions.
+    """
+
+    def __init__(self, state_dir=SESSION_STATE_DIR, max_sessions=DEFAULT_MAX_OPEN_SESSIONS):
+        self.state_dir = state_dir
+        self.max_sessions = max_sessions
+        self.memory = OrderedDict()  # appointment_id -> (last update, state), oldest first
+        self.connections = {}  # partition -> sqlite connection to its state file
+        self.rows = {}  # partition -> rows in its state file
+        self.dirty = set()  # In memory and changed since the last checkpoint
+        self.released = set()  # (partition, appointment_id) closed or expired since the last flush
+        self.flushed_releases = set()  # Released before the last flush: their session records are on disk
+        os.makedirs(state_dir, exist_ok=True)
+
+    def connection(self, partition):
+        """The state file of a partition, opened on first use"""
+        conn = self.connections.get(partition)
+        if conn is None:
+            conn = sqlite3.connect(os.path.join(self.state_dir, f"partition-{partition:05d}.db"), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS open_sessions (
+                appointment_id TEXT PRIMARY KEY,
+                last_update REAL,
+                state TEXT
+            )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_open_sessions_last_update ON open_sessions (last_update)")
+            conn.commit()
+            self.connections[partition] = conn
+            self.rows[partition] = conn.execute("SELECT COUNT(*) FROM open_sessions").fetchone()[0]
+        return conn
+
+    def assign(self, partitions):
+        """Open the state files of the consumer's event partitions; spill and close those it no longer owns"""
+        partitions = set(partitions)
+        for partition in partitions - set(self.connections):
+            self.connection(partition)
+        revoked = set(self.connections) - partitions
+        if revoked:
+            self.spill(partitions=revoked)
+            self._delete({key for key in self.flushed_releases if key[0] in revoked})
+            for partition in revoked:
+                self.connections.pop(partition).close()
+                del self.rows[partition]
+            # Released sessions whose records are not safely flushed keep their rows; the new owner may emit them again
+            self.released = {key for key in self.released if key[0] not in revoked}
+            self.flushed_releases = {key for key in self.flushed_releases if key[0] not in revoked}
+            print(f"Session state of partition(s) {sorted(revoked)} handed back")
+
+    def get(self, appointment_id, partition=0):
+        """The open state for an appointment (loaded from its state file if spilled), or None"""
+        entry = self.memory.get(appointment_id)
+        if entry is not None:
+            return entry[1]
+        conn = self.connection(partition)
+        key = (partition, appointment_id)
+        if not self.rows[partition] or key in self.released or key in self.flushed_releases:
+            return None
+        # The row stays until the session is released: it is the durable copy of the state
+        row = conn.execute("SELECT state FROM open_sessions WHERE appointment_id = ?", (appointment_id,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def put(self, appointment_id, state, now):
+        self.memory[appointment_id] = (now, state)
+        self.memory.move_to_end(appointment_id)
+        self.dirty.add(appointment_id)
+        # Reopened after a release (a late event the closed list no longer remembers): keep the new row
+        key = (state["partition"], appointment_id)
+        self.released.discard(key)
+        self.flushed_releases.discard(key)
+        if len(self.memory) > self.max_sessions:
+            self.spill(max(1, int(self.max_sessions * SPILL_FRACTION)))
+
+    def remove(self, appointment_id, partition=0):
+        """Drop a closed session; its row is released once its session record is written"""
+        self.memory.pop(appointment_id, None)
+        self.dirty.discard(appointment_id)
+
+    def release(self, appointment_id, partition=0):
+        """Call after the session record of a removed or expired session went to the segment writer"""
+        self.released.add((partition, appointment_id))
+
+    def _write(self, partition, rows=(), deletes=()):
+        conn = self.connection(partition)
+        try:
+            if rows:
+                conn.executemany("INSERT OR REPLACE INTO open_sessions VALUES (?, ?, ?)", rows)
+            if deletes:
+                conn.executemany("DELETE FROM open_sessions WHERE appointment_id = ?", [(d,) for d in deletes])
+            conn.commit()
+            self.rows[partition] = conn.execute("SELECT COUNT(*) FROM open_sessions").fetchone()[0]
+        except sqlite3.Error as e:
+            conn.rollback()
+            # Raised as a failed flush, which the segment writer retries
+            raise OSError(f"Could not write session state of partition {partition}: {e}") from e
+
+    def _delete(self, keys):
+        by_partition = {}
+        for partition, appointment_id in keys:
+            by_partition.setdefault(partition, []).append(appointment_id)
+        for partition, deletes in by_partition.items():
+            self._write(partition, deletes=deletes)
+
+    def spill(self, count=None, partitions=None):
+        """Move the count least recently updated sessions (default: all, or all of partitions) to sqlite"""
+        if partitions is not None:
+            spilled = [(appointment_id, entry) for appointment_id, entry in self.memory.items()
+                       if entry[1]["partition"] in partitions]
+        else:
+            count = len(self.memory) if count is None else min(count, len(self.memory))
+            spilled = list(itertools.islice(self.memory.items(), count))
+        by_partition = {}
+        for appointment_id, (last_update, state) in spilled:
+            by_partition.setdefault(state["partition"], []).append((appointment_id, last_update, json.dumps(state)))
+        for partition, rows in by_partition.items():
+            self._write(partition, rows)
+        for appointment_id, _ in spilled:
+            del self.memory[appointment_id]
+            self.dirty.discard(appointment_id)
+
+    def expire(self, cutoff):
+        """Remove and return (appointment_id, state) for sessions last updated before cutoff"""
+        expired = []
+        while self.memory:
+            appointment_id, (last_update, state) = next(iter(self.memory.items()))
+            if last_update >= cutoff:
+                break
+            self.remove(appointment_id)
+            expired.append((appointment_id, state))
+        # Spilled sessions, and snapshots of the sessions just taken from memory, have rows too
+        taken = {appointment_id for appointment_id, _ in expired}
+        for partition, conn in self.connections.items():
+            if not self.rows[partition]:
+                continue
+            for appointment_id, state in conn.execute(
+                    "SELECT appointment_id, state FROM open_sessions WHERE last_update < ?", (cutoff,)).fetchall():
+                key = (partition, appointment_id)
+                if appointment_id in self.memory or appointment_id in taken or \
+                        key in self.released or key in self.flushed_releases:
+                    continue
+                expired.append((appointment_id, json.loads(state)))
+        return expired
+
+    def checkpoint(self):
+        """Before a flush: snapshot the sessions changed in memory, so the flushed offsets never run ahead of them"""
+        by_partition = {}
+        for appointment_id in self.dirty:
+            last_update, state = self.memory[appointment_id]
+            by_partition.setdefault(state["partition"], []).append((appointment_id, last_update, json.dumps(state)))
+        for partition, rows in by_partition.items():
+            self._write(partition, rows)
+        self.dirty = set()
+
+    def flushed(self):
+        """
+        After a flush: delete the rows released before the previous flush. One flush later than
+        their session records, so the events that closed them are on disk too.
+        """
+        try:
+            self._delete(self.flushed_releases)
+        except OSError as e:
+            print(f"{e}; retrying after the next flush")
+            self.released |= self.flushed_releases
+        self.flushed_releases, self.released = self.released, set()
+
+    def close(self):
+        """After the final flush: spill every open session for the next run; returns how many are kept"""
+        self.spill()
+        self._delete(self.flushed_releases)
+        self.flushed_releases = set()
+        kept = sum(self.rows.values()) - len(self.released)
+        for conn in self.connections.values():
+            conn.close()
+        self.connections, self.rows = {}, {}
+        return kept
+
+def minutes_between(start, end):
+    if not start or not end:
+        return None
+    delta = datetime.strptime(end, TIMESTAMP_FORMAT) - datetime.strptime(start, TIMESTAMP_FORMAT)
+    return round(delta.total_seconds() / 60, 2)
+
+class Sessionizer:
+    """Group events by appointment_id into session records, emitted on close or timeout"""
+
+    def __init__(self, store, timeout_seconds=DEFAULT_SESSION_TIMEOUT_SECONDS):
+        self.store = store
+        self.timeout_seconds = timeout_seconds
+        # Recently closed appointments, so late events don't reopen a session (bounded like the store)
+        self.closed = OrderedDict()
+        self.partitions = {}  # appointment_id -> event partition, for emitted sessions until released
+        self.late_events = 0
+        self.replayed_events = 0
+        self.sessions_emitted = 0
+
+    def process(self, event, now=None, partition=0, offset=None):
+        """
+        Apply one validated event from an event partition offset; returns the session record if
+        the event closes its session. Call before writing the event, then release() the session.
+        """
+        now = time.time() if now is None else now
+        appointment_id = event["appointment_id"]
+        if appointment_id in self.closed:
+            self.late_events += 1
+            return None
+
+        state = self.store.get(appointment_id, partition) or {"appointment_id": appointment_id, "event_count": 0,
+                                                              "technical_issues": [], "partition": partition}
+        if offset is not None and state.get("offset") is not None and offset <= state["offset"]:
+            self.replayed_events += 1  # Already in the snapshot
+            return None
+        state["offset"] = offset
+        self._update(state, event)
+        if event["event_type"] in CLOSING_EVENTS:
+            self.store.remove(appointment_id, partition)
+            return self._emit(state, closed_by=event["event_type"])
+        self.store.put(appointment_id, state, now)
+        return None
+
+    def release(self, session):
+        """The record of a closed session has been written; its state can go after the next flushes"""
+        self.store.release(session["appointment_id"], self.partitions.pop(session["appointment_id"], 0))
+
+    def _update(self, state, event):
+        event_type, timestamp = event["event_type"], event["timestamp"]
+        details = event.get("details") or {}
+        state["event_count"] += 1
+        state["first_event_at"] = min(state.get("first_event_at") or timestamp, timestamp)
+        state["last_event_at"] = max(state.get("last_event_at") or timestamp, timestamp)
+        for field in ("patient_id", "provider_id"):
+            if event.get(field) is not None:
+                state[field] = event[field]
+
+        if event_type in SESSION_TIMESTAMPS:
+            state[SESSION_TIMESTAMPS[event_type]] = timestamp
+        if event_type == "appointment_scheduled":
+            state["appointment_type"] = details.get("appointment_type")
+        elif event_type == "patient_login":
+            state["patient_device_type"] = details.get("device_type")
+        elif event_type == "session_started":
+            state["connection_quality"] = details.get("connection_quality")
+            state["reported_wait_minutes"] = details.get("wait_time_minutes")
+        elif event_type == "technical_issue":
+            state["technical_issues"].append({"timestamp": timestamp, "issue_type": details.get("issue_type"),
+                                              "resolved": details.get("resolved")})
+        elif event_type == "session_ended":
+            state["reported_duration_minutes"] = details.get("duration_minutes")
+            state["ended_normally"] = details.get("ended_normally")
+
+    def _emit(self, state, closed_by):
+        self.closed[state["appointment_id"]] = True
+        self.partitions[state["appointment_id"]] = state.get("partition", 0)
+        if len(self.closed) > self.store.max_sessions:
+            self.closed.popitem(last=False)
+        self.sessions_emitted += 1
+        return session_record(state, closed_by)
+
+    def expire(self, now=None):
+        """Session records for every session without events for timeout_seconds, each released once written"""
+        now = time.time() if now is None else now
+        for _, state in self.store.expire(now - self.timeout_seconds):
+            session = self._emit(state, closed_by="timeout")
+            yield session
+            self.release(session)
+
+    def assign(self, partitions):
+        self.store.assign(partitions)
+
+    # Segment writer flush hooks
+    def checkpoint(self):
+        self.store.checkpoint()
+
+    def flushed(self, pending_types=()):
+        # Records of released sessions may still be buffered after a partial (non-durable) flush
+        if "session" not in pending_types:
+            self.store.flushed()
+
+    def close(self):
+        """After the final flush: keep open sessions in the state store for the next run"""
+        still_open = self.store.close()
+        print(f"Sessionizer emitted {self.sessions_emitted} sessions; {still_open} still open "
+              f"({self.late_events} late events ignored, {self.replayed_events} replayed events skipped)")
+
+# Session facts from a session state
+def session_outcome(state):
+    if state.get("session_ended_at"):
+        return "completed"
+    if state.get("cancelled_at"):
+        return "cancelled"
+    if state.get("rescheduled_at"):
+        return "rescheduled"
+    if state.get("session_started_at"):
+        return "incomplete"  # Started, but the end never arrived
+    return "no_session"
+
+def session_record(state, closed_by):
+    issues = state["technical_issues"]
+    return {
+        "appointment_id": state["appointment_id"],
+        "patient_id": state.get("patient_id"),
+        "provider_id": state.get("provider_id"),
+        "appointment_type": state.get("appointment_type"),
+        "outcome": session_outcome(state),
+        "closed_by": closed_by,
+        "event_count": state["event_count"],
+        "first_event_at": state.get("first_event_at"),
+        "last_event_at": state.get("last_event_at"),
+        "patient_login_at": state.get("patient_login_at"),
+        "provider_login_at": state.get("provider_login_at"),
+        "session_started_at": state.get("session_started_at"),
+        "session_ended_at": state.get("session_ended_at"),
+        # Login to session start, and session start to end, from the event timestamps
+        "actual_wait_minutes": minutes_between(state.get("patient_login_at"), state.get("session_started_at")),
+        "actual_session_minutes": minutes_between(state.get("session_started_at"), state.get("session_ended_at")),
+        "reported_wait_minutes": state.get("reported_wait_minutes"),
+        "reported_duration_minutes": state.get("reported_duration_minutes"),
+        "connection_quality": state.get("connection_quality"),
+        "patient_device_type": state.get("patient_device_type"),
+        "technical_issue_count": len(issues),
+        "unresolved_issue_count": sum(1 for issue in issues if not issue["resolved"]),
+        "technical_issue_types": sorted({issue["issue_type"] for issue in issues if issue["issue_type"]}),
+        "ended_by_technical_issue": bool(issues) and state.get("ended_normally") is False
+    }
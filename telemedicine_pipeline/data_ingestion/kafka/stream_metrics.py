@@ -0,0 +1,258 @@
+import os
+import sys
+import time
+import numpy as np
+
+from message_codecs import header_value
+
+# Producer and consumer latency metrics
+#
+# SendMetrics is attached to every send future: the delivery callback records the time from
+# send() to broker acknowledgement and the serialized key + value size from the record
+# metadata, so byte counts don't require serializing messages twice.
+#
+# Latencies go into a LatencyHistogram (HDR-style log-linear buckets) rather than a list, so
+# memory stays constant however many messages are sent and histograms from several worker
+# processes can simply be added together.
+#
+# Every message also carries its produce time in the produced_at_us header (microseconds since
+# the epoch); the consumer subtracts it from the receive time for end-to-end latency.
+#
+# ConsumerMetrics counts what a consumer received and rejected between exports and records rates,
+# per-partition lag (end offset minus committed offset) and write-buffer backpressure with them.
+
+LATENCY_PERCENTILES = [50, 95, 99]
+PRODUCED_AT_HEADER = "produced_at_us"
+
+# Monitoring metrics store (monitoring/scripts/monitoring_system.py record_metric)
+MONITORING_SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'monitoring', 'scripts')
+
+class LatencyHistogram:
+    """
+    Log-linear latency histogram in microseconds. Values below 2**sub_bucket_bits are exact;
+    above that every power of two is split into 2**(sub_bucket_bits - 1) buckets, so recorded
+    values are accurate to within 1 / 2**(sub_bucket_bits - 1) (under 2% with the default 7 bits).
+    Values above highest_trackable_us are counted in the last bucket.
+    """
+
+    def __init__(self, sub_bucket_bits=7, highest_trackable_us=3600 * 1000000):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.highest_trackable_us = highest_trackable_us
+        self.counts = np.zeros(self._index(np.array([highest_trackable_us]))[0] + 1, dtype=np.int64)
+        self.max_us = 0
+
+    def _index(self, values):
+        bits = self.sub_bucket_bits
+        values = np.minimum(np.maximum(values, 0), self.highest_trackable_us).astype(np.int64)
+        # frexp's exponent is the bit length; shift brings each value below 2**bits
+        shift = np.maximum(np.frexp(values.astype(np.float64))[1].astype(np.int64) - bits, 0)
+        top = values >> shift
+        half = 1 << (bits - 1)
+        return np.where(shift == 0, values, (1 << bits) + (shift - 1) * half + (top - half))
+
+    def _index_one(self, value):
+        """_index for a single int, without numpy overhead (called once per delivery callback)"""
+        bits = self.sub_bucket_bits
+        value = min(max(value, 0), self.highest_trackable_us)
+        shift = value.bit_length() - bits
+        if shift <= 0:
+            return value
+        half = 1 << (bits - 1)
+        return (1 << bits) + (shift - 1) * half + ((value >> shift) - half)
+
+    def _highest_equivalent(self, index):
+        bits = self.sub_bucket_bits
+        if index < 1 << bits:
+            return index
+        half = 1 << (bits - 1)
+        shift, offset = divmod(index - (1 << bits), half)
+        return ((half + offset + 1) << (shift + 1)) - 1
+
+    @property
+    def count(self):
+        return int(self.counts.sum())
+
+    def record(self, seconds):
+        """Record one latency in seconds"""
+        microseconds = int(seconds * 1000000)
+        self.counts[self._index_one(microseconds)] += 1
+        self.max_us = max(self.max_us, microseconds)
+
+    def record_many(self, seconds):
+        """Record an array of latencies in seconds"""
+        microseconds = (np.asarray(seconds, dtype=np.float64) * 1000000).astype(np.int64)
+        if len(microseconds):
+            np.add.at(self.counts, self._index(microseconds), 1)
+            self.max_us = max(self.max_us, int(microseconds.max()))
+
+    def merge(self, other):
+        """Add another histogram's counts to this one (same bucket layout)"""
+        self.counts += other.counts
+        self.max_us = max(self.max_us, other.max_us)
+        return self
+
+    def reset(self):
+        self.counts[:] = 0
+        self.max_us = 0
+
+    def percentile(self, percentile):
+        """Latency in milliseconds at the percentile (highest value in its bucket), or None if empty"""
+        total = self.count
+        if total == 0:
+            return None
+        rank = max(1, int(np.ceil(percentile / 100 * total)))
+        index = int(np.searchsorted(np.cumsum(self.counts), rank))
+        return min(self._highest_equivalent(index), self.max_us) / 1000
+
+    def max(self):
+        return self.max_us / 1000 if self.count else None
+
+class SendMetrics:
+    """Collect delivery latency, bytes and errors from KafkaProducer send futures"""
+
+    def __init__(self):
+        self.histogram = LatencyHistogram()  # Seconds from send() to acknowledgement
+        self.bytes_sent = 0
+        self.errors = 0
+
+    def track(self, future):
+        """Attach delivery callbacks to a send future; call right after producer.send()"""
+        sent_at = time.perf_counter()
+        future.add_callback(self._on_delivery, sent_at)
+        future.add_errback(self._on_error)
+        return future
+
+    def _on_delivery(self, sent_at, metadata):
+        # Callbacks run on the producer's I/O thread, the only writer while sends are in flight
+        self.histogram.record(time.perf_counter() - sent_at)
+        self.bytes_sent += max(metadata.serialized_key_size, 0) + max(metadata.serialized_value_size, 0)
+
+    def _on_error(self, exception):
+        self.errors += 1
+
+    def summary(self, messages, elapsed):
+        """Throughput and latency summary for messages sent over elapsed seconds"""
+        return summarize(messages, self.bytes_sent, self.errors, elapsed, self.histogram)
+
+def summarize(messages, bytes_sent, errors, elapsed, histogram):
+    """Build a metrics dict from counts and a LatencyHistogram of delivery latencies"""
+    summary = {
+        "messages": messages,
+        "bytes": bytes_sent,
+        "errors": errors,
+        "elapsed_seconds": elapsed,
+        "messages_per_second": messages / elapsed if elapsed > 0 else 0.0,
+        "bytes_per_second": bytes_sent / elapsed if elapsed > 0 else 0.0,
+        "acknowledged": histogram.count
+    }
+    for percentile in LATENCY_PERCENTILES:
+        summary[f"latency_p{percentile}_ms"] = histogram.percentile(percentile)
+    summary["latency_max_ms"] = histogram.max()
+    return summary
+
+def aggregate_summaries(worker_summaries, worker_histograms):
+    """Combine per-worker summaries; workers run concurrently, so elapsed is the slowest worker's"""
+    histogram = LatencyHistogram()
+    for worker_histogram in worker_histograms:
+        histogram.merge(worker_histogram)
+    return summarize(
+        sum(s["messages"] for s in worker_summaries),
+        sum(s["bytes"] for s in worker_summaries),
+        sum(s["errors"] for s in worker_summaries),
+        max((s["elapsed_seconds"] for s in worker_summaries), default=0.0),
+        histogram
+    )
+
+def format_latency(histogram_or_summary):
+    """Percentiles as "p50 1.2ms, p95 3.4ms, p99 5.6ms" from a LatencyHistogram or a summary dict"""
+    if isinstance(histogram_or_summary, LatencyHistogram):
+        values = {p: histogram_or_summary.percentile(p) for p in LATENCY_PERCENTILES}
+    else:
+        values = {p: histogram_or_summary[f"latency_p{p}_ms"] for p in LATENCY_PERCENTILES}
+    return ", ".join(f"p{p} {v:.1f}ms" if v is not None else f"p{p} n/a" for p, v in values.items())
+
+def format_summary(label, summary):
+    """One report line: rates, latency percentiles and errors"""
+    return (f"{label}: {summary['messages']} messages in {summary['elapsed_seconds']:.2f}s, "
+            f"{summary['messages_per_second']:,.0f} msg/s, {summary['bytes_per_second'] / 1e6:,.2f} MB/s, "
+            f"latency {format_latency(summary)}, {summary['errors']} errors")
+
+# Produce-time stamp for end-to-end latency
+def produced_at_header():
+    """Message header carrying the current time in microseconds since the epoch"""
+    return (PRODUCED_AT_HEADER, str(time.time_ns() // 1000).encode("ascii"))
+
+def end_to_end_latency(message, received_at=None):
+    """Seconds from produce to receipt for a consumed message, or None if it carries no produce time"""
+    produced_at = header_value(message.headers, PRODUCED_AT_HEADER)
+    if produced_at is None:
+        return None
+    received_at = time.time() if received_at is None else received_at
+    return received_at - int(produced_at) / 1000000
+
+# Export to the monitoring metrics store
+def load_record_metric(what):
+    """monitoring_system.record_metric, or None (with a message naming what is not exported)"""
+    try:
+        if MONITORING_SCRIPTS_DIR not in sys.path:
+            sys.path.append(MONITORING_SCRIPTS_DIR)
+        from monitoring_system import record_metric
+        return record_metric
+    except Exception as e:
+        print(f"Could not export {what}, monitoring metrics store unavailable: {e}")
+        return None
+
+def export_latency_metrics(name, histogram):
+    """Record p50/p95/p99 as <name>_latency_p50_ms etc. with monitoring_system.record_metric"""
+    if histogram.count == 0:
+        return
+    record_metric = load_record_metric("latency metrics")
+    if record_metric is None:
+        return
+    for percentile in LATENCY_PERCENTILES:
+        record_metric(f"{name}_latency_p{percentile}_ms", round(histogram.percentile(percentile), 3))
+    print(f"Exported {name} latency ({format_latency(histogram)}) to the monitoring metrics store")
+
+class ConsumerMetrics:
+    """
+    Consumer counters for one export interval, recorded as <prefix>_messages_per_second,
+    _bytes_per_second, _validation_failure_rate (% of messages rejected), _lag, _buffered_bytes
+    and _paused_seconds, plus kafka_consumer_lag_<topic>_<partition> for every assigned partition
+    """
+
+    def __init__(self, prefix="kafka_consumer"):
+        self.prefix = prefix
+        self.reset()
+
+    def reset(self):
+        self.messages = 0
+        self.bytes = 0
+        self.rejected = 0
+        self.paused_seconds = 0.0
+        self.started_at = time.monotonic()
+
+    def record_batch(self, messages, received_bytes, rejected):
+        self.messages += messages
+        self.bytes += received_bytes
+        self.rejected += rejected
+
+    def export(self, partition_lag, buffered_bytes):
+        """partition_lag: {(topic, partition): lag}; resets the interval counters"""
+        elapsed = time.monotonic() - self.started_at
+        record_metric = load_record_metric("consumer metrics")
+        if record_metric is not None:
+            values = {
+                "messages_per_second": self.messages / elapsed if elapsed > 0 else 0.0,
+                "bytes_per_second": self.bytes / elapsed if elapsed > 0 else 0.0,
+                "validation_failure_rate": 100 * self.rejected / self.messages if self.messages else 0.0,
+                "lag": sum(partition_lag.values()),
+                "buffered_bytes": buffered_bytes,
+                "paused_seconds": self.paused_seconds
+            }
+            for name, value in values.items():
+                record_metric(f"{self.prefix}_{name}", round(value, 3))
+            for (topic, partition), lag in sorted(partition_lag.items()):
+                record_metric(f"kafka_consumer_lag_{topic.replace('-', '_')}_{partition}", lag)
+            print(f"Exported {self.prefix} metrics ({values['messages_per_second']:,.0f} msg/s, "
+                  f"lag {values['lag']}) to the monitoring metrics store")
+        self.reset()
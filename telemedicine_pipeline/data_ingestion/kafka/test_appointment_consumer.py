@@ -0,0 +1,17 @@
+import appointment_consumer
+from appointment_consumer import parse_args, consume_partitioned
+
+class NoPartitionsConsumer:
+    """Metadata consumer for a cluster where the topics do not exist"""
+    def partitions_for_topic(self, topic):
+        return None
+
+    def close(self, autocommit=True):
+        pass
+
+def test_no_partitions_means_no_worker_pool(monkeypatch, tmp_path, capsys):
+    monkeypatch.setattr(appointment_consumer, "create_kafka_consumer", lambda *args, **kwargs: NoPartitionsConsumer())
+    args = parse_args(["--workers", "2", "--output-dir", str(tmp_path)])
+
+    assert consume_partitioned(2, {}, args) is None
+    assert "No partitions found" in capsys.readouterr().out
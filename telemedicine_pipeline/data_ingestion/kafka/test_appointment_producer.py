@@ -0,0 +1,35 @@
+import json
+
+import pytest
+
+import appointment_producer
+from appointment_producer import produce_partitioned
+from local_broker import LocalBroker
+
+def test_partitioned_producer_splits_rate_and_burst_across_workers(appointments_df, tmp_path, monkeypatch):
+    limits_file = tmp_path / "limits.ndjson"
+
+    class RecordingRateLimiter(appointment_producer.RateLimiter):
+        def __init__(self, rate, burst=None):
+            super().__init__(rate, burst)
+            with open(limits_file, "a") as f:
+                f.write(json.dumps({"rate": rate, "burst": burst}) + "\n")
+
+    # Worker processes are forked, so they inherit the patched limiter
+    monkeypatch.setattr(appointment_producer, "RateLimiter", RecordingRateLimiter)
+    log_dir = str(tmp_path / "broker")
+    report = produce_partitioned(appointments_df, 2, {"local_broker_dir": log_dir}, rate=100000, burst=500)
+
+    limits = [json.loads(line) for line in limits_file.read_text().splitlines()]
+    assert limits == [{"rate": 50000.0, "burst": 250.0}] * 2
+    broker = LocalBroker(log_dir)
+    appointments = sum(broker.end_offset(appointment_producer.APPOINTMENT_TOPIC, p)
+                       for p in broker.partitions_for_topic(appointment_producer.APPOINTMENT_TOPIC))
+    assert appointments == len(appointments_df)
+    assert report["total"]["errors"] == 0
+
+@pytest.mark.parametrize("mode", ["simulate", "replay"])
+def test_workers_are_rejected_outside_throughput_mode(mode):
+    with pytest.raises(SystemExit):
+        appointment_producer.parse_args(["--mode", mode, "--workers", "4"])
+    assert appointment_producer.parse_args(["--mode", "throughput", "--workers", "4"]).workers == 4
@@ -0,0 +1,49 @@
+import local_broker
+from local_broker import LocalBroker, LocalProducer, LocalConsumer
+
+TOPIC = "telemedicine-events"
+
+def group_consumer(log_dir, group_id="test-group"):
+    """A subscribed consumer on its own LocalBroker instance, as a separate process would have"""
+    return LocalConsumer(TOPIC, broker=LocalBroker(log_dir, num_partitions=4), group_id=group_id,
+                         auto_offset_reset="earliest")
+
+def test_group_members_on_separate_brokers_split_partitions(tmp_path):
+    first, second = group_consumer(str(tmp_path)), group_consumer(str(tmp_path))
+    first_partitions, second_partitions = first.assignment(), second.assignment()
+
+    assert len(first_partitions) == len(second_partitions) == 2
+    assert not first_partitions & second_partitions
+    assert {tp.partition for tp in first_partitions | second_partitions} == {0, 1, 2, 3}
+
+    # Leaving hands the partitions back to the rest of the group
+    second.close()
+    assert {tp.partition for tp in first.assignment()} == {0, 1, 2, 3}
+
+def test_silent_member_is_dropped_after_session_timeout(tmp_path, monkeypatch):
+    crashed = group_consumer(str(tmp_path))
+    assert len(crashed.assignment()) == 4
+
+    monkeypatch.setattr(local_broker, "LOCAL_SESSION_TIMEOUT_SECONDS", 0)
+    survivor = group_consumer(str(tmp_path))
+    # crashed never polls again; the survivor's heartbeat expires it
+    assert {tp.partition for tp in survivor.assignment()} == {0, 1, 2, 3}
+
+def test_assign_leaves_the_group(tmp_path):
+    manual, subscribed = group_consumer(str(tmp_path)), group_consumer(str(tmp_path))
+    manual.assign([local_broker.TopicPartition(TOPIC, 0)])
+    assert len(subscribed.assignment()) == 4
+
+def test_messages_and_offsets_are_shared_across_brokers(tmp_path):
+    producer = LocalProducer(LocalBroker(str(tmp_path), num_partitions=4))
+    for i in range(20):
+        producer.send(TOPIC, value=str(i).encode(), key=f"key-{i}".encode())
+    producer.flush()
+
+    consumer = group_consumer(str(tmp_path))
+    values = [record.value for records in consumer.poll(max_records=100).values() for record in records]
+    assert sorted(values, key=int) == [str(i).encode() for i in range(20)]
+    consumer.close()
+
+    restarted = group_consumer(str(tmp_path))
+    assert restarted.poll() == {}
@@ -0,0 +1,104 @@
+import json
+import math
+
+import numpy as np
+import pytest
+
+import generate_data
+import event_stream
+from appointment_consumer import dead_letter_record
+from appointment_producer import iter_appointment_events, appointment_records
+from message_codecs import MAGIC_BYTE, ENUM_ESCAPE, APPOINTMENT_SCHEMA, EVENT_SCHEMA, JsonCodec, BinaryCodec, \
+    SchemaRegistry, RawMessage, codec_headers, decode_message, raw_payload, decode_raw_payload
+
+@pytest.fixture
+def binary_codec(tmp_path):
+    return BinaryCodec(SchemaRegistry(str(tmp_path / "schema_registry.json")))
+
+def schema_enums(fields):
+    """{field name: symbols} for every enum in fields, including variant fields"""
+    enums = {}
+    for field in fields:
+        if field["type"] == "enum":
+            enums.setdefault(field["name"], set()).update(field["symbols"])
+        elif field["type"] == "variant":
+            for name, symbols in schema_enums([f for v in field["variants"].values() for f in v]).items():
+                enums.setdefault(name, set()).update(symbols)
+    return enums
+
+def is_missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+def same_values(a, b):
+    """Equality where NaN and None both mean missing (pandas rows use NaN, binary nulls decode as None)"""
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(same_values(a[k], b[k]) for k in a)
+    if is_missing(a) and is_missing(b):
+        return True
+    return a == b
+
+@pytest.mark.parametrize("field, symbols", [
+    ("appointment_type", generate_data.APPOINTMENT_TYPES),
+    ("status", generate_data.APPOINTMENT_STATUSES),
+    ("device_type", generate_data.DEVICE_TYPES),
+    ("operating_system", generate_data.OPERATING_SYSTEMS),
+    ("browser", generate_data.BROWSERS),
+    ("connection_quality", generate_data.CONNECTION_QUALITIES),
+    ("technical_issue_type", generate_data.TECHNICAL_ISSUE_TYPES),
+])
+def test_appointment_enums_cover_every_generator_value(field, symbols, binary_codec):
+    assert set(symbols) <= schema_enums(APPOINTMENT_SCHEMA["fields"])[field]
+    for symbol in symbols:
+        data = binary_codec.encode("telemedicine-appointments", {field: symbol})
+        # One byte per enum value, never the escaped string form
+        assert data[0] == MAGIC_BYTE and ENUM_ESCAPE not in data[5:]
+        assert binary_codec.decode("telemedicine-appointments", data) == {field: symbol}
+
+def test_event_enums_cover_every_generator_value():
+    enums = schema_enums(EVENT_SCHEMA["fields"])
+    assert set(event_stream.EVENT_REASONS) <= enums["reason"]
+    assert set(event_stream.ISSUE_SEVERITIES) <= enums["severity"]
+    assert set(generate_data.TECHNICAL_ISSUE_TYPES) <= enums["issue_type"]
+    assert set(event_stream.PROVIDER_DEVICE_TYPES) <= enums["device_type"]
+    assert set(event_stream.PROVIDER_OPERATING_SYSTEMS) <= enums["operating_system"]
+    assert set(event_stream.PROVIDER_BROWSERS) <= enums["browser"]
+
+def test_generated_messages_round_trip_in_binary(appointments_df, binary_codec):
+    sequences = event_stream.build_event_sequences(appointments_df, np.random.default_rng(3))
+    encoded = iter_appointment_events(appointments_df, binary_codec, rng=np.random.default_rng(3))
+    for appointment, (_, encoded_events), events in zip(appointment_records(appointments_df), encoded, sequences):
+        data = binary_codec.encode("telemedicine-appointments", appointment)
+        assert data[0] == MAGIC_BYTE
+        assert same_values(binary_codec.decode("telemedicine-appointments", data), appointment)
+        for (event_type, timestamp, data), event in zip(encoded_events, events, strict=True):
+            assert data[0] == MAGIC_BYTE
+            assert (event_type, timestamp) == (event["event_type"], event["timestamp"])
+            assert same_values(binary_codec.decode("telemedicine-events", data), event)
+
+def test_pre_encoded_json_events_decode_to_the_generated_events(appointments_df):
+    sequences = event_stream.build_event_sequences(appointments_df, np.random.default_rng(4))
+    encoded = iter_appointment_events(appointments_df, JsonCodec(), rng=np.random.default_rng(4))
+    for (_, encoded_events), events in zip(encoded, sequences, strict=True):
+        for (event_type, timestamp, data), event in zip(encoded_events, events, strict=True):
+            assert (event_type, timestamp) == (event["event_type"], event["timestamp"])
+            assert JsonCodec().decode("telemedicine-events", data) == event
+
+def test_unknown_enum_value_is_escaped(binary_codec):
+    data = binary_codec.encode("telemedicine-appointments", {"browser": "Opera"})
+    assert binary_codec.decode("telemedicine-appointments", data) == {"browser": "Opera"}
+
+def test_raw_payload_of_undecodable_message_is_replayable(binary_codec):
+    codecs = {"json": JsonCodec(), "binary": binary_codec}
+    value = {"appointment_id": "0b4c3b8e-4d43-4a8c-9a43-5f1d2f8c1e7a", "browser": "Chrome"}
+    message = RawMessage("telemedicine-appointments", binary_codec.encode("telemedicine-appointments", value),
+                         codec_headers(binary_codec))
+    message.key, message.partition, message.offset = value["appointment_id"], 0, 7
+
+    # As the consumer would dead-letter it (say, before the binary codec was configured)
+    with pytest.raises(ValueError):
+        decode_message(message, {"json": JsonCodec()})
+    record = json.loads(json.dumps(dead_letter_record(message, "appointment", "decode", ["Undecodable"],
+                                                      raw_payload(message))))
+
+    assert record["original_data"]["encoding"] == "base64"
+    assert decode_raw_payload(record["topic"], record["original_data"], codecs) == value
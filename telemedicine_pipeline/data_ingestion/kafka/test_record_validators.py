@@ -0,0 +1,69 @@
+from datetime import datetime
+
+import pytest
+
+from record_validators import APPOINTMENT_VALIDATOR, EVENT_VALIDATOR
+
+APPOINTMENT = {"appointment_id": "a1", "provider_id": "PROV0001", "patient_id": "PAT000001",
+               "appointment_date": "2024-01-15", "scheduled_time": "10:00:00",
+               "appointment_type": "Follow-up", "status": "Completed",
+               "wait_time_minutes": 5.0, "duration_minutes": 20.0}
+EVENT = {"event_type": "patient_login", "appointment_id": "a1", "timestamp": "2024-01-15 09:55:00"}
+
+EVENT_CASES = [
+    {},
+    {"timestamp": "now"},
+    {"timestamp": "today"},
+    {"timestamp": "NOW"},
+    {"timestamp": "2024-01-15T09:55:00"},
+    {"timestamp": "2024-02-30 10:00:00"},
+    {"timestamp": "2024-2-3 9:05:00"},  # Not zero-padded, but strptime accepts it
+    {"timestamp": " 2024-01-15 09:55:00"},
+    {"timestamp": "2024-01-15 24:00:00"},
+    {"timestamp": ""},
+    {"timestamp": "2024-01-15 09:55:00\n2024-01-15 09:56:00"},
+    {"timestamp": 1705312500},
+    {"timestamp": datetime(2024, 1, 15, 9, 55)},
+    {"timestamp": ["2024-01-15 09:55:00"]},
+    {"timestamp": None},
+    {"event_type": ["patient_login"]},
+    {"event_type": {"type": "patient_login"}},
+    {"event_type": "session_paused"},
+    {"event_type": None},
+]
+
+APPOINTMENT_CASES = [
+    {},
+    {"status": ["Completed"]},
+    {"status": {"value": "Completed"}},
+    {"status": "completed"},
+    {"status": "Completed", "wait_time_minutes": None},
+    {"status": "Cancelled", "wait_time_minutes": None, "duration_minutes": None},
+    {"appointment_id": None},
+]
+
+@pytest.mark.parametrize("change", EVENT_CASES)
+def test_event_batch_matches_single_record(change):
+    record = dict(EVENT, **change)
+    # Alone and mixed in with valid records, in either position
+    for batch in ([record], [EVENT, record], [record, EVENT]):
+        assert EVENT_VALIDATOR.validate_batch(batch) == [EVENT_VALIDATOR.validate(r) for r in batch]
+
+@pytest.mark.parametrize("change", APPOINTMENT_CASES)
+def test_appointment_batch_matches_single_record(change):
+    record = dict(APPOINTMENT, **change)
+    for batch in ([record], [APPOINTMENT, record], [record, APPOINTMENT]):
+        assert APPOINTMENT_VALIDATOR.validate_batch(batch) == [APPOINTMENT_VALIDATOR.validate(r) for r in batch]
+
+def test_relative_timestamps_are_rejected():
+    assert EVENT_VALIDATOR.validate_batch([dict(EVENT, timestamp="now"), dict(EVENT, timestamp="today")]) == \
+        [["Invalid timestamp format: now"], ["Invalid timestamp format: today"]]
+
+def test_unhashable_values_are_reported():
+    assert APPOINTMENT_VALIDATOR.validate(dict(APPOINTMENT, status=["Completed"])) == \
+        ["Invalid status: ['Completed']"]
+
+def test_records_that_are_not_objects():
+    batch = [EVENT, ["not", "an", "event"], "event", None]
+    assert EVENT_VALIDATOR.validate_batch(batch) == [EVENT_VALIDATOR.validate(r) for r in batch]
+    assert EVENT_VALIDATOR.validate_batch(batch)[1] == ["Invalid event: expected an object, got list"]
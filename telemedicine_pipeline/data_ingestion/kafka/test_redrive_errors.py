@@ -0,0 +1,81 @@
+import os
+
+from redrive_errors import redrive_errors, load_manifest
+from segment_writer import SegmentWriter, list_segments, read_segment
+
+APPOINTMENT = {"appointment_id": "a1", "provider_id": "PROV0001", "patient_id": "PAT000001",
+               "appointment_date": "2024-01-15", "scheduled_time": "10:00:00",
+               "appointment_type": "Follow-up", "status": "Completed",
+               "wait_time_minutes": 5.0, "duration_minutes": 20.0}
+
+def error_record(appointment, stage="validation", attempts=0):
+    return {"data_type": "appointment", "data_id": appointment["appointment_id"], "stage": stage,
+            "errors": ["Invalid status"], "original_data": appointment, "topic": "telemedicine-appointments",
+            "partition": 0, "offset": 0, "failed_at": "2024-01-15 10:00:00", "redrive_attempts": attempts}
+
+def write_error_segments(base_dir, *segments):
+    """One error segment per list of error records"""
+    writer = SegmentWriter(str(base_dir))
+    for records in segments:
+        for record in records:
+            writer.write("error", record)
+        writer.flush_all()
+
+def records(base_dir, data_type):
+    return [record for path in list_segments(str(base_dir), data_type)
+            for record in read_segment(path, nested_fields=("errors", "original_data"))]
+
+def test_records_are_replayed_retried_or_quarantined(tmp_path):
+    fixed = error_record(APPOINTMENT)
+    still_bad = error_record(dict(APPOINTMENT, appointment_id="a2", status="Done"), attempts=1)
+    given_up = error_record(dict(APPOINTMENT, appointment_id="a3", status="Done"), attempts=2)
+    write_error_segments(tmp_path, [fixed, still_bad, given_up])
+
+    summary = redrive_errors(str(tmp_path), max_attempts=3)
+    assert (summary["passed"], summary["failed"], summary["quarantined"]) == (1, 1, 1)
+    assert [r["appointment_id"] for r in records(tmp_path, "appointment")] == ["a1"]
+    assert [(r["data_id"], r["redrive_attempts"]) for r in records(tmp_path, "quarantine")] == [("a3", 3)]
+
+    # Only the new error segment is left to re-drive
+    assert redrive_errors(str(tmp_path), max_attempts=3)["records"] == 1
+    assert [r["data_id"] for r in records(tmp_path, "quarantine")] == ["a3", "a2"]
+
+def test_each_segment_is_recorded_once_written(tmp_path, monkeypatch):
+    write_error_segments(tmp_path, [error_record(APPOINTMENT)],
+                         [error_record(dict(APPOINTMENT, appointment_id="a2"))])
+    first, second = list_segments(str(tmp_path), "error")
+
+    def crash_on_second(path, **kwargs):
+        if path == second:
+            raise KeyboardInterrupt
+        return read_segment(path, **kwargs)
+    monkeypatch.setattr("redrive_errors.read_segment", crash_on_second)
+    try:
+        redrive_errors(str(tmp_path))
+    except KeyboardInterrupt:
+        pass
+    assert load_manifest(str(tmp_path)) == ({os.path.relpath(first, str(tmp_path))}, set())
+
+    monkeypatch.undo()
+    assert redrive_errors(str(tmp_path))["segments"] == 1
+    assert sorted(r["appointment_id"] for r in records(tmp_path, "appointment")) == ["a1", "a2"]
+
+def test_warehouse_failures_wait_for_a_topic_redrive(tmp_path):
+    sent = []
+    class Producer:
+        def send(self, topic, key=None, value=None, headers=None):
+            sent.append(key)
+        def flush(self):
+            pass
+    write_error_segments(tmp_path, [error_record(APPOINTMENT, stage="warehouse"),
+                                    error_record(dict(APPOINTMENT, appointment_id="a2"))])
+
+    assert redrive_errors(str(tmp_path))["warehouse_pending"] == 1
+    assert redrive_errors(str(tmp_path))["segments"] == 0
+    # Left in place, not copied to new error segments or quarantined
+    assert len(list_segments(str(tmp_path), "error")) == 1 and not records(tmp_path, "quarantine")
+    assert [r["appointment_id"] for r in records(tmp_path, "appointment")] == ["a2"]
+
+    summary = redrive_errors(str(tmp_path), target="topic", producer=Producer())
+    assert (summary["segments"], summary["passed"], sent) == (1, 1, ["a1"])
+    assert redrive_errors(str(tmp_path), target="topic", producer=Producer())["segments"] == 0
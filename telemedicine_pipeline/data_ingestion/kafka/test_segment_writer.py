@@ -0,0 +1,66 @@
+import os
+import json
+
+from segment_writer import SegmentWriter, recover_checkpoint, list_segments, read_segment
+
+APPOINTMENTS = ("telemedicine-appointments", 0)
+EVENTS = ("telemedicine-events", 0)
+
+def write_flush_groups(base_dir, num_groups, per_group=3):
+    """Durable flushes of appointments and events; returns each group's segment paths, oldest first"""
+    writer = SegmentWriter(str(base_dir), durable=True)
+    groups = []
+    for group in range(num_groups):
+        for i in range(group * per_group, (group + 1) * per_group):
+            writer.write("appointment", {"appointment_id": f"a{i}"}, source=APPOINTMENTS + (i,))
+            writer.write("event", {"appointment_id": f"a{i}", "event_type": "patient_login"}, source=EVENTS + (i,))
+        groups.append(writer._flush_group(list(writer.buffers.values())))
+    return groups
+
+def test_durable_flushes_advance_the_checkpoint(tmp_path):
+    write_flush_groups(tmp_path, 2)
+    assert recover_checkpoint(str(tmp_path)) == {APPOINTMENTS: 6, EVENTS: 6}
+    records = [r for path in list_segments(str(tmp_path), "appointment") for r in read_segment(path)]
+    assert sorted(r["appointment_id"] for r in records) == [f"a{i}" for i in range(6)]
+
+def test_interrupted_flush_is_removed(tmp_path):
+    groups = write_flush_groups(tmp_path, 3)
+    # Crash after the first rename of the newest group
+    os.remove(groups[2][1])
+
+    assert recover_checkpoint(str(tmp_path)) == {APPOINTMENTS: 6, EVENTS: 6}
+    assert not os.path.exists(groups[2][0])
+    assert all(os.path.exists(path) for group in groups[:2] for path in group)
+
+def test_older_group_missing_a_segment_is_kept(tmp_path):
+    groups = write_flush_groups(tmp_path, 3)
+    # Retention removed one old segment; the rest of its group is still data
+    os.remove(groups[0][0])
+
+    assert recover_checkpoint(str(tmp_path)) == {APPOINTMENTS: 9, EVENTS: 9}
+    assert os.path.exists(groups[0][1]) and os.path.exists(groups[0][1] + ".offsets.json")
+    assert all(os.path.exists(path) for group in groups[1:] for path in group)
+
+def test_temporary_files_are_removed(tmp_path):
+    groups = write_flush_groups(tmp_path, 1)
+    leftover = os.path.join(os.path.dirname(groups[0][0]), ".partial.ndjson.tmp")
+    with open(leftover, "w") as f:
+        f.write(json.dumps({"appointment_id": "x"}))
+
+    assert recover_checkpoint(str(tmp_path)) == {APPOINTMENTS: 3, EVENTS: 3}
+    assert not os.path.exists(leftover)
+
+def test_failed_flush_keeps_records_buffered(tmp_path, monkeypatch):
+    writer = SegmentWriter(str(tmp_path), durable=True)
+    writer.write("appointment", {"appointment_id": "a0"}, source=APPOINTMENTS + (0,))
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+    monkeypatch.setattr(writer, "_write_segment", fail)
+    writer.flush_all()
+    assert writer.buffered_records == 1 and writer.flush_errors == 1 and writer.checkpoint == {}
+
+    monkeypatch.undo()
+    writer.retry_at = 0
+    writer.flush_all()
+    assert writer.buffered_records == 0 and writer.checkpoint == {APPOINTMENTS: 1}
@@ -0,0 +1,107 @@
+import sqlite3
+
+from sessionizer import SessionStore, Sessionizer
+from segment_writer import SegmentWriter
+
+EVENTS = "telemedicine-events"
+
+def event(appointment_id, event_type, minute):
+    return {"appointment_id": appointment_id, "event_type": event_type,
+            "timestamp": f"2024-01-15 10:{minute:02d}:00"}
+
+def stored_ids(state_dir, partition):
+    conn = sqlite3.connect(f"{state_dir}/partition-{partition:05d}.db")
+    ids = {row[0] for row in conn.execute("SELECT appointment_id FROM open_sessions")}
+    conn.close()
+    return ids
+
+def sessionizer_with_writer(state_dir, output_dir):
+    """A sessionizer hooked into a durable segment writer, as the consumer sets them up"""
+    sessionizer = Sessionizer(SessionStore(str(state_dir), max_sessions=100), timeout_seconds=60)
+    writer = SegmentWriter(str(output_dir), durable=True)
+    writer.flush_hooks.append((sessionizer.checkpoint, sessionizer.flushed))
+    return sessionizer, writer
+
+def consume(sessionizer, writer, partition, events, first_offset=0, now=0):
+    """What process_messages does for valid events; returns the sessions closed"""
+    sessions = []
+    for offset, value in enumerate(events, first_offset):
+        session = sessionizer.process(value, now=now, partition=partition, offset=offset)
+        if session is not None:
+            writer.write("session", session)
+            sessionizer.release(session)
+            sessions.append(session)
+        writer.write("event", value, source=(EVENTS, partition, offset))
+    return sessions
+
+def test_workers_only_expire_their_own_partitions(tmp_path):
+    first = Sessionizer(SessionStore(str(tmp_path), max_sessions=1), timeout_seconds=60)
+    second = Sessionizer(SessionStore(str(tmp_path), max_sessions=1), timeout_seconds=60)
+    first.assign([0])
+    second.assign([1])
+    # max_sessions=1 spills the older sessions of each worker to its partition's file
+    for i in range(3):
+        first.process(event(f"p0-{i}", "patient_login", i), now=i, partition=0, offset=i)
+        second.process(event(f"p1-{i}", "patient_login", i), now=i, partition=1, offset=i)
+
+    assert {s["appointment_id"] for s in first.expire(now=1000)} == {"p0-0", "p0-1", "p0-2"}
+    assert {s["appointment_id"] for s in second.expire(now=1000)} == {"p1-0", "p1-1", "p1-2"}
+
+def test_flushed_events_survive_a_crash(tmp_path):
+    sessionizer, writer = sessionizer_with_writer(tmp_path / "state", tmp_path / "processed")
+    events = [event("a1", "appointment_scheduled", 0), event("a1", "patient_login", 1),
+              event("a1", "provider_login", 2)]
+    consume(sessionizer, writer, 0, events)
+    writer.flush_all()
+    consume(sessionizer, writer, 0, [event("a1", "session_started", 3)], first_offset=3)
+    # Crash: the open session and the unflushed event only lived in memory
+
+    restarted, writer = sessionizer_with_writer(tmp_path / "state", tmp_path / "processed")
+    assert writer.checkpoint == {(EVENTS, 0): 3}
+    # Replay from the committed offset, plus an already applied event the broker redelivers
+    sessions = consume(restarted, writer, 0, [event("a1", "provider_login", 2)], first_offset=2)
+    sessions += consume(restarted, writer, 0, [event("a1", "session_started", 3), event("a1", "session_ended", 4)],
+                        first_offset=3)
+
+    assert restarted.replayed_events == 1
+    assert len(sessions) == 1 and sessions[0]["event_count"] == 5 and sessions[0]["outcome"] == "completed"
+
+def test_closed_session_state_is_deleted_after_the_next_flush(tmp_path):
+    sessionizer, writer = sessionizer_with_writer(tmp_path / "state", tmp_path / "processed")
+    consume(sessionizer, writer, 0, [event("a1", "patient_login", 0)])
+    writer.flush_all()
+    assert stored_ids(tmp_path / "state", 0) == {"a1"}
+
+    consume(sessionizer, writer, 0, [event("a1", "appointment_cancelled", 1)], first_offset=1)
+    writer.flush_all()
+    # The flush wrote the session record; the state goes with the flush after it
+    assert stored_ids(tmp_path / "state", 0) == {"a1"}
+    consume(sessionizer, writer, 0, [event("a2", "patient_login", 2)], first_offset=2)
+    writer.flush_all()
+    assert stored_ids(tmp_path / "state", 0) == {"a2"}
+
+def test_failed_flush_keeps_closed_session_state(tmp_path, monkeypatch):
+    sessionizer, writer = sessionizer_with_writer(tmp_path / "state", tmp_path / "processed")
+    consume(sessionizer, writer, 0, [event("a1", "patient_login", 0)])
+    writer.flush_all()
+    consume(sessionizer, writer, 0, [event("a1", "session_ended", 1)], first_offset=1)
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+    monkeypatch.setattr(writer, "_write_segment", fail)
+    for _ in range(2):
+        writer.retry_at = 0
+        writer.flush_all()
+    assert stored_ids(tmp_path / "state", 0) == {"a1"}
+
+def test_revoked_partitions_are_spilled_for_the_next_owner(tmp_path):
+    first = Sessionizer(SessionStore(str(tmp_path)), timeout_seconds=60)
+    first.assign([0, 1])
+    first.process(event("a1", "patient_login", 0), now=0, partition=1, offset=0)
+    first.assign([0])
+    assert "a1" not in first.store.memory
+
+    second = Sessionizer(SessionStore(str(tmp_path)), timeout_seconds=60)
+    second.assign([1])
+    session = second.process(event("a1", "session_ended", 1), now=1, partition=1, offset=1)
+    assert session["event_count"] == 2
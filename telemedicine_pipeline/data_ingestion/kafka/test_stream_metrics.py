@@ -0,0 +1,33 @@
+import numpy as np
+
+from stream_metrics import LatencyHistogram, PRODUCED_AT_HEADER, end_to_end_latency
+from message_codecs import RawMessage
+
+def test_percentiles_are_within_the_bucket_precision():
+    latencies = np.random.default_rng(3).lognormal(mean=-5, sigma=1.5, size=20000)
+    histogram = LatencyHistogram()
+    histogram.record_many(latencies)
+
+    for percentile in (50, 95, 99):
+        expected = np.percentile(latencies, percentile) * 1000
+        assert abs(histogram.percentile(percentile) - expected) <= expected * 0.02 + 0.001
+    assert histogram.max() == int(latencies.max() * 1000000) / 1000
+
+def test_single_records_and_merged_workers_match_one_histogram():
+    latencies = np.random.default_rng(4).exponential(0.01, size=1000)
+    whole, first, second = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+    whole.record_many(latencies)
+    for latency in latencies[:400]:
+        first.record(latency)
+    second.record_many(latencies[400:])
+
+    merged = first.merge(second)
+    assert (merged.counts == whole.counts).all() and merged.max_us == whole.max_us
+
+def test_empty_histogram_has_no_percentiles():
+    assert LatencyHistogram().percentile(99) is None and LatencyHistogram().max() is None
+
+def test_end_to_end_latency_from_the_produce_header():
+    message = RawMessage("telemedicine-events", b"{}", [(PRODUCED_AT_HEADER, b"1700000000000000")])
+    assert end_to_end_latency(message, received_at=1700000000.25) == 0.25
+    assert end_to_end_latency(RawMessage("telemedicine-events", b"{}", [])) is None
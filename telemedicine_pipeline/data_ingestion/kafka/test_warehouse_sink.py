@@ -0,0 +1,117 @@
+import sqlite3
+import threading
+
+from segment_writer import SegmentWriter, recover_checkpoint
+from warehouse_sink import SqliteWarehouseSink
+
+APPOINTMENT = {"appointment_id": "a1", "provider_id": "PROV0001", "patient_id": "PAT000001",
+               "appointment_date": "2024-01-15", "scheduled_time": "9:05:00",
+               "appointment_type": "Follow-up", "status": "Completed", "device_type": "Tablet",
+               "wait_time_minutes": 5.0, "duration_minutes": float("nan"),
+               "timestamp": "2024-01-15 09:00:00"}
+
+APPOINTMENTS = "telemedicine-appointments"
+
+def fact_rows(db_file):
+    conn = sqlite3.connect(db_file)
+    rows = conn.execute("SELECT appointment_id, date_id, time_id, status_key, device_key, duration_minutes "
+                        "FROM fact_appointment ORDER BY appointment_id").fetchall()
+    conn.close()
+    return rows
+
+def test_redelivered_appointments_replace_their_row(tmp_path):
+    db_file = str(tmp_path / "warehouse.db")
+    sink = SqliteWarehouseSink(db_file, batch_size=10)
+    sink.write(APPOINTMENT)
+    sink.write(dict(APPOINTMENT, appointment_id="a2"))
+    assert sink.flush() == 2
+    sink.write(dict(APPOINTMENT, status="Rescheduled"))
+    sink.close()
+
+    assert fact_rows(db_file) == [("a1", "20240115", "0905", 4, 2, 0), ("a2", "20240115", "0905", 1, 2, 0)]
+
+def test_upsert_waits_for_another_workers_transaction(tmp_path):
+    db_file = str(tmp_path / "warehouse.db")
+    first, second = SqliteWarehouseSink(db_file), SqliteWarehouseSink(db_file)
+    first.write(APPOINTMENT)
+    second.write(dict(APPOINTMENT, appointment_id="a2"))
+
+    # Another worker holds the write lock for a moment
+    holder = sqlite3.connect(db_file, check_same_thread=False)
+    holder.execute("BEGIN IMMEDIATE")
+    release = threading.Timer(0.3, holder.commit)
+    release.start()
+    assert second.flush() == 1
+    release.join()
+    assert first.flush() == 1
+    assert [row[0] for row in fact_rows(db_file)] == ["a1", "a2"]
+
+def test_rows_the_warehouse_rejects_are_dead_lettered(tmp_path):
+    dead_letters = []
+    def dead_letter(appointment, message, errors):
+        dead_letters.append((appointment, errors))
+    sink = SqliteWarehouseSink(str(tmp_path / "warehouse.db"), batch_size=10, dead_letter=dead_letter)
+    sink.write(APPOINTMENT)
+    sink.write(dict(APPOINTMENT, appointment_id="a2", appointment_type=None))  # NOT NULL in fact_appointment
+    sink.write(dict(APPOINTMENT, appointment_id="a3"))
+
+    assert sink.flush() == 2
+    assert [row[0] for row in fact_rows(sink.db_file)] == ["a1", "a3"]
+    assert [appointment["appointment_id"] for appointment, _ in dead_letters] == ["a2"]
+    assert "NOT NULL" in dead_letters[0][1][0] and not sink.pending
+
+def test_unreachable_warehouse_dead_letters_after_max_attempts(tmp_path, monkeypatch):
+    dead_letters = []
+    sink = SqliteWarehouseSink(str(tmp_path / "warehouse.db"), max_attempts=3,
+                               dead_letter=lambda appointment, message, errors: dead_letters.append(appointment))
+    def unreachable(rows):
+        raise sqlite3.OperationalError("database is locked")
+    monkeypatch.setattr(sink, "upsert", unreachable)
+    for i in range(12):
+        sink.write(dict(APPOINTMENT, appointment_id=f"a{i}"))
+
+    for attempt in range(2):
+        sink.retry_at = 0
+        assert sink.flush() == 0
+        assert len(sink.pending) == 12 and not dead_letters
+    assert sink.flush() == 0 and sink.failed_attempts == 2  # Waits for the retry interval
+    sink.retry_at = 0
+    sink.flush()
+    assert not sink.pending and len(dead_letters) == 12
+
+def durable_writer_with_sink(tmp_path, **kwargs):
+    """A warehouse sink hooked into a durable segment writer, as the consumer sets them up with --commit-on-flush"""
+    writer = SegmentWriter(str(tmp_path / "processed"), durable=True)
+    sink = SqliteWarehouseSink(str(tmp_path / "warehouse.db"), batch_size=100, **kwargs)
+    writer.flush_hooks.append((sink.checkpoint, None))
+    return writer, sink
+
+def test_segment_flush_upserts_pending_rows_before_the_checkpoint(tmp_path):
+    writer, sink = durable_writer_with_sink(tmp_path)
+    for offset in range(3):
+        appointment = dict(APPOINTMENT, appointment_id=f"a{offset}")
+        sink.write(appointment)
+        writer.write("appointment", appointment, source=(APPOINTMENTS, 0, offset))
+    writer.flush_all()
+    # Crash: the sink is never closed
+
+    assert recover_checkpoint(str(tmp_path / "processed")) == {(APPOINTMENTS, 0): 3}
+    assert [row[0] for row in fact_rows(sink.db_file)] == ["a0", "a1", "a2"]
+
+def test_unreachable_warehouse_holds_back_the_checkpoint(tmp_path, monkeypatch):
+    writer, sink = durable_writer_with_sink(
+        tmp_path, max_attempts=2,
+        dead_letter=lambda appointment, message, errors: writer.write("error", {"value": appointment}))
+    def unreachable(rows):
+        raise sqlite3.OperationalError("database is locked")
+    monkeypatch.setattr(sink, "upsert", unreachable)
+    sink.write(APPOINTMENT)
+    writer.write("appointment", APPOINTMENT, source=(APPOINTMENTS, 0, 0))
+
+    writer.flush_all()
+    assert recover_checkpoint(str(tmp_path / "processed")) == {} and len(sink.pending) == 1
+    # Once the rows are dead-lettered, the dead letters go out with the segments they held back
+    writer.retry_at = sink.retry_at = 0
+    writer.flush_all()
+    assert recover_checkpoint(str(tmp_path / "processed")) == {(APPOINTMENTS, 0): 1}
+    assert not sink.pending and writer.records_written == 2 and not writer.buffers
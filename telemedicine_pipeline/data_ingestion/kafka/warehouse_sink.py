@@ -0,0 +1,346 @@
+import os
+import math
+import time
+import sqlite3
+
+# Streaming sink from the consumer into the warehouse fact_appointment table
+#
+# Validated appointments are mapped to the same surrogate keys transform_data.py produces
+# (provider_key/patient_key from the dimension tables, fixed status and device keys, date_id
+# %Y%m%d, time_id HHMM, missing wait/duration as 0) and upserted by appointment_id in
+# transactional micro-batches, so the warehouse (and the monitoring freshness checks) see streamed
+# appointments within seconds instead of after the next batch rebuild.
+#
+# Provider and patient keys come from in-memory caches of the dimension tables, reloaded when an
+# unknown id shows up (at most every DIMENSION_REFRESH_SECONDS). Upserts make re-delivered
+# messages harmless: the latest version of an appointment wins.
+#
+# A batch that fails is retried row by row, so one bad row does not hold back the others: rows
+# that still fail go to the dead_letter callback (the consumer writes them to the error segments,
+# stage "warehouse"). If the first ROW_PROBE_SIZE rows all fail, the warehouse itself is taken to
+# be down: the batch stays pending and is retried every WAREHOUSE_RETRY_SECONDS, and after
+# max_attempts failed flushes all pending rows are dead-lettered, which bounds what is kept.
+#
+# With --commit-on-flush the consumer runs checkpoint() before every segment flush: offsets are only
+# checkpointed once their appointments are upserted or dead-lettered.
+#
+# Consumer workers (--workers) each run their own sink on disjoint appointments. On SQLite their
+# upserts are serialized by the database lock (each waits up to SQLITE_BUSY_TIMEOUT_SECONDS); only
+# the Postgres backend upserts in parallel.
+
+WAREHOUSE_DB_FILE = '/home/ubuntu/telemedicine_pipeline/data_warehouse/telemedicine.db'
+WAREHOUSE_DB_PARAMS = {
+    'host': 'localhost',
+    'port': 5439,  # Redshift-compatible PostgreSQL port
+    'user': 'redshift',
+    'password': 'redshift',
+    'database': 'redshift'
+}
+WAREHOUSE_BACKENDS = ["sqlite", "postgres"]
+
+DEFAULT_WAREHOUSE_BATCH_SIZE = 500
+DEFAULT_WAREHOUSE_MAX_AGE_SECONDS = 5
+DEFAULT_WAREHOUSE_MAX_ATTEMPTS = 5  # Failed flushes of an unreachable warehouse before the rows are dead-lettered
+WAREHOUSE_RETRY_SECONDS = 5
+ROW_PROBE_SIZE = 10  # Rows tried one by one before a failing batch is blamed on the warehouse, not its rows
+# Consumer worker processes share the SQLite file; a writer waits this long for another's transaction
+SQLITE_BUSY_TIMEOUT_SECONDS = 30
+DIMENSION_REFRESH_SECONDS = 60
+
+# Same mappings as transform_data.py (dim_status.csv, dim_device.csv)
+STATUS_KEYS = {'Completed': 1, 'Cancelled': 2, 'No-show': 3, 'Rescheduled': 4}
+DEVICE_KEYS = {'Mobile Phone': 1, 'Tablet': 2, 'Laptop': 3, 'Desktop': 4}
+
+FACT_APPOINTMENT_COLUMNS = [
+    'appointment_id', 'provider_key', 'patient_key', 'date_id', 'time_id',
+    'status_key', 'device_key', 'appointment_type', 'wait_time_minutes',
+    'duration_minutes', 'connection_quality', 'had_technical_issues',
+    'technical_issue_type', 'timestamp'
+]
+
+def value_or_none(value):
+    """NaN (how pandas-built messages carry missing values) as None"""
+    return None if isinstance(value, float) and math.isnan(value) else value
+
+def date_id(appointment_date):
+    """'2024-05-18' -> '20240518'"""
+    return appointment_date[:10].replace('-', '') if appointment_date else None
+
+def time_id(scheduled_time):
+    """'9:05:00' -> '0905'"""
+    try:
+        hour, minute, _ = scheduled_time.split(':')
+        return f"{int(hour):02d}{int(minute):02d}"
+    except (AttributeError, ValueError):
+        return None
+
+class DimensionKeyCache:
+    """Natural id -> surrogate key for one dimension table, reloaded on a miss (rate-limited)"""
+
+    def __init__(self, load_keys, refresh_seconds=DIMENSION_REFRESH_SECONDS):
+        self.load_keys = load_keys
+        self.refresh_seconds = refresh_seconds
+        self.keys = {}
+        self.loaded_at = None
+        self.refresh()
+
+    def refresh(self):
+        self.keys = self.load_keys()
+        self.loaded_at = time.monotonic()
+
+    def get(self, natural_id):
+        key = self.keys.get(natural_id)
+        if key is None and natural_id is not None and time.monotonic() - self.loaded_at >= self.refresh_seconds:
+            self.refresh()
+            key = self.keys.get(natural_id)
+        return key
+
+class WarehouseSink:
+    """
+    Buffer fact_appointment rows and upsert them in one transaction per micro-batch, when
+    batch_size appointments are pending or the oldest has waited max_age_seconds.
+    Subclasses provide the connection, dimension queries and the upsert.
+    """
+
+    def __init__(self, batch_size=DEFAULT_WAREHOUSE_BATCH_SIZE, max_age_seconds=DEFAULT_WAREHOUSE_MAX_AGE_SECONDS,
+                 max_attempts=DEFAULT_WAREHOUSE_MAX_ATTEMPTS, dead_letter=None):
+        self.batch_size = batch_size
+        self.max_age_seconds = max_age_seconds
+        self.max_attempts = max_attempts
+        # dead_letter(appointment, message, errors) for rows that cannot be upserted
+        self.dead_letter = dead_letter
+        # appointment_id -> (row, appointment, message); a later message for the same appointment replaces it
+        self.pending = {}
+        self.pending_since = None
+        self.failed_attempts = 0
+        self.retry_at = 0
+        self.rows_upserted = 0
+        self.rows_dead_lettered = 0
+        self.batches = 0
+        self.connect()
+        self.provider_keys = DimensionKeyCache(lambda: self.load_keys("dim_provider", "provider_id", "provider_key"))
+        self.patient_keys = DimensionKeyCache(lambda: self.load_keys("dim_patient", "patient_id", "patient_key"))
+
+    def fact_row(self, appointment):
+        """fact_appointment values for a validated appointment, as transform_data.py builds them"""
+        return (
+            appointment['appointment_id'],
+            self.provider_keys.get(appointment.get('provider_id')),
+            self.patient_keys.get(appointment.get('patient_id')),
+            date_id(appointment.get('appointment_date')),
+            time_id(appointment.get('scheduled_time')),
+            STATUS_KEYS.get(appointment.get('status')),
+            DEVICE_KEYS.get(appointment.get('device_type')),
+            appointment.get('appointment_type'),
+            value_or_none(appointment.get('wait_time_minutes')) or 0,
+            value_or_none(appointment.get('duration_minutes')) or 0,
+            value_or_none(appointment.get('connection_quality')),
+            bool(value_or_none(appointment.get('had_technical_issues'))),
+            value_or_none(appointment.get('technical_issue_type')),
+            appointment.get('timestamp')
+        )
+
+    def write(self, appointment, message=None):
+        """Buffer a validated appointment; message is the Kafka message it came from, for dead letters"""
+        if not self.pending:
+            self.pending_since = time.monotonic()
+        self.pending[appointment['appointment_id']] = (self.fact_row(appointment), appointment, message)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def maybe_flush(self):
+        if self.pending and time.monotonic() - self.pending_since >= self.max_age_seconds:
+            self.flush()
+
+    def flush(self):
+        """Upsert pending rows in one transaction, falling back to row by row; returns the rows upserted"""
+        if not self.pending or time.monotonic() < self.retry_at:
+            return 0
+        entries = list(self.pending.values())
+        try:
+            self.upsert([row for row, _, _ in entries])
+            failed = []
+        except Exception as e:
+            print(f"Error upserting {len(entries)} appointments into fact_appointment, retrying row by row: {e}")
+            failed = self._upsert_rows(entries)
+            if failed is None:
+                return self._failed_attempt(entries, e)
+
+        self.pending = {}
+        self.failed_attempts = 0
+        self.rows_upserted += len(entries) - len(failed)
+        self.batches += 1
+        for (_, appointment, message), error in failed:
+            self._dead_letter(appointment, message, f"Warehouse upsert failed: {error}")
+        return len(entries) - len(failed)
+
+    def _upsert_rows(self, entries):
+        """Upsert entries one at a time; returns the (entry, error) that failed, or None if the probe rows all did"""
+        failed = []
+        for i, entry in enumerate(entries):
+            try:
+                self.upsert([entry[0]])
+            except Exception as e:
+                failed.append((entry, e))
+                if len(failed) == i + 1 == min(ROW_PROBE_SIZE, len(entries)):
+                    return None
+        return failed
+
+    def _failed_attempt(self, entries, error):
+        """The warehouse rejected every row tried: keep the batch for a retry, up to max_attempts flushes"""
+        self.failed_attempts += 1
+        if self.failed_attempts < self.max_attempts:
+            self.retry_at = time.monotonic() + WAREHOUSE_RETRY_SECONDS
+            self.pending_since = time.monotonic()
+            print(f"Keeping {len(entries)} appointments pending (attempt {self.failed_attempts} of "
+                  f"{self.max_attempts}), retrying in {WAREHOUSE_RETRY_SECONDS}s")
+            return 0
+        print(f"Warehouse still failing after {self.failed_attempts} attempts, "
+              f"dead-lettering {len(self.pending)} pending appointments")
+        for _, appointment, message in self.pending.values():
+            self._dead_letter(appointment, message,
+                              f"Warehouse upsert failed after {self.failed_attempts} attempts: {error}")
+        self.pending = {}
+        self.failed_attempts = 0
+        return 0
+
+    def checkpoint(self):
+        """
+        Segment writer flush hook (durable mode): upsert the pending rows first, and fail the segment
+        flush while any are left, so no offset is checkpointed before its appointment reached the warehouse
+        """
+        self.flush()
+        if self.pending:
+            raise OSError(f"{len(self.pending)} appointments not upserted into the warehouse yet")
+
+    def _dead_letter(self, appointment, message, error):
+        self.rows_dead_lettered += 1
+        if self.dead_letter is not None:
+            self.dead_letter(appointment, message, [error])
+        else:
+            print(f"Dropped appointment {appointment['appointment_id']}: {error}")
+
+    def close(self):
+        self.retry_at = 0
+        self.flush()
+        print(f"Upserted {self.rows_upserted} appointments into fact_appointment in {self.batches} batches"
+              + (f", {self.rows_dead_lettered} dead-lettered" if self.rows_dead_lettered else "")
+              + (f" ({len(self.pending)} not written)" if self.pending else ""))
+        self.disconnect()
+
+class SqliteWarehouseSink(WarehouseSink):
+    """fact_appointment upserts into the SQLite warehouse (build_warehouse_sqlite.py)"""
+
+    def __init__(self, db_file=WAREHOUSE_DB_FILE, **kwargs):
+        self.db_file = db_file
+        super().__init__(**kwargs)
+
+    def connect(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_file)), exist_ok=True)
+        self.conn = sqlite3.connect(self.db_file, timeout=SQLITE_BUSY_TIMEOUT_SECONDS)
+        self.inode = os.stat(self.db_file).st_ino
+        # A batch rebuild recreates the table with to_sql (no primary key); upserts need the unique index
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS fact_appointment (
+            appointment_id VARCHAR(36) PRIMARY KEY,
+            provider_key INTEGER,
+            patient_key INTEGER,
+            date_id VARCHAR(8),
+            time_id VARCHAR(4),
+            status_key INTEGER,
+            device_key INTEGER,
+            appointment_type VARCHAR(100) NOT NULL,
+            wait_time_minutes INTEGER,
+            duration_minutes INTEGER,
+            connection_quality VARCHAR(20),
+            had_technical_issues BOOLEAN,
+            technical_issue_type VARCHAR(100),
+            timestamp TIMESTAMP
+        )
+        """)
+        self.conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_fact_appointment_id ON fact_appointment(appointment_id)")
+        self.conn.commit()
+
+    def disconnect(self):
+        self.conn.close()
+
+    def load_keys(self, table, id_column, key_column):
+        try:
+            return dict(self.conn.execute(f"SELECT {id_column}, {key_column} FROM {table}").fetchall())
+        except sqlite3.OperationalError:
+            return {}  # Dimension not built yet
+
+    def upsert(self, rows):
+        # build_warehouse_sqlite.py deletes and recreates the database file; follow it to the new one
+        if not os.path.exists(self.db_file) or os.stat(self.db_file).st_ino != self.inode:
+            self.disconnect()
+            self.connect()
+            self.provider_keys.refresh()
+            self.patient_keys.refresh()
+        columns = ', '.join(FACT_APPOINTMENT_COLUMNS)
+        updates = ', '.join(f"{column} = excluded.{column}" for column in FACT_APPOINTMENT_COLUMNS[1:])
+        # Take the write lock up front, so concurrent workers queue on the busy timeout instead of
+        # failing when a deferred transaction cannot be upgraded
+        self.conn.execute("BEGIN IMMEDIATE")
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT INTO fact_appointment ({columns}) VALUES ({', '.join(['?'] * len(FACT_APPOINTMENT_COLUMNS))}) "
+                f"ON CONFLICT (appointment_id) DO UPDATE SET {updates}",
+                rows
+            )
+
+class PostgresWarehouseSink(WarehouseSink):
+    """fact_appointment upserts into the Redshift-compatible PostgreSQL warehouse (build_warehouse.py)"""
+
+    def __init__(self, db_params=WAREHOUSE_DB_PARAMS, **kwargs):
+        self.db_params = db_params
+        super().__init__(**kwargs)
+
+    def connect(self):
+        import psycopg2
+        from psycopg2.extras import execute_values
+        self.execute_values = execute_values
+        self.conn = psycopg2.connect(**self.db_params)
+
+    def disconnect(self):
+        self.conn.close()
+
+    def load_keys(self, table, id_column, key_column):
+        try:
+            with self.conn.cursor() as cursor:
+                cursor.execute(f"SELECT {id_column}, {key_column} FROM {table}")
+                keys = dict(cursor.fetchall())
+            self.conn.commit()
+            return keys
+        except Exception:
+            self.conn.rollback()
+            return {}
+
+    def upsert(self, rows):
+        columns = ', '.join(FACT_APPOINTMENT_COLUMNS)
+        updates = ', '.join(f"{column} = EXCLUDED.{column}" for column in FACT_APPOINTMENT_COLUMNS[1:])
+        try:
+            with self.conn.cursor() as cursor:
+                self.execute_values(
+                    cursor,
+                    f"INSERT INTO fact_appointment ({columns}) VALUES %s "
+                    f"ON CONFLICT (appointment_id) DO UPDATE SET {updates}",
+                    rows, page_size=len(rows)
+                )
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+def create_warehouse_sink(backend, sqlite_db_file=WAREHOUSE_DB_FILE, **kwargs):
+    """SQLite or Postgres fact_appointment sink, or None if the warehouse is unreachable"""
+    try:
+        if backend == "postgres":
+            sink = PostgresWarehouseSink(**kwargs)
+        else:
+            sink = SqliteWarehouseSink(sqlite_db_file, **kwargs)
+        print(f"Streaming appointments into the {backend} warehouse fact_appointment table")
+        return sink
+    except Exception as e:
+        print(f"Error connecting to the {backend} warehouse: {e}")
+        return None
@@ -1,17 +1,39 @@
 import boto3
+import io
 import json
 import os
+import sys
 import pandas as pd
 from datetime import datetime
 from botocore.exceptions import ClientError
 
+# Packed record reader lives next to the data generator
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data_sources'))
+from packed_records import PackedRecordReader, index_file_name
+
 # Mock S3 client for local development
 class MockS3Client:
     def __init__(self, local_directory):
         self.local_directory = local_directory
+        self._packed_readers = {}
         os.makedirs(self.local_directory, exist_ok=True)
         print(f"Initialized mock S3 client with local directory: {local_directory}")
     
+    def _get_packed_reader(self, directory, name):
+        """Return a cached reader for packed records '{name}_<id>.json' stored in directory"""
+        key = (directory, name)
+        if key not in self._packed_readers:
+            self._packed_readers[key] = PackedRecordReader(directory, name)
+        return self._packed_readers[key]
+    
+    def _packed_key(self, Key):
+        """Resolve a '<dir>/<name>_<id>.json' key to (reader, record_id) if it is packed"""
+        directory, file_name = os.path.split(os.path.join(self.local_directory, Key))
+        name, _, record_file = file_name.partition('_')
+        if not record_file.endswith('.json') or not PackedRecordReader.exists(directory, name):
+            return None, None
+        return self._get_packed_reader(directory, name), record_file[:-len('.json')]
+    
     def list_objects_v2(self, Bucket, Prefix):
         """List objects in the local directory that match the prefix"""
         prefix_path = os.path.join(self.local_directory, Prefix)
@@ -24,7 +46,21 @@ class MockS3Client:
         contents = []
         for root, _, files in os.walk(prefix_dir):
             for file in files:
-                if file.endswith('.json'):
+                if file.endswith('.index.csv'):
+                    # Packed records are listed as virtual '<name>_<id>.json' keys
+                    name = file[:-len(index_file_name(''))]
+                    reader = self._get_packed_reader(root, name)
+                    rel_dir = os.path.relpath(root, self.local_directory)
+                    last_modified = datetime.fromtimestamp(os.path.getmtime(os.path.join(root, file)))
+                    for record_id in reader.record_ids():
+                        rel_path = os.path.join(rel_dir, f"{name}_{record_id}.json")
+                        if rel_path.startswith(Prefix):
+                            contents.append({
+                                'Key': rel_path,
+                                'LastModified': last_modified,
+                                'Size': reader.record_size(record_id)
+                            })
+                elif file.endswith('.json'):
                     full_path = os.path.join(root, file)
                     rel_path = os.path.relpath(full_path, self.local_directory)
                     if rel_path.startswith(Prefix):
@@ -39,6 +75,13 @@ class MockS3Client:
     def get_object(self, Bucket, Key):
         """Get object from the local directory"""
         file_path = os.path.join(self.local_directory, Key)
+        
+        # Packed records are read by seeking to their block instead of opening a file per record
+        if not os.path.exists(file_path):
+            reader, record_id = self._packed_key(Key)
+            if reader is not None and record_id in reader:
+                return {'Body': io.BytesIO(reader.get_raw(record_id))}
+        
         try:
             with open(file_path, 'rb') as f:
                 return {'Body': f}
@@ -0,0 +1,19 @@
+import numpy as np
+import pytest
+
+from generate_data import generate_provider_data, generate_patient_data, generate_appointment_logs_vectorized
+
+@pytest.fixture(scope="session")
+def make_appointments():
+    """Generate num_appointments appointments for 20 providers and 100 patients, the same for a seed"""
+    providers_df = generate_provider_data(20)
+    patients_df = generate_patient_data(100)
+    def make(num_appointments=2000, seed=1):
+        return generate_appointment_logs_vectorized(providers_df, patients_df, num_appointments=num_appointments,
+                                                    rng=np.random.default_rng(seed))
+    return make
+
+@pytest.fixture(scope="session")
+def appointments_df(make_appointments):
+    """2000 generated appointments, the same every run"""
+    return make_appointments()
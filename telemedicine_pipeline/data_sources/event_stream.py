@@ -0,0 +1,373 @@
+import json
+import os
+import argparse
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+from generate_data import RANDOM_SEED, format_datetime_array, random_choice_array
+
+# Offline event stream
+#
+# Expands every appointment into its event sequence (appointment_scheduled, cancellations,
+# reschedules, logins, session_started, technical_issue, session_ended) column-wise for the
+# whole dataset, and writes it to disk as replayable per-partition NDJSON:
+#
+#   data_sources/event_stream/telemedicine-appointments/partition-00000.ndjson
+#   data_sources/event_stream/telemedicine-events/partition-00000.ndjson
+#   data_sources/event_stream/manifest.json
+#
+# Each line is the message value. Messages are keyed by appointment_id and assigned to the
+# partition Kafka's default partitioner would pick (murmur2 of the key), so a replay into a
+# topic with the same partition count lands every message where a live producer would have.
+# Within a partition, lines are ordered by event timestamp; events of one appointment keep
+# their original relative order. data_ingestion/kafka/appointment_producer.py sends the same
+# events live, built by build_event_sequences below.
+
+APPOINTMENT_TOPIC = "telemedicine-appointments"
+EVENTS_TOPIC = "telemedicine-events"
+EVENT_STREAM_DIR = "data_sources/event_stream"
+EVENT_PARTITIONS = 8
+
+EVENT_REASONS = ["Patient request", "Provider unavailable", "Emergency", "Other"]
+PROVIDER_DEVICE_TYPES = ["Laptop", "Desktop"]
+PROVIDER_OPERATING_SYSTEMS = ["Windows", "macOS"]
+PROVIDER_BROWSERS = ["Chrome", "Firefox", "Edge"]
+ISSUE_SEVERITIES = ["Low", "Medium", "High"]
+
+# Appointment columns copied into events; encoded once per distinct value
+EVENT_CATEGORICAL_COLUMNS = [
+    "patient_id", "provider_id", "scheduled_time", "appointment_type",
+    "device_type", "operating_system", "browser", "connection_quality", "technical_issue_type"
+]
+
+def partition_file_name(partition):
+    return f"partition-{partition:05d}.ndjson"
+
+# Kafka's default partitioner (murmur2, as in the Java client and kafka-python), vectorized
+def murmur2_array(keys):
+    """murmur2 hash of every key (str or bytes) as uint32, computed per key length in bulk"""
+    m = np.uint64(0x5bd1e995)
+    mask = np.uint64(0xffffffff)
+    encoded = np.array([k.encode("utf-8") if isinstance(k, str) else k for k in keys], dtype=object)
+    lengths = np.fromiter((len(k) for k in encoded), dtype=np.int64, count=len(encoded))
+    hashes = np.empty(len(encoded), dtype=np.uint64)
+
+    for length in np.unique(lengths):
+        rows = np.flatnonzero(lengths == length)
+        data = np.frombuffer(b"".join(encoded[rows]), dtype=np.uint8).reshape(len(rows), length).astype(np.uint64)
+        h = np.full(len(rows), (0x9747b28c ^ int(length)) & 0xffffffff, dtype=np.uint64)
+
+        for i in range(0, length - length % 4, 4):
+            k = data[:, i] | (data[:, i + 1] << 8) | (data[:, i + 2] << 16) | (data[:, i + 3] << 24)
+            k = (k * m) & mask
+            k ^= k >> np.uint64(24)
+            k = (k * m) & mask
+            h = ((h * m) & mask) ^ k
+
+        tail = length & ~3
+        extra = length % 4
+        if extra >= 3:
+            h ^= data[:, tail + 2] << 16
+        if extra >= 2:
+            h ^= data[:, tail + 1] << 8
+        if extra >= 1:
+            h ^= data[:, tail]
+            h = (h * m) & mask
+
+        h ^= h >> np.uint64(13)
+        h = (h * m) & mask
+        h ^= h >> np.uint64(15)
+        hashes[rows] = h
+
+    return hashes.astype(np.uint32)
+
+def partition_for_keys(keys, num_partitions):
+    """Partition Kafka's default partitioner assigns to each key"""
+    return ((murmur2_array(keys) & 0x7fffffff) % num_partitions).astype(np.int64)
+
+# JSON serialization without per-row dicts: every distinct value of a column is encoded once
+# (together with its key) and gathered by factorized codes, then each row's fragments are joined
+def json_fragments(prefix, values):
+    """prefix + JSON encoding of every value (NaN/None become null)"""
+    if isinstance(values, pd.Categorical):
+        codes, uniques = values.codes, values.categories.to_numpy()
+    else:
+        codes, uniques = pd.factorize(np.asarray(values), use_na_sentinel=True)
+    text = "".join(uniques) if all(isinstance(u, str) for u in uniques) else ""
+    if text and text.isascii() and text.isprintable() and '"' not in text and "\\" not in text:
+        # Ids, dates and labels need no escaping: skip json.dumps for high-cardinality columns
+        encoded = [prefix + '"' + u + '"' for u in uniques]
+    else:
+        encoded = [prefix + json.dumps(u.item() if hasattr(u, "item") else u) for u in uniques]
+    return np.array(encoded + [prefix + "null"], dtype=object)[codes]
+
+def json_objects(columns, nested=None, head=None):
+    """
+    Encode rows as JSON object strings. columns is a list of (name, values) pairs;
+    nested is an optional (name, columns) pair encoded as an inner object at the end;
+    head is an optional list of already encoded leading fragments (iterables) that open the object.
+    """
+    parts = list(head or [])
+    parts += [json_fragments(("{" if i == 0 and not head else ",") + json.dumps(name) + ":", values)
+              for i, (name, values) in enumerate(columns)]
+    closing = "}"
+    if nested:
+        nested_name, nested_columns = nested
+        parts += [json_fragments(("," + json.dumps(nested_name) + ":{" if i == 0 else ",") + json.dumps(name) + ":",
+                                 values)
+                  for i, (name, values) in enumerate(nested_columns)]
+        closing = "}}"
+    return np.array(["".join(row) + closing for row in zip(*parts)], dtype=object)
+
+def json_lines(df):
+    """Serialize each row of df to a JSON object string"""
+    return json_objects([(column, df[column].to_numpy()) for column in df.columns])
+
+def parse_by_unique(values, parser):
+    """Apply a vectorized parser to the distinct values only and gather the result"""
+    codes, uniques = pd.factorize(np.asarray(values))
+    return parser(uniques).to_numpy()[codes]
+
+def event_block(event_type, appointments, timestamps, top_level, details):
+    """One event type for a set of appointments: timestamps plus serialized message values"""
+    # Timestamps repeat a lot (minute resolution): format each distinct one once
+    timestamp_codes, distinct_timestamps = pd.factorize(timestamps)
+    columns = [(column, appointments[column].array) for column in top_level]
+    columns.append(("timestamp", pd.Categorical.from_codes(
+        timestamp_codes, categories=format_datetime_array(np.asarray(distinct_timestamps)))))
+    head = [repeat('{"event_type":' + json.dumps(event_type) + ',"appointment_id":'),
+            appointments["appointment_id_json"].to_numpy()]
+
+    return pd.DataFrame({
+        "appointment_id": appointments["appointment_id"].to_numpy(),
+        "event_type": event_type,
+        "timestamp": timestamps,
+        "value": json_objects(columns, nested=("details", list(details.items())), head=head)
+    })
+
+# Events of every appointment, column-wise. The offline stream writes the serialized values;
+# the live producer (appointment_producer.py) sends them via build_event_sequences below
+def expand_appointment_events(appointments_df, rng):
+    """
+    Return one row per event (appointment_id, event_type, timestamp, value, appointment_position),
+    grouped by appointment in row order
+    """
+    n = len(appointments_df)
+    appointments_df = appointments_df.reset_index(drop=True).astype(
+        {column: "category" for column in EVENT_CATEGORICAL_COLUMNS})
+    appointments_df["appointment_id_json"] = json_fragments("", appointments_df["appointment_id"].to_numpy())
+    base = (parse_by_unique(appointments_df["appointment_date"], lambda v: pd.to_datetime(v, format="%Y-%m-%d"))
+            + parse_by_unique(appointments_df["scheduled_time"], pd.to_timedelta)).astype("datetime64[m]")
+    minutes = lambda values: values.astype("timedelta64[m]")
+    blocks = []
+
+    # Appointment scheduled (1-7 days before)
+    blocks.append(event_block(
+        "appointment_scheduled", appointments_df,
+        base - minutes(rng.integers(1, 8, size=n) * 1440),
+        ["patient_id", "provider_id"],
+        {"scheduled_time": appointments_df["scheduled_time"].array,
+         "appointment_type": appointments_df["appointment_type"].array}
+    ))
+
+    status = appointments_df["status"].to_numpy()
+
+    # Cancellations and reschedules (1-24 hours before)
+    cancelled = np.flatnonzero(status == "Cancelled")
+    blocks.append(event_block(
+        "appointment_cancelled", appointments_df.iloc[cancelled],
+        base[cancelled] - minutes(rng.integers(1, 25, size=len(cancelled)) * 60),
+        ["patient_id", "provider_id"],
+        {"reason": random_choice_array(rng, EVENT_REASONS, len(cancelled))}
+    ))
+
+    rescheduled = np.flatnonzero(status == "Rescheduled")
+    rescheduled_df = appointments_df.iloc[rescheduled]
+    blocks.append(event_block(
+        "appointment_rescheduled", rescheduled_df,
+        base[rescheduled] - minutes(rng.integers(1, 25, size=len(rescheduled)) * 60),
+        ["patient_id", "provider_id"],
+        # The live producer shifts the time by whole days, so new_time equals original_time
+        {"original_time": rescheduled_df["scheduled_time"].array,
+         "new_time": rescheduled_df["scheduled_time"].array,
+         "reason": random_choice_array(rng, EVENT_REASONS, len(rescheduled))}
+    ))
+
+    # Completed appointments go through the full session flow
+    completed = np.flatnonzero(status == "Completed")
+    completed_df = appointments_df.iloc[completed]
+    c = len(completed)
+    completed_base = base[completed]
+
+    blocks.append(event_block(
+        "patient_login", completed_df,
+        completed_base - minutes(rng.integers(5, 16, size=c)),
+        ["patient_id"],
+        {"device_type": completed_df["device_type"].array,
+         "operating_system": completed_df["operating_system"].array,
+         "browser": completed_df["browser"].array}
+    ))
+
+    blocks.append(event_block(
+        "provider_login", completed_df,
+        completed_base - minutes(rng.integers(0, 6, size=c)),
+        ["provider_id"],
+        {"device_type": random_choice_array(rng, PROVIDER_DEVICE_TYPES, c),
+         "operating_system": random_choice_array(rng, PROVIDER_OPERATING_SYSTEMS, c),
+         "browser": random_choice_array(rng, PROVIDER_BROWSERS, c)}
+    ))
+
+    wait_time = completed_df["wait_time_minutes"].to_numpy(dtype=float)
+    session_start = completed_base + minutes(np.nan_to_num(wait_time).astype(np.int64))
+    blocks.append(event_block(
+        "session_started", completed_df, session_start,
+        ["patient_id", "provider_id"],
+        {"connection_quality": completed_df["connection_quality"].array,
+         "wait_time_minutes": wait_time}
+    ))
+
+    had_issues = completed_df["had_technical_issues"].to_numpy(dtype=bool)
+    with_issues = np.flatnonzero(had_issues)
+    issues_df = completed_df.iloc[with_issues]
+    blocks.append(event_block(
+        "technical_issue", issues_df,
+        session_start[with_issues] + minutes(rng.integers(1, 11, size=len(with_issues))),
+        [],
+        {"issue_type": issues_df["technical_issue_type"].array,
+         "severity": random_choice_array(rng, ISSUE_SEVERITIES, len(with_issues)),
+         "resolved": rng.random(size=len(with_issues)) < 0.5}
+    ))
+
+    duration = completed_df["duration_minutes"].to_numpy(dtype=float)
+    blocks.append(event_block(
+        "session_ended", completed_df,
+        session_start + minutes(np.nan_to_num(duration).astype(np.int64)),
+        ["patient_id", "provider_id"],
+        {"duration_minutes": duration,
+         "ended_normally": ~had_issues | (rng.random(size=c) > 0.3)}
+    ))
+
+    # Group by appointment, time-ordered within it (stable, so ties keep the order above)
+    events_df = pd.concat(blocks, ignore_index=True)
+    appointment_position = np.concatenate([
+        np.arange(n), cancelled, rescheduled, completed, completed, completed, completed[with_issues], completed
+    ])
+    order = np.lexsort((events_df["timestamp"].to_numpy(), appointment_position))
+    events_df = events_df.iloc[order].reset_index(drop=True)
+    events_df["appointment_position"] = appointment_position[order]
+    return events_df
+
+# The same events one list per appointment, for the live producer: Python dicts, or with
+# encoded=True (event_type, timestamp, UTF-8 JSON value) tuples that skip parsing the values back
+def build_event_sequences(appointments_df, rng=None, encoded=False):
+    """Return one list of events per appointment row (in row order), each sorted by timestamp"""
+    rng = rng if rng is not None else np.random.default_rng()
+    events_df = expand_appointment_events(appointments_df, rng)
+    if encoded:
+        timestamp_codes, distinct_timestamps = pd.factorize(events_df["timestamp"].to_numpy())
+        timestamps = format_datetime_array(np.asarray(distinct_timestamps))[timestamp_codes].tolist()
+        events = list(zip(events_df["event_type"].tolist(), timestamps,
+                          [value.encode("utf-8") for value in events_df["value"].tolist()]))
+    else:
+        events = json.loads("[" + ",".join(events_df["value"].tolist()) + "]")  # One parse for the whole chunk
+    counts = np.bincount(events_df["appointment_position"].to_numpy(), minlength=len(appointments_df))
+    bounds = np.concatenate([[0], np.cumsum(counts)]).tolist()
+    return [events[bounds[i]:bounds[i + 1]] for i in range(len(appointments_df))]
+
+def write_partition(path, values, timestamps):
+    """Write values to path as NDJSON, ordered by timestamp (stable)"""
+    order = np.argsort(timestamps, kind="stable")
+    with open(path, "w") as f:
+        if len(order):
+            f.write("\n".join(values[order]))
+            f.write("\n")
+
+# Expand and write one partition of both topics in a worker process
+def write_event_partition(task):
+    """Worker entry point: returns the manifest entries for the partition's files"""
+    partition = task["partition"]
+    partition_df = task["appointments_df"]
+    events_df = expand_appointment_events(partition_df, np.random.default_rng(task["seed_sequence"]))
+
+    # The appointment record is sent when the appointment is scheduled
+    scheduled = events_df["event_type"].to_numpy() == "appointment_scheduled"
+    scheduled_at = pd.Series(events_df["timestamp"].to_numpy()[scheduled],
+                             index=events_df["appointment_id"].to_numpy()[scheduled])
+    appointment_timestamps = scheduled_at.loc[partition_df["appointment_id"].to_numpy()].to_numpy()
+    event_timestamps = events_df["timestamp"].to_numpy()
+
+    write_partition(os.path.join(task["output_dir"], APPOINTMENT_TOPIC, partition_file_name(partition)),
+                    json_lines(partition_df), appointment_timestamps)
+    write_partition(os.path.join(task["output_dir"], EVENTS_TOPIC, partition_file_name(partition)),
+                    events_df["value"].to_numpy(dtype=object), event_timestamps)
+    print(f"Partition {partition}: {len(partition_df)} appointments, {len(events_df)} events")
+
+    return {
+        topic: {
+            "messages": len(timestamps),
+            "first_timestamp": str(timestamps.min()) if len(timestamps) else None,
+            "last_timestamp": str(timestamps.max()) if len(timestamps) else None
+        }
+        for topic, timestamps in ((APPOINTMENT_TOPIC, appointment_timestamps), (EVENTS_TOPIC, event_timestamps))
+    }
+
+# Materialize the appointment and event topics as partitioned, time-ordered NDJSON
+def generate_event_stream(appointments_file="data_sources/appointment_logs/appointment_logs.csv",
+                          output_dir=EVENT_STREAM_DIR, num_partitions=EVENT_PARTITIONS, seed=RANDOM_SEED,
+                          processes=None):
+    """
+    Expand every appointment into its events and write one file per topic partition.
+    Partitions are expanded in parallel, each from its own derived seed, so the output
+    is reproducible for a given seed and partition count regardless of processes.
+    """
+    print("Loading appointment logs...")
+    appointments_df = pd.read_csv(appointments_file)
+    partitions = partition_for_keys(appointments_df["appointment_id"].to_numpy(), num_partitions)
+
+    for topic in (APPOINTMENT_TOPIC, EVENTS_TOPIC):
+        os.makedirs(os.path.join(output_dir, topic), exist_ok=True)
+
+    seed_sequences = np.random.SeedSequence(seed).spawn(num_partitions)
+    tasks = [{
+        "partition": partition,
+        "appointments_df": appointments_df[partitions == partition],
+        "seed_sequence": seed_sequences[partition],
+        "output_dir": output_dir
+    } for partition in range(num_partitions)]
+    del appointments_df
+
+    print(f"Expanding events for {num_partitions} partitions...")
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        results = list(executor.map(write_event_partition, tasks))
+
+    manifest = {"partitions": num_partitions, "seed": seed, "appointments_file": appointments_file,
+                "topics": {
+                    topic: {partition_file_name(partition): result[topic] for partition, result in enumerate(results)}
+                    for topic in (APPOINTMENT_TOPIC, EVENTS_TOPIC)
+                }}
+    with open(os.path.join(output_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    total_appointments = sum(p["messages"] for p in manifest["topics"][APPOINTMENT_TOPIC].values())
+    total_events = sum(p["messages"] for p in manifest["topics"][EVENTS_TOPIC].values())
+    print(f"Wrote {total_appointments} appointments and {total_events} events "
+          f"in {num_partitions} partitions to {output_dir}")
+    return manifest
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Materialize the appointment event stream as partitioned NDJSON")
+    parser.add_argument("--appointments-file", default="data_sources/appointment_logs/appointment_logs.csv")
+    parser.add_argument("--output-dir", default=EVENT_STREAM_DIR)
+    parser.add_argument("--partitions", type=int, default=EVENT_PARTITIONS, help="Partitions per topic")
+    parser.add_argument("--seed", type=int, default=RANDOM_SEED, help="Random seed for event timings")
+    parser.add_argument("--processes", type=int, default=None, help="Worker processes (default: CPU count)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    generate_event_stream(args.appointments_file, args.output_dir, args.partitions, args.seed, args.processes)
+
+if __name__ == "__main__":
+    main()
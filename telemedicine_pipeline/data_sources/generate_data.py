@@ -5,18 +5,113 @@ import os
 import random
 from datetime import datetime, timedelta
 import uuid
+import shutil
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 
-# Set random seed for reproducibility
-np.random.seed(42)
+from packed_records import PackedRecordWriter
+
+# Random seed for reproducibility (applied in main(), so importing this module leaves the global state alone)
+RANDOM_SEED = 42
 
 # Constants
 NUM_PROVIDERS = 50
 NUM_PATIENTS = 500
 NUM_APPOINTMENTS = 2000
 NUM_FEEDBACK = 1500
+STREAM_CHUNK_SIZE = 100000  # Rows generated and flushed per chunk in streaming mode
+DEFAULT_SHARDS = 8  # Part of a scale-factor dataset's identity, together with seed and chunk size
+MANIFEST_FILE = "data_sources/manifest.json"
+DELTA_DIR = "data_sources/deltas"
 START_DATE = datetime(2024, 1, 1)
 END_DATE = datetime(2025, 3, 30)
 
+# Appointment attribute domains (shared by the row-by-row and vectorized generators)
+APPOINTMENT_STATUSES = ["Completed", "Cancelled", "No-show", "Rescheduled"]
+APPOINTMENT_STATUS_WEIGHTS = [0.75, 0.1, 0.05, 0.1]  # 75% completed, 10% cancelled, 5% no-show, 10% rescheduled
+APPOINTMENT_TYPES = ["Initial Consultation", "Follow-up", "Urgent Care", "Specialist Referral", "Medication Review"]
+DEVICE_TYPES = ["Mobile Phone", "Tablet", "Laptop", "Desktop"]
+OPERATING_SYSTEMS = ["iOS", "Android", "Windows", "macOS", "Linux"]
+BROWSERS = ["Chrome", "Safari", "Firefox", "Edge"]
+CONNECTION_QUALITIES = ["Excellent", "Good", "Fair", "Poor"]
+TECHNICAL_ISSUE_TYPES = [
+    "Audio Problems", "Video Problems", "Connection Lost",
+    "Login Issues", "App Crash", "Browser Compatibility"
+]
+TECHNICAL_ISSUE_RATE = 0.15  # 15% have technical issues
+
+# Feedback rating distributions (mean, standard deviation) and comments
+FEEDBACK_RATING_DISTRIBUTIONS = {
+    "provider_rating": (4.2, 0.8),
+    "ease_of_use_rating": (3.8, 1.0),
+    "audio_quality_rating": (3.9, 0.9),
+    "video_quality_rating": (3.7, 1.1),
+    "overall_satisfaction": (4.0, 0.9)
+}
+TECHNICAL_ISSUE_PENALIZED_RATINGS = [
+    "ease_of_use_rating", "audio_quality_rating", "video_quality_rating", "overall_satisfaction"
+]
+POSITIVE_FEEDBACK_COMMENTS = [
+    "Great experience overall!",
+    "The doctor was very helpful and professional.",
+    "I appreciate the convenience of telemedicine.",
+    "Much better than going to a physical office.",
+    "Will definitely use this service again."
+]
+NEGATIVE_FEEDBACK_COMMENTS = [
+    "The connection was poor and made it difficult to communicate.",
+    "I had trouble logging in and wasted time.",
+    "The doctor seemed rushed and didn't address all my concerns.",
+    "The app kept crashing during my appointment.",
+    "I prefer in-person visits for better care."
+]
+
+# Workload profiles for the vectorized engine. "uniform" reproduces the original generator;
+# the others add the skew seen in production traffic:
+#   provider_zipf_exponent  provider popularity ~ 1 / rank**s (0 = uniform)
+#   hourly_weights          relative bookings per scheduled hour, 8:00-17:00 (diurnal curve)
+#   weekday_weights         relative volume Monday..Sunday (weekly curve)
+#   monthly_weights         relative volume January..December (seasonality)
+#   repeat_patient_share    fraction of appointments booked by returning patients...
+#   repeat_patient_pool     ...drawn from this fraction of the patient base
+WORKLOAD_PROFILES = {
+    "uniform": {
+        "provider_zipf_exponent": 0.0,
+        "hourly_weights": None,
+        "weekday_weights": None,
+        "monthly_weights": None,
+        "repeat_patient_share": 0.0,
+        "repeat_patient_pool": 0.0
+    },
+    "production": {
+        "provider_zipf_exponent": 1.1,
+        "hourly_weights": [1.2, 2.0, 2.2, 1.8, 1.0, 1.1, 1.5, 1.7, 2.1, 1.6],
+        "weekday_weights": [1.35, 1.2, 1.1, 1.05, 0.95, 0.45, 0.3],
+        "monthly_weights": [1.3, 1.25, 1.1, 0.95, 0.9, 0.8, 0.75, 0.85, 1.0, 1.1, 1.2, 1.25],
+        "repeat_patient_share": 0.6,
+        "repeat_patient_pool": 0.15
+    },
+    "flash_crowd": {
+        "provider_zipf_exponent": 1.5,
+        "hourly_weights": [0.5, 4.0, 4.0, 1.0, 0.5, 0.5, 0.5, 1.0, 3.0, 1.0],
+        "weekday_weights": [2.0, 1.0, 1.0, 1.0, 1.0, 0.2, 0.1],
+        "monthly_weights": [2.0, 1.5, 1.0, 0.7, 0.6, 0.5, 0.5, 0.6, 0.8, 1.0, 1.5, 2.0],
+        "repeat_patient_share": 0.8,
+        "repeat_patient_pool": 0.05
+    }
+}
+
+# Daily change rates for incremental (delta) generation on top of an existing dataset
+DEFAULT_DELTA_RATES = {
+    "new_appointments_per_day": None,  # None: the base dataset's average bookings per day
+    "status_change_rate": 0.15,  # Cancelled/Rescheduled updates per new appointment (only ones not held yet)
+    "late_feedback_rate": 0.6,  # Late feedback records per new appointment
+    "late_feedback_window_days": 14,  # Late feedback arrives for appointments up to this old
+    "provider_change_rate": 0.01  # Share of providers whose attributes change each day
+}
+DELTA_STATUS_CHANGE_STATUSES = ["Cancelled", "Rescheduled"]
+
 # Helper functions
 def random_date(start_date, end_date):
     time_between_dates = end_date - start_date
@@ -29,8 +124,126 @@ def random_time():
     minutes = random.choice([0, 15, 30, 45])
     return f"{hours:02d}:{minutes:02d}:00"
 
+# Vectorized helpers
+def random_uuid4_array(rng, size):
+    """Generate an array of random version-4 UUID strings from a NumPy generator"""
+    raw = rng.integers(0, 256, size=(size, 16), dtype=np.uint8)
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40  # version 4
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80  # RFC 4122 variant
+    
+    # Expand every byte into two ASCII hex digits and lay them out as 8-4-4-4-12
+    hex_digits = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+    digits = np.empty((size, 32), dtype=np.uint8)
+    digits[:, 0::2] = hex_digits[raw >> 4]
+    digits[:, 1::2] = hex_digits[raw & 0x0F]
+    
+    chars = np.full((size, 36), ord("-"), dtype=np.uint8)
+    chars[:, 0:8] = digits[:, 0:8]
+    chars[:, 9:13] = digits[:, 8:12]
+    chars[:, 14:18] = digits[:, 12:16]
+    chars[:, 19:23] = digits[:, 16:20]
+    chars[:, 24:36] = digits[:, 20:32]
+    
+    return chars.view("S36").ravel().astype(str)
+
+def format_date_array(values):
+    """Format a datetime64[D] array as 'YYYY-MM-DD' strings"""
+    values = values.astype("datetime64[D]")
+    if len(values) == 0:
+        return np.array([], dtype=str)
+    
+    # Format each distinct day once and gather, instead of formatting every row
+    first_day = values.min()
+    day_strings = np.datetime_as_string(np.arange(first_day, values.max() + 1), unit="D")
+    return day_strings[(values - first_day).astype(np.int64)]
+
+def categorical_date_array(values, suffix=""):
+    """Format a datetime64[D] array as a Categorical of 'YYYY-MM-DD' + suffix strings"""
+    values = values.astype("datetime64[D]")
+    if len(values) == 0:
+        return pd.Categorical([])
+    first_day = values.min()
+    day_strings = format_date_array(np.arange(first_day, values.max() + 1))
+    return pd.Categorical.from_codes((values - first_day).astype(np.int64),
+                                     categories=np.char.add(day_strings, suffix))
+
+def format_datetime_array(values):
+    """Format a datetime64 array as 'YYYY-MM-DD HH:MM:SS' strings"""
+    values = values.astype("datetime64[s]")
+    days = values.astype("datetime64[D]")
+    seconds = (values - days).astype(np.int64)
+    
+    chars = np.empty((len(values), 19), dtype=np.uint8)
+    chars[:, 0:10] = format_date_array(days).astype("S10").view(np.uint8).reshape(-1, 10)
+    chars[:, 10] = ord(" ")
+    for position, part in ((11, seconds // 3600), (14, seconds // 60 % 60), (17, seconds % 60)):
+        chars[:, position] = ord("0") + part // 10
+        chars[:, position + 1] = ord("0") + part % 10
+    chars[:, 13] = ord(":")
+    chars[:, 16] = ord(":")
+    return chars.view("S19").ravel().astype(str)
+
+def random_date_array(rng, start_date, end_date, size, weekday_weights=None, monthly_weights=None):
+    """Vectorized equivalent of random_date returning datetime64[D] values, optionally weighted"""
+    days_between_dates = (end_date - start_date).days
+    first_day = np.datetime64(start_date.date(), "D")
+    if weekday_weights is None and monthly_weights is None:
+        offsets = rng.integers(0, days_between_dates, size=size)
+        return first_day + offsets
+    
+    # Weight every calendar day by its weekday and month, then draw days from that distribution
+    days = first_day + np.arange(days_between_dates)
+    weights = np.ones(days_between_dates)
+    if weekday_weights is not None:
+        weekday = (days.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday; Monday = 0
+        weights *= np.asarray(weekday_weights, dtype=float)[weekday]
+    if monthly_weights is not None:
+        month = days.astype("datetime64[M]").astype(np.int64) % 12  # January = 0
+        weights *= np.asarray(monthly_weights, dtype=float)[month]
+    return days[rng.choice(days_between_dates, size=size, p=weights / weights.sum())]
+
+def random_time_array(rng, size, hourly_weights=None):
+    """Vectorized equivalent of random_time returning 'HH:MM:00' strings, optionally weighted by hour"""
+    slots = [f"{hours:02d}:{minutes:02d}:00" for hours in range(8, 18) for minutes in [0, 15, 30, 45]]
+    if hourly_weights is None:
+        return pd.Categorical.from_codes(rng.integers(0, len(slots), size=size), categories=slots)
+    
+    slot_weights = np.repeat(np.asarray(hourly_weights, dtype=float), 4)
+    codes = rng.choice(len(slots), size=size, p=slot_weights / slot_weights.sum())
+    return pd.Categorical.from_codes(codes, categories=slots)
+
+def zipf_weights(count, exponent):
+    """Probability of picking each of count items when popularity ~ 1 / rank**exponent"""
+    if not exponent:
+        return None
+    weights = 1.0 / np.arange(1, count + 1) ** exponent
+    return weights / weights.sum()
+
+def random_patient_array(rng, patient_ids, size, repeat_patient_share=0.0, repeat_patient_pool=0.0):
+    """Draw patients, sending repeat_patient_share of bookings to a small pool of returning patients"""
+    codes = rng.integers(0, len(patient_ids), size=size)
+    if repeat_patient_share and repeat_patient_pool:
+        pool_size = max(1, int(len(patient_ids) * repeat_patient_pool))
+        returning = rng.random(size=size) < repeat_patient_share
+        codes[returning] = rng.integers(0, pool_size, size=returning.sum())
+    return pd.Categorical.from_codes(codes, categories=patient_ids)
+
+def resolve_workload_profile(profile):
+    """Accept a profile name, a dict of overrides, or None and return a complete profile dict"""
+    if profile is None:
+        return dict(WORKLOAD_PROFILES["uniform"])
+    if isinstance(profile, str):
+        if profile not in WORKLOAD_PROFILES:
+            raise ValueError(f"Unknown workload profile: {profile} (choose from {', '.join(WORKLOAD_PROFILES)})")
+        return dict(WORKLOAD_PROFILES[profile])
+    return {**WORKLOAD_PROFILES["uniform"], **profile}
+
+def random_choice_array(rng, values, size, p=None):
+    """Draw size values from a small domain as a pandas Categorical (no per-row string objects)"""
+    return pd.Categorical.from_codes(rng.choice(len(values), size=size, p=p), categories=values)
+
 # Generate provider data
-def generate_provider_data():
+def generate_provider_data(num_providers=NUM_PROVIDERS):
     specialties = [
         "Family Medicine", "Internal Medicine", "Pediatrics", "Cardiology",
         "Dermatology", "Neurology", "Psychiatry", "Orthopedics", 
@@ -47,7 +260,7 @@ def generate_provider_data():
     
     providers = []
     
-    for i in range(1, NUM_PROVIDERS + 1):
+    for i in range(1, num_providers + 1):
         provider_id = f"PROV{i:04d}"
         first_name = f"Provider{i}"
         last_name = f"Doctor{i}"
@@ -74,10 +287,10 @@ def generate_provider_data():
     return pd.DataFrame(providers)
 
 # Generate patient data
-def generate_patient_data():
+def generate_patient_data(num_patients=NUM_PATIENTS):
     patients = []
     
-    for i in range(1, NUM_PATIENTS + 1):
+    for i in range(1, num_patients + 1):
         patient_id = f"PAT{i:06d}"
         age = random.randint(18, 85)
         gender = random.choice(["Male", "Female", "Other"])
@@ -96,19 +309,13 @@ def generate_patient_data():
 
 # Generate appointment logs
 def generate_appointment_logs(providers_df, patients_df):
-    appointment_statuses = ["Completed", "Cancelled", "No-show", "Rescheduled"]
-    appointment_types = ["Initial Consultation", "Follow-up", "Urgent Care", "Specialist Referral", "Medication Review"]
-    device_types = ["Mobile Phone", "Tablet", "Laptop", "Desktop"]
-    operating_systems = ["iOS", "Android", "Windows", "macOS", "Linux"]
-    browsers = ["Chrome", "Safari", "Firefox", "Edge"]
-    
     appointments = []
     
     provider_ids = providers_df["provider_id"].tolist()
     patient_ids = patients_df["patient_id"].tolist()
     
     for i in range(NUM_APPOINTMENTS):
-        appointment_id = str(uuid.uuid4())
+        appointment_id = str(uuid.UUID(int=random.getrandbits(128), version=4))
         provider_id = random.choice(provider_ids)
         patient_id = random.choice(patient_ids)
         
@@ -122,25 +329,22 @@ def generate_appointment_logs(providers_df, patients_df):
         duration_minutes = random.randint(10, 60)
         
         status = random.choices(
-            appointment_statuses, 
-            weights=[0.75, 0.1, 0.05, 0.1],  # 75% completed, 10% cancelled, 5% no-show, 10% rescheduled
+            APPOINTMENT_STATUSES, 
+            weights=APPOINTMENT_STATUS_WEIGHTS,
             k=1
         )[0]
         
         # Device and connection info
-        device_type = random.choice(device_types)
-        os = random.choice(operating_systems)
-        browser = random.choice(browsers)
-        connection_quality = random.choice(["Excellent", "Good", "Fair", "Poor"])
+        device_type = random.choice(DEVICE_TYPES)
+        os = random.choice(OPERATING_SYSTEMS)
+        browser = random.choice(BROWSERS)
+        connection_quality = random.choice(CONNECTION_QUALITIES)
         
         # Technical issues
-        had_technical_issues = random.random() < 0.15  # 15% have technical issues
+        had_technical_issues = random.random() < TECHNICAL_ISSUE_RATE
         technical_issue_type = None
         if had_technical_issues:
-            technical_issue_type = random.choice([
-                "Audio Problems", "Video Problems", "Connection Lost", 
-                "Login Issues", "App Crash", "Browser Compatibility"
-            ])
+            technical_issue_type = random.choice(TECHNICAL_ISSUE_TYPES)
         
         appointment = {
             "appointment_id": appointment_id,
@@ -148,7 +352,7 @@ def generate_appointment_logs(providers_df, patients_df):
             "patient_id": patient_id,
             "appointment_date": appointment_date.strftime("%Y-%m-%d"),
             "scheduled_time": scheduled_time,
-            "appointment_type": random.choice(appointment_types),
+            "appointment_type": random.choice(APPOINTMENT_TYPES),
             "status": status,
             "wait_time_minutes": wait_time_minutes if status != "No-show" else None,
             "duration_minutes": duration_minutes if status == "Completed" else None,
@@ -165,13 +369,77 @@ def generate_appointment_logs(providers_df, patients_df):
     
     return pd.DataFrame(appointments)
 
+# Generate appointment logs with whole-column NumPy draws (same schema as generate_appointment_logs)
+def generate_appointment_logs_vectorized(providers_df, patients_df, num_appointments=NUM_APPOINTMENTS, rng=None,
+                                         profile=None, start_date=START_DATE, end_date=END_DATE):
+    """Generate appointment logs column-wise; suitable for tens of millions of rows"""
+    if rng is None:
+        rng = np.random.default_rng()
+    profile = resolve_workload_profile(profile)
+    
+    provider_ids = providers_df["provider_id"].drop_duplicates().tolist()
+    patient_ids = patients_df["patient_id"].drop_duplicates().tolist()
+    n = num_appointments
+    
+    # Low-cardinality columns are built as Categoricals: codes are drawn as integer arrays
+    # and each distinct string exists once, which keeps 100M-row frames cheap to build and hold
+    appointment_ids = random_uuid4_array(rng, n)
+    provider_id = random_choice_array(
+        rng, provider_ids, n, p=zipf_weights(len(provider_ids), profile["provider_zipf_exponent"])
+    )
+    patient_id = random_patient_array(
+        rng, patient_ids, n, profile["repeat_patient_share"], profile["repeat_patient_pool"]
+    )
+    
+    appointment_date = random_date_array(
+        rng, start_date, end_date, n, profile["weekday_weights"], profile["monthly_weights"]
+    )
+    scheduled_time = random_time_array(rng, n, profile["hourly_weights"])
+    
+    # Wait time (0-30 minutes) and duration (10-60 minutes)
+    wait_time_minutes = rng.integers(0, 31, size=n).astype(float)
+    duration_minutes = rng.integers(10, 61, size=n).astype(float)
+    
+    status = random_choice_array(rng, APPOINTMENT_STATUSES, n, p=APPOINTMENT_STATUS_WEIGHTS)
+    
+    # Conditional nulls: no wait time for no-shows, no duration unless completed
+    wait_time_minutes[status == "No-show"] = np.nan
+    duration_minutes[status != "Completed"] = np.nan
+    
+    # Technical issues (code -1 is a null in a Categorical)
+    had_technical_issues = rng.random(size=n) < TECHNICAL_ISSUE_RATE
+    issue_codes = rng.integers(0, len(TECHNICAL_ISSUE_TYPES), size=n)
+    issue_codes[~had_technical_issues] = -1
+    technical_issue_type = pd.Categorical.from_codes(issue_codes, categories=TECHNICAL_ISSUE_TYPES)
+    
+    timestamp = appointment_date.astype("datetime64[m]") + rng.integers(0, 1441, size=n)
+    
+    return pd.DataFrame({
+        "appointment_id": appointment_ids,
+        "provider_id": provider_id,
+        "patient_id": patient_id,
+        "appointment_date": categorical_date_array(appointment_date),
+        "scheduled_time": scheduled_time,
+        "appointment_type": random_choice_array(rng, APPOINTMENT_TYPES, n),
+        "status": status,
+        "wait_time_minutes": wait_time_minutes,
+        "duration_minutes": duration_minutes,
+        "device_type": random_choice_array(rng, DEVICE_TYPES, n),
+        "operating_system": random_choice_array(rng, OPERATING_SYSTEMS, n),
+        "browser": random_choice_array(rng, BROWSERS, n),
+        "connection_quality": random_choice_array(rng, CONNECTION_QUALITIES, n),
+        "had_technical_issues": had_technical_issues,
+        "technical_issue_type": technical_issue_type,
+        "timestamp": format_datetime_array(timestamp)
+    })
+
 # Generate patient feedback
-def generate_patient_feedback(appointment_logs_df):
+def generate_patient_feedback(appointment_logs_df, num_feedback=NUM_FEEDBACK):
     # Only generate feedback for completed appointments
     completed_appointments = appointment_logs_df[appointment_logs_df["status"] == "Completed"]
     
     # Randomly select appointments to have feedback (not all appointments get feedback)
-    feedback_appointments = completed_appointments.sample(min(NUM_FEEDBACK, len(completed_appointments)))
+    feedback_appointments = completed_appointments.sample(min(num_feedback, len(completed_appointments)))
     
     feedback_data = []
     
@@ -181,11 +449,11 @@ def generate_patient_feedback(appointment_logs_df):
         feedback_date = appointment_date + timedelta(days=random.randint(1, 3))
         
         # Generate ratings (1-5 scale)
-        provider_rating = max(1, min(5, int(np.random.normal(4.2, 0.8))))
-        ease_of_use_rating = max(1, min(5, int(np.random.normal(3.8, 1.0))))
-        audio_quality_rating = max(1, min(5, int(np.random.normal(3.9, 0.9))))
-        video_quality_rating = max(1, min(5, int(np.random.normal(3.7, 1.1))))
-        overall_satisfaction = max(1, min(5, int(np.random.normal(4.0, 0.9))))
+        provider_rating = max(1, min(5, int(np.random.normal(*FEEDBACK_RATING_DISTRIBUTIONS["provider_rating"]))))
+        ease_of_use_rating = max(1, min(5, int(np.random.normal(*FEEDBACK_RATING_DISTRIBUTIONS["ease_of_use_rating"]))))
+        audio_quality_rating = max(1, min(5, int(np.random.normal(*FEEDBACK_RATING_DISTRIBUTIONS["audio_quality_rating"]))))
+        video_quality_rating = max(1, min(5, int(np.random.normal(*FEEDBACK_RATING_DISTRIBUTIONS["video_quality_rating"]))))
+        overall_satisfaction = max(1, min(5, int(np.random.normal(*FEEDBACK_RATING_DISTRIBUTIONS["overall_satisfaction"]))))
         
         # Lower ratings if there were technical issues
         if appointment["had_technical_issues"]:
@@ -197,24 +465,12 @@ def generate_patient_feedback(appointment_logs_df):
         # Generate comments based on ratings
         comments = []
         if overall_satisfaction >= 4:
-            comments.append(random.choice([
-                "Great experience overall!",
-                "The doctor was very helpful and professional.",
-                "I appreciate the convenience of telemedicine.",
-                "Much better than going to a physical office.",
-                "Will definitely use this service again."
-            ]))
+            comments.append(random.choice(POSITIVE_FEEDBACK_COMMENTS))
         elif overall_satisfaction <= 2:
-            comments.append(random.choice([
-                "The connection was poor and made it difficult to communicate.",
-                "I had trouble logging in and wasted time.",
-                "The doctor seemed rushed and didn't address all my concerns.",
-                "The app kept crashing during my appointment.",
-                "I prefer in-person visits for better care."
-            ]))
+            comments.append(random.choice(NEGATIVE_FEEDBACK_COMMENTS))
         
         feedback = {
-            "feedback_id": str(uuid.uuid4()),
+            "feedback_id": str(uuid.UUID(int=random.getrandbits(128), version=4)),
             "appointment_id": appointment["appointment_id"],
             "patient_id": appointment["patient_id"],
             "provider_id": appointment["provider_id"],
@@ -233,8 +489,71 @@ def generate_patient_feedback(appointment_logs_df):
     
     return pd.DataFrame(feedback_data)
 
+# Generate patient feedback with array operations (same schema as generate_patient_feedback)
+def generate_patient_feedback_vectorized(appointment_logs_df, num_feedback=NUM_FEEDBACK, rng=None):
+    """Generate feedback for a random sample of completed appointments without iterating rows"""
+    if rng is None:
+        rng = np.random.default_rng()
+    
+    # Only generate feedback for completed appointments, for a random subset of them
+    completed_positions = np.flatnonzero((appointment_logs_df["status"] == "Completed").to_numpy())
+    n = min(num_feedback, len(completed_positions))
+    feedback_appointments = appointment_logs_df[[
+        "appointment_id", "patient_id", "provider_id", "appointment_date", "had_technical_issues"
+    ]].iloc[rng.choice(completed_positions, size=n, replace=False)]
+    
+    # Feedback 1-3 days after the appointment
+    appointment_date = pd.to_datetime(feedback_appointments["appointment_date"], format="%Y-%m-%d") \
+        .to_numpy().astype("datetime64[D]")
+    feedback_date = appointment_date + rng.integers(1, 4, size=n)
+    
+    # Ratings (1-5 scale): truncate like int(), then clamp
+    ratings = {
+        field: np.clip(rng.normal(mean, std, size=n).astype(np.int64), 1, 5)
+        for field, (mean, std) in FEEDBACK_RATING_DISTRIBUTIONS.items()
+    }
+    
+    # Lower ratings if there were technical issues
+    had_technical_issues = feedback_appointments["had_technical_issues"].to_numpy(dtype=bool)
+    for field in TECHNICAL_ISSUE_PENALIZED_RATINGS:
+        penalty = rng.integers(1, 3, size=n) * had_technical_issues
+        ratings[field] = np.maximum(1, ratings[field] - penalty)
+    
+    # Comments based on overall satisfaction: codes index POSITIVE + NEGATIVE comments, -1 is no comment
+    overall_satisfaction = ratings["overall_satisfaction"]
+    comment_codes = np.full(n, -1, dtype=np.int64)
+    positive = overall_satisfaction >= 4
+    negative = overall_satisfaction <= 2
+    comment_codes[positive] = rng.integers(0, len(POSITIVE_FEEDBACK_COMMENTS), size=positive.sum())
+    comment_codes[negative] = len(POSITIVE_FEEDBACK_COMMENTS) + \
+        rng.integers(0, len(NEGATIVE_FEEDBACK_COMMENTS), size=negative.sum())
+    
+    return pd.DataFrame({
+        "feedback_id": random_uuid4_array(rng, n),
+        "appointment_id": feedback_appointments["appointment_id"].array,
+        "patient_id": feedback_appointments["patient_id"].array,
+        "provider_id": feedback_appointments["provider_id"].array,
+        "feedback_date": categorical_date_array(feedback_date),
+        "provider_rating": ratings["provider_rating"],
+        "ease_of_use_rating": ratings["ease_of_use_rating"],
+        "audio_quality_rating": ratings["audio_quality_rating"],
+        "video_quality_rating": ratings["video_quality_rating"],
+        "overall_satisfaction": overall_satisfaction,
+        "would_recommend": positive,
+        "comments": pd.Categorical.from_codes(
+            comment_codes, categories=POSITIVE_FEEDBACK_COMMENTS + NEGATIVE_FEEDBACK_COMMENTS
+        ),
+        "timestamp": categorical_date_array(feedback_date, suffix=" 00:00:00")
+    })
+
 # Main function to generate all data
-def generate_all_data():
+def generate_all_data(vectorized=False, output_format="json", profile=None):
+    """
+    Generate and save all data sources.
+    profile selects a WORKLOAD_PROFILES entry (or a dict of overrides) and implies vectorized=True.
+    output_format="json" writes one JSON file per appointment/feedback record;
+    output_format="packed" writes compressed NDJSON segments plus an id -> offset index instead.
+    """
     print("Generating provider data...")
     providers_df = generate_provider_data()
     
@@ -242,10 +561,21 @@ def generate_all_data():
     patients_df = generate_patient_data()
     
     print("Generating appointment logs...")
-    appointment_logs_df = generate_appointment_logs(providers_df, patients_df)
+    if profile is not None:
+        vectorized = True
+    if vectorized:
+        rng = np.random.default_rng(RANDOM_SEED)
+        appointment_logs_df = generate_appointment_logs_vectorized(
+            providers_df, patients_df, rng=rng, profile=profile
+        )
+    else:
+        appointment_logs_df = generate_appointment_logs(providers_df, patients_df)
     
     print("Generating patient feedback...")
-    feedback_df = generate_patient_feedback(appointment_logs_df)
+    if vectorized:
+        feedback_df = generate_patient_feedback_vectorized(appointment_logs_df, rng=rng)
+    else:
+        feedback_df = generate_patient_feedback(appointment_logs_df)
     
     # Create directories if they don't exist
     os.makedirs("data_sources/provider_data", exist_ok=True)
@@ -256,22 +586,30 @@ def generate_all_data():
     providers_df.to_csv("data_sources/provider_data/providers.csv", index=False)
     patients_df.to_csv("data_sources/provider_data/patients.csv", index=False)
     
-    # Save appointment logs as JSON files (simulating streaming data)
-    for _, appointment in appointment_logs_df.iterrows():
-        appointment_date = appointment["appointment_date"]
-        filename = f"data_sources/appointment_logs/appointment_{appointment['appointment_id']}.json"
-        with open(filename, 'w') as f:
-            json.dump(appointment.to_dict(), f, indent=2)
+    # Save appointment logs as JSON records (simulating streaming data)
+    if output_format == "packed":
+        PackedRecordWriter("data_sources/appointment_logs", "appointment", "appointment_id") \
+            .write(appointment_logs_df).close()
+    else:
+        for _, appointment in appointment_logs_df.iterrows():
+            appointment_date = appointment["appointment_date"]
+            filename = f"data_sources/appointment_logs/appointment_{appointment['appointment_id']}.json"
+            with open(filename, 'w') as f:
+                json.dump(appointment.to_dict(), f, indent=2)
     
     # Save appointment logs as a single file for easier processing
     appointment_logs_df.to_csv("data_sources/appointment_logs/appointment_logs.csv", index=False)
     
-    # Save patient feedback as JSON files (simulating S3 data)
-    for _, feedback in feedback_df.iterrows():
-        feedback_date = feedback["feedback_date"]
-        filename = f"data_sources/patient_feedback/feedback_{feedback['feedback_id']}.json"
-        with open(filename, 'w') as f:
-            json.dump(feedback.to_dict(), f, indent=2)
+    # Save patient feedback as JSON records (simulating S3 data)
+    if output_format == "packed":
+        PackedRecordWriter("data_sources/patient_feedback", "feedback", "feedback_id") \
+            .write(feedback_df).close()
+    else:
+        for _, feedback in feedback_df.iterrows():
+            feedback_date = feedback["feedback_date"]
+            filename = f"data_sources/patient_feedback/feedback_{feedback['feedback_id']}.json"
+            with open(filename, 'w') as f:
+                json.dump(feedback.to_dict(), f, indent=2)
     
     # Save feedback as a single file for easier processing
     feedback_df.to_csv("data_sources/patient_feedback/patient_feedback.csv", index=False)
@@ -282,5 +620,445 @@ def generate_all_data():
     print(f"Generated {len(appointment_logs_df)} appointment logs")
     print(f"Generated {len(feedback_df)} patient feedback records")
 
+# Write appointment logs and their feedback to open CSV files in fixed-size chunks
+def write_appointment_chunks(appointments_file, feedback_file, providers_df, patients_df,
+                             num_appointments, num_feedback, chunk_size, rng, label="", profile=None):
+    """Generate and flush chunk_size appointments at a time; returns (appointments, feedback) written"""
+    appointments_written = 0
+    feedback_written = 0
+    
+    for chunk_start in range(0, num_appointments, chunk_size):
+        chunk_rows = min(chunk_size, num_appointments - chunk_start)
+        
+        appointment_logs_df = generate_appointment_logs_vectorized(
+            providers_df, patients_df, num_appointments=chunk_rows, rng=rng, profile=profile
+        )
+        
+        # Spread the feedback target across chunks in proportion to rows generated so far
+        feedback_quota = (num_feedback * (chunk_start + chunk_rows) // num_appointments
+                          - num_feedback * chunk_start // num_appointments)
+        feedback_df = generate_patient_feedback_vectorized(appointment_logs_df, num_feedback=feedback_quota, rng=rng)
+        
+        appointment_logs_df.to_csv(appointments_file, header=chunk_start == 0, index=False)
+        if not feedback_df.empty:
+            feedback_df.to_csv(feedback_file, header=feedback_written == 0, index=False)
+        
+        appointments_written += len(appointment_logs_df)
+        feedback_written += len(feedback_df)
+        print(f"{label}Flushed {appointments_written}/{num_appointments} appointment logs, "
+              f"{feedback_written} feedback records")
+    
+    return appointments_written, feedback_written
+
+# Streaming variant of generate_all_data: memory stays bounded by chunk_size, not by row count
+def generate_all_data_streaming(num_appointments=NUM_APPOINTMENTS, num_feedback=NUM_FEEDBACK,
+                                chunk_size=STREAM_CHUNK_SIZE, rng=None, profile=None):
+    """Generate appointment and feedback CSVs chunk by chunk, flushing each chunk to disk"""
+    if rng is None:
+        rng = np.random.default_rng(RANDOM_SEED)
+    
+    print("Generating provider data...")
+    providers_df = generate_provider_data()
+    
+    print("Generating patient data...")
+    patients_df = generate_patient_data()
+    
+    os.makedirs("data_sources/provider_data", exist_ok=True)
+    os.makedirs("data_sources/patient_feedback", exist_ok=True)
+    os.makedirs("data_sources/appointment_logs", exist_ok=True)
+    
+    providers_df.to_csv("data_sources/provider_data/providers.csv", index=False)
+    patients_df.to_csv("data_sources/provider_data/patients.csv", index=False)
+    
+    with open("data_sources/appointment_logs/appointment_logs.csv", "w", newline="") as appointments_file, \
+         open("data_sources/patient_feedback/patient_feedback.csv", "w", newline="") as feedback_file:
+        appointments_written, feedback_written = write_appointment_chunks(
+            appointments_file, feedback_file, providers_df, patients_df,
+            num_appointments, num_feedback, chunk_size, rng, profile=profile
+        )
+    
+    print("Streaming data generation complete!")
+    print(f"Generated {len(providers_df)} providers")
+    print(f"Generated {len(patients_df)} patients")
+    print(f"Generated {appointments_written} appointment logs")
+    print(f"Generated {feedback_written} patient feedback records")
+
+# Split a total row count into num_shards contiguous, near-equal parts
+def split_rows(total, num_shards):
+    """Return per-shard row counts that sum to total"""
+    base, remainder = divmod(total, num_shards)
+    return [base + (1 if shard < remainder else 0) for shard in range(num_shards)]
+
+# Generate one shard of appointments/feedback in a worker process
+def generate_shard(shard):
+    """Worker entry point: write one shard's part files from its own derived seed"""
+    rng = np.random.default_rng(shard["seed_sequence"])
+    
+    with open(shard["appointments_path"], "w", newline="") as appointments_file, \
+         open(shard["feedback_path"], "w", newline="") as feedback_file:
+        appointments_written, feedback_written = write_appointment_chunks(
+            appointments_file, feedback_file, shard["providers_df"], shard["patients_df"],
+            shard["num_appointments"], shard["num_feedback"], shard["chunk_size"], rng,
+            label=f"[shard {shard['shard_index']}] ", profile=shard["profile"]
+        )
+    
+    return {
+        "shard_index": shard["shard_index"],
+        "appointments_path": shard["appointments_path"],
+        "feedback_path": shard["feedback_path"],
+        "appointments": appointments_written,
+        "feedback": feedback_written
+    }
+
+# Concatenate CSV part files in order, keeping only the first header
+def merge_csv_parts(part_paths, output_path):
+    """Merge CSV part files byte-for-byte into output_path and remove the parts"""
+    header_written = False
+    with open(output_path, "w", newline="") as output_file:
+        for part_path in part_paths:
+            with open(part_path, "r", newline="") as part_file:
+                header = part_file.readline()
+                if header and not header_written:
+                    output_file.write(header)
+                    header_written = True
+                shutil.copyfileobj(part_file, output_file)
+            os.remove(part_path)
+
+# Deterministic multi-process generation: one derived seed per shard
+def generate_sharded_data(num_shards, seed=RANDOM_SEED, processes=None,
+                          num_appointments=NUM_APPOINTMENTS, num_feedback=NUM_FEEDBACK,
+                          chunk_size=STREAM_CHUNK_SIZE, merge=True, profile=None,
+                          num_providers=NUM_PROVIDERS, num_patients=NUM_PATIENTS):
+    """
+    Generate the dataset across a process pool.
+    Output is bit-for-bit reproducible for a given seed, shard count and chunk size,
+    independent of the number of worker processes.
+    Returns a summary with entity counts and the row count of every file written.
+    """
+    # Provider and patient reference data is small; build it once from the base seed
+    random.seed(seed)
+    print("Generating provider data...")
+    providers_df = generate_provider_data(num_providers)
+    
+    print("Generating patient data...")
+    patients_df = generate_patient_data(num_patients)
+    
+    os.makedirs("data_sources/provider_data", exist_ok=True)
+    os.makedirs("data_sources/patient_feedback", exist_ok=True)
+    os.makedirs("data_sources/appointment_logs", exist_ok=True)
+    
+    providers_df.to_csv("data_sources/provider_data/providers.csv", index=False)
+    patients_df.to_csv("data_sources/provider_data/patients.csv", index=False)
+    
+    # Each shard gets an independent child seed derived from (seed, shard_index)
+    seed_sequences = np.random.SeedSequence(seed).spawn(num_shards)
+    appointment_counts = split_rows(num_appointments, num_shards)
+    
+    shards = []
+    feedback_assigned = 0
+    appointments_assigned = 0
+    for shard_index in range(num_shards):
+        appointments_assigned += appointment_counts[shard_index]
+        feedback_target = num_feedback * appointments_assigned // max(num_appointments, 1)
+        shards.append({
+            "shard_index": shard_index,
+            "seed_sequence": seed_sequences[shard_index],
+            "providers_df": providers_df[["provider_id"]],
+            "patients_df": patients_df[["patient_id"]],
+            "num_appointments": appointment_counts[shard_index],
+            "num_feedback": feedback_target - feedback_assigned,
+            "chunk_size": chunk_size,
+            "profile": resolve_workload_profile(profile),
+            "appointments_path": f"data_sources/appointment_logs/appointment_logs_part-{shard_index:05d}.csv",
+            "feedback_path": f"data_sources/patient_feedback/patient_feedback_part-{shard_index:05d}.csv"
+        })
+        feedback_assigned = feedback_target
+    
+    print(f"Generating {num_appointments} appointment logs in {num_shards} shards...")
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        results = list(executor.map(generate_shard, shards))
+    
+    summary = {
+        "providers": len(providers_df),
+        "patients": len(patients_df),
+        "appointments": sum(r["appointments"] for r in results),
+        "feedback": sum(r["feedback"] for r in results),
+        "row_counts": {
+            "data_sources/provider_data/providers.csv": len(providers_df),
+            "data_sources/provider_data/patients.csv": len(patients_df)
+        }
+    }
+    
+    if merge:
+        print("Merging shard outputs...")
+        merge_csv_parts([r["appointments_path"] for r in results],
+                        "data_sources/appointment_logs/appointment_logs.csv")
+        merge_csv_parts([r["feedback_path"] for r in results],
+                        "data_sources/patient_feedback/patient_feedback.csv")
+        summary["row_counts"]["data_sources/appointment_logs/appointment_logs.csv"] = summary["appointments"]
+        summary["row_counts"]["data_sources/patient_feedback/patient_feedback.csv"] = summary["feedback"]
+    else:
+        for r in results:
+            summary["row_counts"][r["appointments_path"]] = r["appointments"]
+            summary["row_counts"][r["feedback_path"]] = r["feedback"]
+    
+    print("Sharded data generation complete!")
+    print(f"Generated {summary['providers']} providers")
+    print(f"Generated {summary['patients']} patients")
+    print(f"Generated {summary['appointments']} appointment logs")
+    print(f"Generated {summary['feedback']} patient feedback records")
+    return summary
+
+# TPC-style scale factors: SF1 is the default dataset, SF1000 is production-like
+def scale_factor_counts(scale_factor):
+    """Entity counts for a scale factor, all four scaled by the same ratio"""
+    return {
+        "num_providers": max(1, round(NUM_PROVIDERS * scale_factor)),
+        "num_patients": max(1, round(NUM_PATIENTS * scale_factor)),
+        "num_appointments": max(1, round(NUM_APPOINTMENTS * scale_factor)),
+        "num_feedback": round(NUM_FEEDBACK * scale_factor)
+    }
+
+def file_sha256(path):
+    """SHA-256 of a file, read in 1 MB blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def generate_scale_factor_dataset(scale_factor, seed=RANDOM_SEED, num_shards=DEFAULT_SHARDS, processes=None,
+                                  chunk_size=STREAM_CHUNK_SIZE, profile=None):
+    """Generate a reproducible benchmark dataset and write a manifest of row counts and checksums"""
+    counts = scale_factor_counts(scale_factor)
+    print(f"Generating scale factor {scale_factor} dataset: {counts}")
+    
+    summary = generate_sharded_data(
+        num_shards, seed=seed, processes=processes, chunk_size=chunk_size, profile=profile, **counts
+    )
+    
+    print("Computing checksums...")
+    manifest = {
+        "scale_factor": scale_factor,
+        "seed": seed,
+        "shards": num_shards,
+        "chunk_size": chunk_size,
+        "profile": profile if isinstance(profile, (str, type(None))) else resolve_workload_profile(profile),
+        "entity_counts": {
+            "providers": summary["providers"],
+            "patients": summary["patients"],
+            "appointments": summary["appointments"],
+            "feedback": summary["feedback"]
+        },
+        "files": {
+            path: {"rows": rows, "sha256": file_sha256(path)}
+            for path, rows in sorted(summary["row_counts"].items())
+        }
+    }
+    
+    with open(MANIFEST_FILE, "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Wrote dataset manifest to {MANIFEST_FILE}")
+    return manifest
+
+# Incremental deltas: one directory of change files per day on top of the current snapshot
+def random_change_times(rng, day, size, before_minutes=1440):
+    """'YYYY-MM-DD HH:MM:SS' timestamps at random minutes during day, before minute before_minutes (scalar or per row)"""
+    return format_datetime_array(np.datetime64(day, "m") + rng.integers(0, before_minutes, size=size))
+
+def minutes_of_day(times):
+    """'HH:MM:SS' strings -> minutes since midnight"""
+    return np.array([int(t.split(":")[0]) * 60 + int(t.split(":")[1]) for t in times], dtype=np.int64)
+
+def generate_daily_deltas(num_days, start_day=None, seed=RANDOM_SEED, rates=None, profile=None):
+    """
+    Emit num_days of daily change sets on top of the existing CSV snapshot, each under
+    DELTA_DIR/YYYY-MM-DD/:
+      appointments.csv                 new appointments booked for that day
+      appointment_status_changes.csv   full updated rows of appointments not held yet (dated that day
+                                       or later, without feedback) moved to Cancelled/Rescheduled
+                                       before their scheduled time, plus previous_status and changed_at
+      feedback.csv                     late-arriving feedback for completed appointments
+      provider_changes.csv             full updated provider rows, plus changed_at
+    Changes accumulate in memory, so later days update rows created or changed by earlier ones.
+    Only appointments inside the late feedback window can still change, so older rows are dropped
+    from the working state and each day costs the same however many days are generated.
+    The snapshot files themselves are left untouched.
+    """
+    rates = {**DEFAULT_DELTA_RATES, **(rates or {})}
+    rng = np.random.default_rng(seed)
+    
+    print("Loading base snapshot...")
+    providers_df = pd.read_csv("data_sources/provider_data/providers.csv")
+    patients_df = pd.read_csv("data_sources/provider_data/patients.csv", usecols=["patient_id"])
+    appointments_df = pd.read_csv("data_sources/appointment_logs/appointment_logs.csv")
+    feedback_ids = pd.read_csv("data_sources/patient_feedback/patient_feedback.csv", usecols=["appointment_id"])
+    
+    # Per-row state kept as arrays so daily eligibility checks don't re-parse dates
+    appointment_days = pd.to_datetime(appointments_df["appointment_date"], format="%Y-%m-%d") \
+        .to_numpy().astype("datetime64[D]")
+    has_feedback = appointments_df["appointment_id"].isin(feedback_ids["appointment_id"]).to_numpy().copy()
+    del feedback_ids
+    
+    if start_day is None:
+        start_day = appointment_days.max() + 1
+    start_day = np.datetime64(start_day, "D")
+    
+    new_per_day = rates["new_appointments_per_day"]
+    if new_per_day is None:
+        span_days = (appointment_days.max() - appointment_days.min()).astype(np.int64) + 1
+        new_per_day = len(appointments_df) / span_days
+    
+    window = rates["late_feedback_window_days"]
+    recent = appointment_days >= start_day - window
+    appointments_df = appointments_df[recent].reset_index(drop=True)
+    appointment_days, has_feedback = appointment_days[recent], has_feedback[recent]
+    
+    manifest = {"start_day": str(start_day), "num_days": num_days, "seed": seed,
+                "profile": profile if isinstance(profile, (str, type(None))) else resolve_workload_profile(profile),
+                "rates": {**rates, "new_appointments_per_day": float(new_per_day)}, "days": {}}
+    
+    for day in start_day + np.arange(num_days):
+        day_dir = os.path.join(DELTA_DIR, str(day))
+        os.makedirs(day_dir, exist_ok=True)
+        day_start = day.astype(datetime)
+        
+        # New appointments booked for this day
+        new_df = generate_appointment_logs_vectorized(
+            providers_df[providers_df["active"]], patients_df, num_appointments=rng.poisson(new_per_day),
+            rng=rng, profile=profile, start_date=datetime.combine(day_start, datetime.min.time()),
+            end_date=datetime.combine(day_start + timedelta(days=1), datetime.min.time())
+        )
+        
+        # The day's bookings join the working state, so they can be cancelled before they are held
+        appointments_df = pd.concat([appointments_df, new_df.astype(object)], ignore_index=True)
+        appointment_days = np.concatenate([appointment_days, np.full(len(new_df), day)])
+        has_feedback = np.concatenate([has_feedback, np.zeros(len(new_df), dtype=bool)])
+        
+        # Status changes to appointments not held yet: dated today or later, not already
+        # cancelled/rescheduled and without feedback
+        live = ~appointments_df["status"].isin(DELTA_STATUS_CHANGE_STATUSES).to_numpy()
+        candidates = np.flatnonzero(live & ~has_feedback & (appointment_days >= day))
+        num_changes = min(len(candidates), rng.poisson(rates["status_change_rate"] * new_per_day))
+        changed = np.sort(rng.choice(candidates, size=num_changes, replace=False))
+        
+        changes_df = appointments_df.iloc[changed].copy()
+        changes_df.insert(len(changes_df.columns), "previous_status", changes_df["status"].to_numpy())
+        changes_df["status"] = np.asarray(DELTA_STATUS_CHANGE_STATUSES)[
+            rng.integers(0, len(DELTA_STATUS_CHANGE_STATUSES), size=num_changes)]
+        changes_df["duration_minutes"] = np.nan  # Only completed appointments have a duration
+        # Before the scheduled time on the appointment's own day, any time on earlier days
+        before = np.where(appointment_days[changed] == day,
+                          minutes_of_day(changes_df["scheduled_time"].to_numpy(dtype=str)), 1440)
+        changes_df["changed_at"] = random_change_times(rng, day, num_changes, before)
+        
+        # Late feedback for completed appointments in the window that have none yet; these are
+        # all dated before today, so none of them was changed above
+        eligible = np.flatnonzero(
+            (appointments_df["status"] == "Completed").to_numpy() & ~has_feedback
+            & (appointment_days < day) & (appointment_days >= day - window)
+        )
+        num_feedback = min(len(eligible), rng.poisson(rates["late_feedback_rate"] * new_per_day))
+        late_df = generate_patient_feedback_vectorized(appointments_df.iloc[eligible], num_feedback, rng=rng)
+        late_df["feedback_date"] = str(day)
+        late_df["timestamp"] = random_change_times(rng, day, len(late_df))
+        
+        # Provider attribute changes: rate adjustments, new availability, (de)activation
+        num_provider_changes = rng.binomial(len(providers_df), rates["provider_change_rate"])
+        provider_rows = np.sort(rng.choice(len(providers_df), size=num_provider_changes, replace=False))
+        provider_changes_df = providers_df.iloc[provider_rows].copy()
+        provider_changes_df["hourly_rate"] = np.round(
+            provider_changes_df["hourly_rate"].to_numpy() * rng.uniform(0.95, 1.1, size=num_provider_changes), 2)
+        provider_changes_df["available_hours"] = rng.integers(20, 41, size=num_provider_changes)
+        toggled = rng.random(size=num_provider_changes) < 0.2
+        provider_changes_df["active"] = provider_changes_df["active"].to_numpy() ^ toggled
+        provider_changes_df["changed_at"] = random_change_times(rng, day, num_provider_changes)
+        
+        new_df.to_csv(os.path.join(day_dir, "appointments.csv"), index=False)
+        changes_df.to_csv(os.path.join(day_dir, "appointment_status_changes.csv"), index=False)
+        late_df.to_csv(os.path.join(day_dir, "feedback.csv"), index=False)
+        provider_changes_df.to_csv(os.path.join(day_dir, "provider_changes.csv"), index=False)
+        
+        # Apply the day's changes to the in-memory snapshot
+        status_column = appointments_df.columns.get_loc("status")
+        duration_column = appointments_df.columns.get_loc("duration_minutes")
+        appointments_df.iloc[changed, status_column] = changes_df["status"].to_numpy()
+        appointments_df.iloc[changed, duration_column] = np.nan
+        has_feedback[eligible[np.isin(appointments_df["appointment_id"].to_numpy()[eligible],
+                                      late_df["appointment_id"].to_numpy())]] = True
+        providers_df.iloc[provider_rows] = provider_changes_df[providers_df.columns].to_numpy()
+        
+        # Rows that leave the late feedback window can no longer change
+        recent = appointment_days >= day + 1 - window
+        if not recent.all():
+            appointments_df = appointments_df[recent].reset_index(drop=True)
+            appointment_days, has_feedback = appointment_days[recent], has_feedback[recent]
+        
+        manifest["days"][str(day)] = {
+            "appointments": len(new_df),
+            "appointment_status_changes": num_changes,
+            "feedback": len(late_df),
+            "provider_changes": num_provider_changes
+        }
+        print(f"{day}: {len(new_df)} new appointments, {num_changes} status changes, "
+              f"{len(late_df)} late feedback, {num_provider_changes} provider changes")
+    
+    with open(os.path.join(DELTA_DIR, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Wrote {num_days} daily deltas to {DELTA_DIR}")
+    return manifest
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic telemedicine data sources")
+    parser.add_argument("--scale-factor", type=float, default=None,
+                        help="Generate a reproducible benchmark dataset at this scale (SF1 = default sizes)")
+    parser.add_argument("--seed", type=int, default=RANDOM_SEED, help="Base random seed")
+    parser.add_argument("--shards", type=int, default=DEFAULT_SHARDS,
+                        help="Number of shards for scale-factor generation")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="Worker processes for scale-factor generation (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=STREAM_CHUNK_SIZE, help="Rows generated per chunk")
+    parser.add_argument("--profile", choices=sorted(WORKLOAD_PROFILES), default=None, help="Workload profile")
+    parser.add_argument("--vectorized", action="store_true", help="Use the vectorized engine (default dataset)")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Generate the default dataset chunk by chunk with bounded memory (vectorized engine)")
+    parser.add_argument("--appointments", type=int, default=NUM_APPOINTMENTS,
+                        help="Appointment logs to generate in streaming mode")
+    parser.add_argument("--feedback", type=int, default=NUM_FEEDBACK,
+                        help="Patient feedback records to generate in streaming mode")
+    parser.add_argument("--delta-days", type=int, default=None,
+                        help="Emit this many daily deltas on top of the existing dataset instead of regenerating it")
+    parser.add_argument("--delta-start", default=None,
+                        help="First delta day, YYYY-MM-DD (default: the day after the latest appointment)")
+    parser.add_argument("--format", dest="output_format", choices=["json", "packed"], default="json",
+                        help="Per-record output format for the default dataset")
+    args = parser.parse_args(argv)
+    if args.shards < 1:
+        parser.error("--shards must be at least 1")
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be at least 1")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    # The loop generators draw from the global random state
+    np.random.seed(args.seed)
+    random.seed(args.seed)
+    
+    if args.delta_days is not None:
+        generate_daily_deltas(args.delta_days, start_day=args.delta_start, seed=args.seed, profile=args.profile)
+    elif args.scale_factor is not None:
+        generate_scale_factor_dataset(
+            args.scale_factor, seed=args.seed, num_shards=args.shards, processes=args.processes,
+            chunk_size=args.chunk_size, profile=args.profile
+        )
+    elif args.streaming:
+        generate_all_data_streaming(
+            num_appointments=args.appointments, num_feedback=args.feedback, chunk_size=args.chunk_size,
+            rng=np.random.default_rng(args.seed), profile=args.profile
+        )
+    else:
+        generate_all_data(vectorized=args.vectorized, output_format=args.output_format, profile=args.profile)
+
 if __name__ == "__main__":
-    generate_all_data()
+    main()
@@ -0,0 +1,168 @@
+import gzip
+import json
+import os
+import zlib
+import numpy as np
+import pandas as pd
+
+# Packed record format
+#
+# Instead of one pretty-printed JSON file per record, records are written as NDJSON
+# into a small number of segment files ({name}-00000.ndjson.gz, ...). Each segment is
+# a sequence of independently compressed gzip members ("blocks") of block_records
+# lines, so the whole segment still decompresses with zcat/gzip.open, while a single
+# record can be read by seeking to its block and inflating only that block.
+#
+# A sidecar index ({name}.index.csv) maps every record id to
+#   segment (segment number), block_offset (compressed byte offset of the block),
+#   record_offset, record_length (byte range of the line inside the inflated block)
+
+PACKED_SEGMENT_RECORDS = 1000000  # Records per segment file
+PACKED_BLOCK_RECORDS = 1000  # Records per gzip member (unit of random access)
+PACKED_COMPRESSION_LEVEL = 6
+INDEX_COLUMNS = ["record_id", "segment", "block_offset", "record_offset", "record_length"]
+
+def segment_file_name(name, segment_number):
+    return f"{name}-{segment_number:05d}.ndjson.gz"
+
+def index_file_name(name):
+    return f"{name}.index.csv"
+
+class PackedRecordWriter:
+    """Append DataFrames of records to compressed NDJSON segments plus an offset index"""
+
+    def __init__(self, output_dir, name, id_column,
+                 segment_records=PACKED_SEGMENT_RECORDS, block_records=PACKED_BLOCK_RECORDS):
+        self.output_dir = output_dir
+        self.name = name
+        self.id_column = id_column
+        self.segment_records = segment_records
+        self.block_records = block_records
+
+        os.makedirs(output_dir, exist_ok=True)
+        self.segment_number = -1
+        self.segment_file = None
+        self.segment_count = 0
+        self.records_written = 0
+
+        self.index_file = open(os.path.join(output_dir, index_file_name(name)), "w", newline="")
+        self.index_file.write(",".join(INDEX_COLUMNS) + "\n")
+
+    def _roll_segment(self):
+        if self.segment_file:
+            self.segment_file.close()
+        self.segment_number += 1
+        self.segment_count = 0
+        path = os.path.join(self.output_dir, segment_file_name(self.name, self.segment_number))
+        self.segment_file = open(path, "wb")
+
+    def _write_block(self, block_df):
+        data = block_df.to_json(orient="records", lines=True, date_format="iso").encode("utf-8")
+        if not data.endswith(b"\n"):
+            data += b"\n"
+
+        # Byte range of every line inside the inflated block
+        line_ends = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == ord("\n")) + 1
+        line_starts = np.concatenate(([0], line_ends[:-1]))
+
+        block_offset = self.segment_file.tell()
+        self.segment_file.write(gzip.compress(data, compresslevel=PACKED_COMPRESSION_LEVEL, mtime=0))
+
+        pd.DataFrame({
+            "record_id": block_df[self.id_column].to_numpy(),
+            "segment": self.segment_number,
+            "block_offset": block_offset,
+            "record_offset": line_starts,
+            "record_length": line_ends - line_starts - 1
+        }).to_csv(self.index_file, header=False, index=False)
+
+    def write(self, records_df):
+        """Append records; may be called repeatedly with successive chunks"""
+        position = 0
+        while position < len(records_df):
+            if self.segment_file is None or self.segment_count >= self.segment_records:
+                self._roll_segment()
+
+            block_rows = min(self.block_records,
+                             self.segment_records - self.segment_count,
+                             len(records_df) - position)
+            self._write_block(records_df.iloc[position:position + block_rows])
+
+            position += block_rows
+            self.segment_count += block_rows
+            self.records_written += block_rows
+        return self
+
+    def close(self):
+        if self.segment_file:
+            self.segment_file.close()
+            self.segment_file = None
+        self.index_file.close()
+        print(f"Packed {self.records_written} {self.name} records into "
+              f"{self.segment_number + 1} segment(s) in {self.output_dir}")
+
+class PackedRecordReader:
+    """Random access to packed records by id using the sidecar index"""
+
+    def __init__(self, directory, name):
+        self.directory = directory
+        self.name = name
+
+        index_df = pd.read_csv(os.path.join(directory, index_file_name(name)), dtype={"record_id": str})
+        self.index = dict(zip(
+            index_df["record_id"],
+            zip(index_df["segment"], index_df["block_offset"],
+                index_df["record_offset"], index_df["record_length"])
+        ))
+
+        # Most recently inflated block; consecutive lookups usually hit the same one
+        self._cached_block_key = None
+        self._cached_block = None
+
+    @staticmethod
+    def exists(directory, name):
+        return os.path.exists(os.path.join(directory, index_file_name(name)))
+
+    def __contains__(self, record_id):
+        return record_id in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def record_ids(self):
+        return self.index.keys()
+
+    def record_size(self, record_id):
+        return int(self.index[record_id][3])
+
+    def _read_block(self, segment, block_offset):
+        block_key = (segment, block_offset)
+        if block_key != self._cached_block_key:
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)  # one gzip member
+            parts = []
+            with open(os.path.join(self.directory, segment_file_name(self.name, segment)), "rb") as f:
+                f.seek(block_offset)
+                while not decompressor.eof:
+                    chunk = f.read(65536)
+                    if not chunk:
+                        break
+                    parts.append(decompressor.decompress(chunk))
+            self._cached_block_key = block_key
+            self._cached_block = b"".join(parts)
+        return self._cached_block
+
+    def get_raw(self, record_id):
+        """Return the record's NDJSON line as bytes, or None if the id is unknown"""
+        location = self.index.get(record_id)
+        if location is None:
+            return None
+        segment, block_offset, record_offset, record_length = location
+        block = self._read_block(int(segment), int(block_offset))
+        return block[int(record_offset):int(record_offset) + int(record_length)]
+
+    def get(self, record_id):
+        """Return the record as a dict, or None if the id is unknown"""
+        raw = self.get_raw(record_id)
+        if raw is None:
+            return None
+        return json.loads(raw)
@@ -0,0 +1,24 @@
+import json
+
+import numpy as np
+
+from event_stream import expand_appointment_events, build_event_sequences
+
+def test_event_sequences_follow_appointment_rows(appointments_df):
+    sequences = build_event_sequences(appointments_df, np.random.default_rng(1))
+
+    assert len(sequences) == len(appointments_df)
+    for (_, appointment), events in zip(appointments_df.iterrows(), sequences):
+        assert events[0]["event_type"] == "appointment_scheduled"
+        assert {event["appointment_id"] for event in events} == {appointment["appointment_id"]}
+        assert [event["timestamp"] for event in events] == sorted(event["timestamp"] for event in events)
+        if appointment["status"] == "Completed":
+            assert [e["event_type"] for e in events if e["event_type"] != "technical_issue"] == \
+                ["appointment_scheduled", "patient_login", "provider_login", "session_started", "session_ended"]
+        else:
+            assert len(events) == (1 if appointment["status"] == "No-show" else 2)
+
+def test_live_events_are_the_offline_stream_events(appointments_df):
+    offline = expand_appointment_events(appointments_df, np.random.default_rng(2))
+    live = build_event_sequences(appointments_df, np.random.default_rng(2))
+    assert [event for events in live for event in events] == [json.loads(value) for value in offline["value"]]
@@ -0,0 +1,119 @@
+import glob
+import importlib
+import os
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import generate_data
+from generate_data import (generate_provider_data, generate_patient_data, generate_appointment_logs_vectorized,
+                           generate_patient_feedback_vectorized, generate_daily_deltas)
+
+@pytest.fixture
+def snapshot_dir(tmp_path, monkeypatch):
+    """A small base snapshot laid out like data_sources/, with the working directory set to it"""
+    rng = np.random.default_rng(7)
+    providers_df = generate_provider_data(20)
+    patients_df = generate_patient_data(100)
+    appointments_df = generate_appointment_logs_vectorized(providers_df, patients_df, num_appointments=600, rng=rng)
+    feedback_df = generate_patient_feedback_vectorized(appointments_df, num_feedback=300, rng=rng)
+
+    for path, df in [("data_sources/provider_data/providers.csv", providers_df),
+                     ("data_sources/provider_data/patients.csv", patients_df),
+                     ("data_sources/appointment_logs/appointment_logs.csv", appointments_df),
+                     ("data_sources/patient_feedback/patient_feedback.csv", feedback_df)]:
+        os.makedirs(tmp_path / os.path.dirname(path), exist_ok=True)
+        df.to_csv(tmp_path / path, index=False)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+def read_deltas(name):
+    return pd.concat([pd.read_csv(path) for path in sorted(glob.glob(f"{generate_data.DELTA_DIR}/*/{name}"))],
+                     ignore_index=True)
+
+def test_status_changes_only_touch_appointments_not_held_yet(snapshot_dir):
+    generate_daily_deltas(30, rates={"status_change_rate": 0.5, "late_feedback_rate": 1.0})
+    changes = read_deltas("appointment_status_changes.csv")
+    feedback = pd.concat([pd.read_csv("data_sources/patient_feedback/patient_feedback.csv"),
+                          read_deltas("feedback.csv")], ignore_index=True)
+
+    assert len(changes) > 0
+    changed_on = changes["changed_at"].str[:10]
+    # Never after the appointment was held
+    assert (changes["appointment_date"] >= changed_on).all()
+    same_day = changes["appointment_date"] == changed_on
+    assert (changes.loc[same_day, "changed_at"].str[11:] < changes.loc[same_day, "scheduled_time"]).all()
+    # Never an appointment with feedback, and each appointment changes at most once
+    assert not changes["appointment_id"].isin(feedback["appointment_id"]).any()
+    assert not changes["appointment_id"].duplicated().any()
+    assert set(changes["status"]) <= set(generate_data.DELTA_STATUS_CHANGE_STATUSES)
+
+def test_late_feedback_is_for_completed_unchanged_appointments(snapshot_dir):
+    generate_daily_deltas(30, rates={"status_change_rate": 0.5, "late_feedback_rate": 1.0})
+    late = read_deltas("feedback.csv")
+    changes = read_deltas("appointment_status_changes.csv")
+    base = pd.read_csv("data_sources/patient_feedback/patient_feedback.csv")
+
+    assert len(late) > 0
+    assert not late["appointment_id"].duplicated().any()
+    assert not late["appointment_id"].isin(base["appointment_id"]).any()
+    assert not late["appointment_id"].isin(changes["appointment_id"]).any()
+
+def test_deltas_are_reproducible(snapshot_dir):
+    first = generate_daily_deltas(10, seed=3)
+    first_changes = read_deltas("appointment_status_changes.csv")
+    second = generate_daily_deltas(10, seed=3)
+    assert first["days"] == second["days"]
+    pd.testing.assert_frame_equal(first_changes, read_deltas("appointment_status_changes.csv"))
+
+def test_vectorized_logs_have_the_loop_generators_schema(monkeypatch, appointments_df):
+    monkeypatch.setattr(generate_data, "NUM_APPOINTMENTS", 200)
+    loop = generate_data.generate_appointment_logs(generate_provider_data(20), generate_patient_data(100))
+    vectorized = appointments_df
+
+    assert list(vectorized.columns) == list(loop.columns)
+    domains = {"status": generate_data.APPOINTMENT_STATUSES, "appointment_type": generate_data.APPOINTMENT_TYPES,
+               "device_type": generate_data.DEVICE_TYPES, "operating_system": generate_data.OPERATING_SYSTEMS,
+               "browser": generate_data.BROWSERS, "connection_quality": generate_data.CONNECTION_QUALITIES}
+    for column, values in domains.items():
+        assert set(vectorized[column]) <= set(values)
+    # Same string forms as strftime in the loop
+    assert vectorized["appointment_date"].astype(str).str.fullmatch(r"\d{4}-\d{2}-\d{2}").all()
+    assert vectorized["scheduled_time"].astype(str).str.fullmatch(r"\d{2}:\d{2}:00").all()
+    assert vectorized["timestamp"].astype(str).str.fullmatch(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}").all()
+    uuid4 = r"[0-9a-f]{8}-[0-9a-f]{4}-4[0-9a-f]{3}-[89ab][0-9a-f]{3}-[0-9a-f]{12}"
+    assert vectorized["appointment_id"].str.fullmatch(uuid4).all()
+    assert vectorized["appointment_id"].is_unique
+
+def test_vectorized_logs_have_conditional_nulls(appointments_df):
+    status = appointments_df["status"].astype(str)
+
+    assert appointments_df.loc[status == "No-show", "wait_time_minutes"].isna().all()
+    assert appointments_df.loc[status != "No-show", "wait_time_minutes"].between(0, 30).all()
+    assert appointments_df.loc[status != "Completed", "duration_minutes"].isna().all()
+    assert appointments_df.loc[status == "Completed", "duration_minutes"].between(10, 60).all()
+    assert (appointments_df["technical_issue_type"].isna() == ~appointments_df["had_technical_issues"]).all()
+
+def test_vectorized_logs_are_reproducible(make_appointments):
+    pd.testing.assert_frame_equal(make_appointments(seed=4), make_appointments(seed=4))
+
+def test_importing_leaves_the_global_random_state_alone():
+    # The Kafka producer imports the generator's constants and samples with the global state
+    random.random(), np.random.random()  # Move away from any freshly seeded state
+    state, np_state = random.getstate(), np.random.get_state()
+    importlib.reload(generate_data)
+    assert random.getstate() == state
+    assert all(np.array_equal(a, b) for a, b in zip(np.random.get_state(), np_state))
+
+def test_streaming_mode_is_reachable_from_the_cli(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    generate_data.main(["--streaming", "--appointments", "2500", "--feedback", "1000", "--chunk-size", "1000"])
+    assert len(pd.read_csv("data_sources/appointment_logs/appointment_logs.csv")) == 2500
+    assert len(pd.read_csv("data_sources/patient_feedback/patient_feedback.csv")) == 1000
+
+@pytest.mark.parametrize("shards", ["0", "-2"])
+def test_shard_count_must_be_positive(shards):
+    with pytest.raises(SystemExit):
+        generate_data.parse_args(["--scale-factor", "1", "--shards", shards])